@@ -0,0 +1,322 @@
+import re
+import sys
+import random
+import argparse
+from functools import lru_cache
+
+try:
+    from Crypto.Hash import keccak as _keccak # pycryptodome, kommt mit web3 (eth-hash[pycryptodome])
+except ImportError:
+    _keccak = None
+
+# Minimaler ABI-Codec für die paar Calls, die wir machen (positions, collect, slot0, token0/1, fee, decimals, symbol,
+# getPool, feeGrowthGlobal, ticks, ownerOf, aggregate3). Ersetzt eth_abi/web3 im Cron-Pfad: deren Import kostet mehr als die eigentlichen eth_calls.
+# Unterstützt uintN/intN, address, bool, bytesN, bytes, string, Tupel "(...)" und dynamische Arrays "T[]".
+# Dekodiert wie eth_abi (strict): Adressen klein geschrieben, Arrays als Tupel, Padding/Wertebereich wird geprüft.
+# Paritätstest gegen web3/eth_abi: python abi_codec.py [--rounds N]
+WORD = 32
+
+# Vorberechnete Selektoren, damit im Normalbetrieb kein keccak für Signaturen nötig ist
+SELECTORS = {
+    "positions(uint256)": bytes.fromhex("99fbab88"),
+    "collect((uint256,address,uint128,uint128))": bytes.fromhex("fc6f7865"),
+    "slot0()": bytes.fromhex("3850c7bd"),
+    "token0()": bytes.fromhex("0dfe1681"),
+    "token1()": bytes.fromhex("d21220a7"),
+    "fee()": bytes.fromhex("ddca3f43"),
+    "decimals()": bytes.fromhex("313ce567"),
+    "symbol()": bytes.fromhex("95d89b41"),
+    "getPool(address,address,uint24)": bytes.fromhex("1698ee82"),
+    "feeGrowthGlobal0X128()": bytes.fromhex("f3058399"),
+    "feeGrowthGlobal1X128()": bytes.fromhex("46141319"),
+    "ticks(int24)": bytes.fromhex("f30dba93"),
+    "ownerOf(uint256)": bytes.fromhex("6352211e"),
+    "aggregate3((address,bool,bytes)[])": bytes.fromhex("82ad56cb"),
+}
+
+class AbiError(ValueError):
+    pass
+
+def keccak256(data):
+    if _keccak is None:
+        from eth_utils import keccak # Fallback ohne pycryptodome
+        return keccak(data)
+    return _keccak.new(digest_bits=256, data=data).digest()
+
+def function_selector(signature):
+    selector = SELECTORS.get(signature)
+    return selector if selector is not None else keccak256(signature.encode())[:4]
+
+def to_checksum_address(address):
+    # EIP-55; akzeptiert 20 Bytes oder Hex-String mit/ohne 0x in beliebiger Schreibweise
+    if isinstance(address, (bytes, bytearray)):
+        hex_address = bytes(address).hex()
+    else:
+        hex_address = address[2:].lower() if address[:2] in ("0x", "0X") else address.lower()
+    if len(hex_address) != 40 or not re.fullmatch(r"[0-9a-f]{40}", hex_address):
+        raise AbiError(f"Ungültige Adresse: {address!r}")
+    digest = keccak256(hex_address.encode()).hex()
+    return "0x" + "".join(char.upper() if int(digest[i], 16) >= 8 else char for i, char in enumerate(hex_address))
+
+def _split_components(inner):
+    components, depth, start = [], 0, 0
+    for i, char in enumerate(inner):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            components.append(inner[start:i])
+            start = i + 1
+    if inner:
+        components.append(inner[start:])
+    return components
+
+@lru_cache(maxsize=None)
+def _parse(type_str):
+    # -> (kind, Parameter, dynamisch?, Kopfgröße in Bytes)
+    type_str = type_str.strip()
+    if type_str.endswith("[]"):
+        return ("array", _parse(type_str[:-2]), True, WORD)
+    if type_str.startswith("(") and type_str.endswith(")"):
+        components = tuple(_parse(component) for component in _split_components(type_str[1:-1]))
+        dynamic = any(component[2] for component in components)
+        return ("tuple", components, dynamic, WORD if dynamic else sum(component[3] for component in components))
+    match = re.fullmatch(r"(uint|int)(\d*)", type_str)
+    if match:
+        bits = int(match.group(2) or 256)
+        if bits % 8 or not 8 <= bits <= 256:
+            raise AbiError(f"Ungültiger Typ: {type_str}")
+        return (match.group(1), bits, False, WORD)
+    match = re.fullmatch(r"bytes(\d+)", type_str)
+    if match and 1 <= int(match.group(1)) <= 32:
+        return ("fixed_bytes", int(match.group(1)), False, WORD)
+    if type_str in ("address", "bool"):
+        return (type_str, None, False, WORD)
+    if type_str in ("bytes", "string"):
+        return (type_str, None, True, WORD)
+    raise AbiError(f"Nicht unterstützter Typ: {type_str}")
+
+def _pad_right(data):
+    return data + b"\x00" * (-len(data) % WORD)
+
+def _encode_value(parsed, value):
+    kind, param = parsed[0], parsed[1]
+    if kind == "uint":
+        if not isinstance(value, int) or not 0 <= value < 1 << param:
+            raise AbiError(f"Wert {value!r} passt nicht in uint{param}")
+        return value.to_bytes(WORD, 'big')
+    if kind == "int":
+        if not isinstance(value, int) or not -(1 << (param - 1)) <= value < 1 << (param - 1):
+            raise AbiError(f"Wert {value!r} passt nicht in int{param}")
+        return value.to_bytes(WORD, 'big', signed=True)
+    if kind == "address":
+        try:
+            raw = bytes(value) if isinstance(value, (bytes, bytearray)) else bytes.fromhex(value[2:] if value[:2] in ("0x", "0X") else value)
+        except ValueError:
+            raw = b""
+        if len(raw) != 20:
+            raise AbiError(f"Ungültige Adresse: {value!r}")
+        return raw.rjust(WORD, b"\x00")
+    if kind == "bool":
+        return (1 if value else 0).to_bytes(WORD, 'big')
+    if kind == "fixed_bytes":
+        if len(value) > param:
+            raise AbiError(f"Wert zu lang für bytes{param}")
+        return bytes(value).ljust(WORD, b"\x00")
+    if kind in ("bytes", "string"):
+        raw = value.encode('utf-8') if kind == "string" else bytes(value)
+        return len(raw).to_bytes(WORD, 'big') + _pad_right(raw)
+    if kind == "tuple":
+        return _encode_sequence(param, value)
+    if kind == "array":
+        return len(value).to_bytes(WORD, 'big') + _encode_sequence((param,) * len(value), value)
+    raise AbiError(f"Nicht unterstützter Typ: {kind}")
+
+def _encode_sequence(parsed_types, values):
+    values = list(values)
+    if len(values) != len(parsed_types):
+        raise AbiError(f"{len(parsed_types)} Werte erwartet, {len(values)} erhalten")
+    heads, tails = [], []
+    head_size = sum(parsed[3] for parsed in parsed_types)
+    tail_offset = head_size
+    for parsed, value in zip(parsed_types, values):
+        encoded = _encode_value(parsed, value)
+        if parsed[2]:
+            heads.append(tail_offset.to_bytes(WORD, 'big'))
+            tails.append(encoded)
+            tail_offset += len(encoded)
+        else:
+            heads.append(encoded)
+    return b"".join(heads) + b"".join(tails)
+
+def _read_word(data, offset):
+    if offset + WORD > len(data):
+        raise AbiError(f"Daten zu kurz: {len(data)} Bytes, Wort bei Offset {offset} erwartet")
+    return data[offset:offset + WORD]
+
+def _decode_value(parsed, data, offset):
+    kind, param = parsed[0], parsed[1]
+    if kind == "tuple":
+        return _decode_sequence(param, data, offset)
+    if kind == "array":
+        length = int.from_bytes(_read_word(data, offset), 'big')
+        if offset + WORD + length * param[3] > len(data):
+            raise AbiError(f"Array-Länge {length} übersteigt die Daten")
+        return _decode_sequence((param,) * length, data, offset + WORD)
+    if kind in ("bytes", "string"):
+        length = int.from_bytes(_read_word(data, offset), 'big')
+        start = offset + WORD
+        padded_end = start + length + (-length % WORD)
+        if padded_end > len(data):
+            raise AbiError(f"{kind} der Länge {length} übersteigt die Daten")
+        if any(data[start + length:padded_end]):
+            raise AbiError(f"Padding von {kind} nicht leer")
+        raw = bytes(data[start:start + length])
+        if kind == "bytes":
+            return raw
+        try:
+            return raw.decode('utf-8')
+        except UnicodeDecodeError as e:
+            raise AbiError(f"string ist kein UTF-8: {e}") from e
+    word = _read_word(data, offset)
+    if kind == "uint":
+        value = int.from_bytes(word, 'big')
+        if value >> param:
+            raise AbiError(f"Padding von uint{param} nicht leer")
+        return value
+    if kind == "int":
+        value = int.from_bytes(word, 'big', signed=True)
+        if not -(1 << (param - 1)) <= value < 1 << (param - 1):
+            raise AbiError(f"Wert außerhalb von int{param}")
+        return value
+    if kind == "address":
+        if any(word[:12]):
+            raise AbiError("Padding der Adresse nicht leer")
+        return "0x" + word[12:].hex()
+    if kind == "bool":
+        value = int.from_bytes(word, 'big')
+        if value > 1:
+            raise AbiError(f"bool muss 0 oder 1 sein, nicht {value}")
+        return bool(value)
+    if kind == "fixed_bytes":
+        if any(word[param:]):
+            raise AbiError(f"Padding von bytes{param} nicht leer")
+        return bytes(word[:param])
+    raise AbiError(f"Nicht unterstützter Typ: {kind}")
+
+def _decode_sequence(parsed_types, data, base):
+    values = []
+    offset = base
+    for parsed in parsed_types:
+        if parsed[2]:
+            pointer = int.from_bytes(_read_word(data, offset), 'big')
+            values.append(_decode_value(parsed, data, base + pointer))
+        else:
+            values.append(_decode_value(parsed, data, offset))
+        offset += parsed[3]
+    return tuple(values)
+
+def encode(types, values):
+    return _encode_sequence(tuple(_parse(type_str) for type_str in types), values)
+
+def decode(types, data):
+    return _decode_sequence(tuple(_parse(type_str) for type_str in types), memoryview(bytes(data)), 0)
+
+def encode_call(signature, arg_types=(), args=()):
+    return function_selector(signature) + encode(list(arg_types), list(args))
+
+# --- Paritätstest gegen web3 (nur hier wird web3 importiert) ---
+
+PARITY_CASES = [
+    # (Bezeichnung, Typen) - Ein- und Ausgaben aller Calls, die tracker/price_updater/pools/backfill absetzen
+    ("positions() Ausgabe", ["uint96", "address", "address", "address", "uint24", "int24", "int24", "uint128", "uint256", "uint256", "uint128", "uint128"]),
+    ("slot0() Ausgabe", ["uint160", "int24", "uint16", "uint16", "uint16", "uint8", "bool"]),
+    ("collect() Eingabe", ["(uint256,address,uint128,uint128)"]),
+    ("collect() Ausgabe", ["uint256", "uint256"]),
+    ("getPool() Eingabe", ["address", "address", "uint24"]),
+    ("token0()/token1()", ["address"]),
+    ("ticks() Ausgabe", ["uint128", "int128", "uint256", "uint256", "int56", "uint160", "uint32", "bool"]),
+    ("decimals()", ["uint8"]),
+    ("symbol()", ["string"]),
+    ("aggregate3() Eingabe", ["(address,bool,bytes)[]"]),
+    ("aggregate3() Ausgabe", ["(bool,bytes)[]"]),
+]
+
+def _random_value(parsed, rng):
+    kind, param = parsed[0], parsed[1]
+    if kind == "uint":
+        return rng.choice([0, 1, (1 << param) - 1, rng.getrandbits(param)])
+    if kind == "int":
+        return rng.choice([0, -1, -(1 << (param - 1)), (1 << (param - 1)) - 1, rng.getrandbits(param) - (1 << (param - 1))])
+    if kind == "address":
+        return "0x" + rng.getrandbits(160).to_bytes(20, 'big').hex()
+    if kind == "bool":
+        return rng.random() < 0.5
+    if kind == "fixed_bytes":
+        return rng.getrandbits(8 * param).to_bytes(param, 'big')
+    if kind == "bytes":
+        return bytes(rng.getrandbits(8) for _ in range(rng.choice([0, 4, 31, 32, 33, 100])))
+    if kind == "string":
+        return rng.choice(["", "WETH", "WBTC", "USD₮0", "x" * 40, "Ünïcödé 🦄"])
+    if kind == "tuple":
+        return tuple(_random_value(component, rng) for component in param)
+    return tuple(_random_value(param, rng) for _ in range(rng.choice([0, 1, 3, 7])))
+
+def run_selfcheck(rounds=200, seed=1):
+    from web3 import Web3 # Referenz: web3-Codec (eth_abi) und web3-Checksummen
+    codec = Web3().codec
+    rng = random.Random(seed)
+    failures = 0
+    for signature, selector in SELECTORS.items():
+        if Web3.keccak(text=signature)[:4] != selector:
+            print(f"  FEHLER Selektor {signature}: {selector.hex()} != {Web3.keccak(text=signature)[:4].hex()}")
+            failures += 1
+    for _ in range(rounds):
+        address = "0x" + rng.getrandbits(160).to_bytes(20, 'big').hex()
+        if to_checksum_address(address) != Web3.to_checksum_address(address):
+            print(f"  FEHLER Checksumme {address}")
+            failures += 1
+    for label, types in PARITY_CASES:
+        failures_before = failures
+        parsed = [_parse(type_str) for type_str in types]
+        for _ in range(rounds):
+            values = [_random_value(p, rng) for p in parsed]
+            reference = codec.encode(types, values)
+            ours = encode(types, values)
+            if ours != reference:
+                print(f"  FEHLER encode {label}: {values!r}")
+                failures += 1
+                continue
+            if decode(types, reference) != codec.decode(types, reference):
+                print(f"  FEHLER decode {label}: {values!r}")
+                failures += 1
+        # Kaputte Antworten müssen bei beiden scheitern (aggregate3 macht daraus None)
+        reference = codec.encode(types, [_random_value(p, rng) for p in parsed])
+        for broken in (reference[:-1], b"\xff" * len(reference), reference[:WORD - 1]):
+            reference_failed = ours_failed = False
+            try:
+                codec.decode(types, broken)
+            except Exception:
+                reference_failed = True
+            try:
+                decode(types, broken)
+            except AbiError:
+                ours_failed = True
+            if reference_failed != ours_failed:
+                print(f"  FEHLER Fehlerverhalten {label}: web3 {'scheitert' if reference_failed else 'ok'}, abi_codec {'scheitert' if ours_failed else 'ok'}")
+                failures += 1
+        print(f"  {label:<24} {rounds} Runden {'ok' if failures == failures_before else 'FEHLER'}")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Paritätstest abi_codec gegen web3/eth_abi")
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    failures = run_selfcheck(args.rounds, args.seed)
+    print("Parität mit web3: OK" if not failures else f"{failures} Abweichung(en) gegenüber web3.")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
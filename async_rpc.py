@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import asyncio
+import itertools
+import aiohttp
+from abi_codec import decode
+import instrumentation
+import rpc_cache
+import rpc_pool
+from multicall import MULTICALL3_ADDRESS, MULTICALL_BATCH_SIZE, RPC_TIMEOUT, RpcError, aggregate3_calldata, decode_results, method_label
+
+# Asynchroner JSON-RPC-Client: eine aiohttp-Session mit Keep-Alive-Pool, Semaphore begrenzt parallele Requests.
+RPC_MAX_CONCURRENCY = int(os.getenv('RPC_MAX_CONCURRENCY', "16"))
+
+class AsyncRpcClient:
+    def __init__(self, url, concurrency=RPC_MAX_CONCURRENCY):
+        self.url = url
+        self.concurrency = concurrency
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._ids = itertools.count(1)
+        self._session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=30)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=RPC_TIMEOUT))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+
+    async def _post(self, payload):
+        labels = [method_label(item["method"], item["params"]) for item in (payload if isinstance(payload, list) else [payload])]
+        label = labels[0] if not isinstance(payload, list) else "batch:" + "+".join(sorted(set(labels)))
+        instrumentation.record_rpc_calls(labels)
+        body = json.dumps(payload).encode()
+        if not rpc_pool.is_pool_url(self.url):
+            return await self._post_once(self.url, body, label)
+        return await rpc_pool.get_pool(self.url).post_async(lambda endpoint: self._post_once(endpoint.url, body, label))
+
+    async def _post_once(self, url, body, label):
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                async with self._session.post(url, data=body, headers={"Content-Type": "application/json"}) as response:
+                    raw = await response.read()
+                    instrumentation.record_http("rpc", label, time.perf_counter() - start, len(body), len(raw), error=response.status >= 400)
+                    response.raise_for_status()
+                    return json.loads(raw)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if not isinstance(e, aiohttp.ClientResponseError):
+                    instrumentation.record_http("rpc", label, time.perf_counter() - start, len(body), error=True)
+                raise
+
+    async def request(self, method, params, cache=True, latest_ttl=None):
+        keys, cached = rpc_cache.lookup_requests([(method, params)], latest_ttl) if cache else ([None], [None])
+        if cached[0] is not None:
+            return cached[0]
+        data = await self._post({"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params})
+        if data.get("error"):
+            raise RpcError(f"{method}: {data['error'].get('message', data['error'])}")
+        rpc_cache.store_requests([(method, params)], keys, [data.get("result")])
+        return data.get("result")
+
+    async def batch(self, calls, latest_ttl=None):
+        # Wie multicall.rpc_batch: pro Call Ergebnis oder RpcError, Cache-Treffer ohne Request
+        if not calls:
+            return []
+        keys, results = rpc_cache.lookup_requests(calls, latest_ttl)
+        missing = [index for index, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+        fetched = await self._send_batch([calls[index] for index in missing])
+        for index, result in zip(missing, fetched):
+            results[index] = result
+        rpc_cache.store_requests([calls[index] for index in missing], [keys[index] for index in missing], fetched)
+        return results
+
+    async def _send_batch(self, calls):
+        payload = [{"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params} for method, params in calls]
+        data = await self._post(payload)
+        if isinstance(data, dict):
+            raise RpcError(f"Batch request failed: {data.get('error', data)}")
+        by_id = {item.get("id"): item for item in data}
+        results = []
+        for request in payload:
+            item = by_id.get(request["id"])
+            if item is None:
+                results.append(RpcError(f"{request['method']}: no response in batch"))
+            elif item.get("error"):
+                results.append(RpcError(f"{request['method']}: {item['error'].get('message', item['error'])}"))
+            else:
+                results.append(item.get("result"))
+        return results
+
+    async def eth_call(self, to, data, block="latest", from_address=None, cache=True):
+        tx = {"to": to, "data": "0x" + data.hex()}
+        if from_address:
+            tx["from"] = from_address
+        return bytes.fromhex((await self.request("eth_call", [tx, block], cache))[2:])
+
+    async def aggregate3(self, calls, block="latest", batch_size=MULTICALL_BATCH_SIZE, latest_ttl=None):
+        # Wie multicall.aggregate3 (inkl. RPC-Cache), die Chunks der Cache-Misses laufen aber parallel
+        keys, returned = rpc_cache.lookup_calls(calls, block, latest_ttl)
+        missing = [index for index, return_data in enumerate(returned) if return_data is None]
+        chunks = [missing[start:start + batch_size] for start in range(0, len(missing), batch_size)]
+        raw_results = await asyncio.gather(*(self._aggregate3_chunk([calls[index] for index in chunk], block) for chunk in chunks))
+        for indexes, chunk_returned in zip(chunks, raw_results):
+            for index, (success, return_data) in zip(indexes, chunk_returned):
+                returned[index] = return_data if success else None
+        rpc_cache.store_calls([keys[index] for index in missing], [returned[index] for index in missing])
+        return decode_results(calls, returned)
+
+    async def _aggregate3_chunk(self, chunk, block):
+        raw = await self.eth_call(MULTICALL3_ADDRESS, aggregate3_calldata(chunk), block, cache=False)
+        (returned,) = decode(["(bool,bytes)[]"], raw)
+        return returned
@@ -0,0 +1,313 @@
+import os
+import sys
+import json
+import bisect
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+import pools
+import tracker
+import fee_analytics
+import fee_engine
+from abi_codec import to_checksum_address
+from coingecko import PriceClient
+from multicall import aggregate3, rpc_request
+
+# Füllt fehlende Tage in fees_data.json nach: pro Tag wird der Block zum Snapshot-Zeitpunkt per Binärsuche
+# über Block-Timestamps bestimmt und positions/slot0 sowie die Gebühren (FEE_SOURCE wie in tracker.py) werden an genau
+# diesem Block gelesen.
+# Aufruf: python backfill.py [--since 2025-05-01] [--until 2025-06-01] [--positions 4806838,...] [--workers 8] [--fee-source engine]
+BACKFILL_CHECKPOINT_FILE = "backfill_checkpoint.json"
+BACKFILL_SNAPSHOT_HOUR_UTC = 17 # Wie der tägliche Cron in fees.yml
+BACKFILL_WORKERS = int(os.getenv('BACKFILL_WORKERS', "8"))
+CHECKPOINT_EVERY_DAYS = 5
+
+class BlockFinder:
+    def __init__(self, rpc_url):
+        self.rpc_url = rpc_url
+        self.timestamps = {}
+        self.lock = threading.Lock()
+        self.latest = int(rpc_request(rpc_url, "eth_blockNumber", []), 16)
+
+    def timestamp(self, number):
+        with self.lock:
+            if number in self.timestamps:
+                return self.timestamps[number]
+        block = rpc_request(self.rpc_url, "eth_getBlockByNumber", [hex(number), False])
+        ts = int(block["timestamp"], 16)
+        with self.lock:
+            self.timestamps[number] = ts
+        return ts
+
+    def block_at(self, target_ts):
+        # Letzter Block mit timestamp <= target_ts (Binärsuche, Timestamps werden geteilt gecacht)
+        lo, hi = 0, self.latest
+        if self.timestamp(hi) <= target_ts:
+            return hi
+        if self.timestamp(lo) > target_ts:
+            return None
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if self.timestamp(mid) <= target_ts:
+                lo = mid
+            else:
+                hi = mid
+        return lo
+
+def load_checkpoint(filename=BACKFILL_CHECKPOINT_FILE):
+    if not os.path.exists(filename):
+        return {"days": {}}
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        print(f"Checkpoint {filename} gefunden: {len(checkpoint.get('days', {}))} Tag(e) bereits gelesen, setze fort.")
+        return checkpoint
+    except json.JSONDecodeError:
+        print(f"Warnung: Checkpoint {filename} nicht lesbar, starte neu.")
+        return {"days": {}}
+
+def save_checkpoint(checkpoint, filename=BACKFILL_CHECKPOINT_FILE):
+    tmp_path = filename + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, filename)
+
+def missing_days_by_position(all_data, position_ids, since=None, until=None):
+    until = until or (datetime.now(timezone.utc) - timedelta(days=1)).date()
+    missing = {}
+    for position_id in position_ids:
+        history = all_data.get(f"position_{position_id}", {}).get("history", {})
+        start = since
+        if start is None:
+            if not history:
+                continue
+            start = datetime.strptime(min(history), '%Y-%m-%d').date()
+        day = start
+        while day <= until:
+            date_str = day.strftime('%Y-%m-%d')
+            if date_str not in history:
+                missing.setdefault(date_str, []).append(position_id)
+            day += timedelta(days=1)
+    return missing
+
+def read_day(rpc_url, block_finder, date_str, position_ids, pool_address_by_id=None, fee_source=None):
+    # Alle Reads eines Tages, block-gepinnt: positions()+slot0 per aggregate3, danach die nicht abgeholten Gebühren wie
+    # in tracker.py aus dem Fee-Growth-State (feeGrowthGlobal + Range-Ticks, ein zweites aggregate3) bzw. per
+    # collect()-Simulation mit from=ownerOf(id) (fee_source "collect").
+    # pool_address_by_id kommt aus pool_cache.json; fehlende Pools (z.B. inzwischen verbrannte Positionen)
+    # werden per CREATE2 aus dem positions()-Ergebnis berechnet und im zweiten Read mitgelesen.
+    fee_source = fee_source or tracker.FEE_SOURCE
+    snapshot = datetime.strptime(date_str, '%Y-%m-%d').replace(hour=BACKFILL_SNAPSHOT_HOUR_UTC, tzinfo=timezone.utc)
+    block = block_finder.block_at(snapshot.timestamp())
+    if block is None:
+        return {"block": None, "fee_source": fee_source, "position_ids": sorted(position_ids), "positions": {}}
+    block_tag = hex(block)
+    pool_address_by_id = {pid: address for pid, address in (pool_address_by_id or {}).items() if address}
+    pool_addresses = sorted({pool_address_by_id[pid] for pid in position_ids if pid in pool_address_by_id})
+    results = aggregate3(rpc_url, tracker._positions_calls(position_ids) + tracker._pool_calls(pool_addresses), block=block_tag)
+    details_by_id = dict(zip(position_ids, results[:len(position_ids)]))
+    slot0_by_pool = dict(zip(pool_addresses, results[len(position_ids):]))
+    positions_by_id = tracker._with_liquidity(details_by_id) # Wie tracker.py: Liquidität 0 ergibt keinen History-Eintrag
+    for position_id, details in positions_by_id.items():
+        if position_id not in pool_address_by_id:
+            pool_address_by_id[position_id] = pools.compute_pool_address(details[2], details[3], details[4])
+    extra_pools = sorted({pool_address_by_id[pid] for pid in positions_by_id} - set(slot0_by_pool))
+    if fee_source == "engine":
+        fee_calls, fee_layout = fee_engine.state_calls(positions_by_id, pool_address_by_id)
+        results = aggregate3(rpc_url, fee_calls + tracker._pool_calls(extra_pools), block=block_tag) if fee_calls or extra_pools else []
+        slot0_by_pool.update(zip(extra_pools, results[len(fee_calls):]))
+        collected = fee_engine.compute_uncollected(positions_by_id, pool_address_by_id, slot0_by_pool,
+                                                   fee_engine.parse_state(fee_layout, results[:len(fee_calls)]))
+    else:
+        if extra_pools:
+            slot0_by_pool.update(zip(extra_pools, aggregate3(rpc_url, tracker._pool_calls(extra_pools), block=block_tag)))
+        collected = fee_engine.simulate_collect(rpc_url, list(positions_by_id), block_tag) if positions_by_id else {}
+    day = {"block": block, "timestamp": snapshot.timestamp(), "fee_source": fee_source, "position_ids": sorted(position_ids), "positions": {}}
+    for position_id, details in positions_by_id.items():
+        if collected.get(position_id) is not None:
+            pool_address = pool_address_by_id[position_id]
+            slot0 = slot0_by_pool.get(pool_address)
+            day["positions"][str(position_id)] = {"token0": details[2], "token1": details[3], "tick_lower": details[5], "tick_upper": details[6],
+                                                  "collected": list(collected[position_id]), "pool": pool_address, "sqrt_price_x96": slot0[0] if slot0 else None}
+    return day
+
+def _read_position_ids(day):
+    # Am Tag bereits gelesene IDs, auch ohne Ergebnis (Liquidität 0, noch nicht gemintet); ältere Checkpoints: nur die mit Ergebnis
+    return set(day.get("position_ids") or (int(pid) for pid in day["positions"]))
+
+def merge_day(checkpoint_days, date_str, day):
+    # Nachgelesene Positionen (z.B. erweitertes --positions) zum vorhandenen Tag hinzufügen statt ihn zu ersetzen
+    existing = checkpoint_days.get(date_str)
+    if not existing or existing.get("fee_source", "collect") != day["fee_source"] or existing["block"] is None:
+        checkpoint_days[date_str] = day
+        return
+    for position_id_str, pos in day["positions"].items():
+        # Gleicher Snapshot-Zeitpunkt; ein abweichender Block (neu bestimmt) wird pro Position vermerkt
+        existing["positions"][position_id_str] = pos if day["block"] == existing["block"] else dict(pos, block=day["block"])
+    existing["position_ids"] = sorted(_read_position_ids(existing) | set(day["position_ids"]))
+
+def _nearest_price(history, ts):
+    if not history:
+        return None
+    timestamps = [point[0] for point in history]
+    i = bisect.bisect_left(timestamps, ts)
+    candidates = [history[j] for j in (i - 1, i) if 0 <= j < len(history)]
+    nearest = min(candidates, key=lambda point: abs(point[0] - ts))
+    return nearest[1] if abs(nearest[0] - ts) <= 2 * 86400 else None
+
+def _implied_prices(day_data):
+    # USD-Preise aus einem bestehenden Eintrag zurückrechnen (für die Neuberechnung von daily_earned_fees)
+    fees = (day_data or {}).get("total_unclaimed_fees", {})
+    prices = []
+    for token in ("token0", "token1"):
+        actual, usd = fees.get(f"{token}_actual"), fees.get(f"{token}_usd")
+        prices.append(usd / actual if actual and usd is not None else None)
+    return prices
+
+def merge_backfill(all_data, entries_by_position):
+    # Fügt nur Tage ein, die noch fehlen. daily_earned_fees wird für die neuen Tage und für den ersten bestehenden
+    # Tag nach einer geschlossenen Lücke neu berechnet (der hatte vorher keine Vortagsbasis).
+    merged = 0
+    for position_key, entries in entries_by_position.items():
+        history = all_data[position_key].setdefault("history", {})
+        added = set()
+        for date_str, entry in entries.items():
+            if date_str not in history:
+                history[date_str] = entry
+                added.add(date_str)
+        for date_str in sorted(history):
+            previous = (datetime.strptime(date_str, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+            if date_str in added or (previous in added and date_str not in added):
+                price0, price1 = _implied_prices(history[date_str])
+                history[date_str]["daily_earned_fees"] = tracker.compute_daily_earned(
+                    history[date_str]["total_unclaimed_fees"], history.get(previous), price0, price1)
+        all_data[position_key]["history"] = dict(sorted(history.items()))
+        if added:
+            all_data[position_key]["fee_analytics"] = fee_analytics.rebuild(all_data[position_key]) # Tage in der Vergangenheit: neu aufbauen
+        merged += len(added)
+    return merged
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill fehlender Tage in fees_data.json aus Archiv-State")
+    parser.add_argument("--since", help="Erster Tag (YYYY-MM-DD), Default: erster Tag der vorhandenen Historie")
+    parser.add_argument("--until", help="Letzter Tag (YYYY-MM-DD), Default: gestern")
+    parser.add_argument("--positions", help="Kommagetrennte Position-IDs, Default: positions_to_track.txt")
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS)
+    parser.add_argument("--fee-source", choices=["engine", "collect"], default=tracker.FEE_SOURCE,
+                        help="Gebühren aus dem Fee-Growth-State (engine) oder per collect()-Simulation, wie die täglichen Läufe (auch via FEE_SOURCE)")
+    args = parser.parse_args()
+
+    print(f"--- Starting Fee History Backfill ({datetime.now(timezone.utc).isoformat()}) ---")
+    if not tracker.ARBITRUM_RPC_URL:
+        print("CRITICAL Error: Missing ARBITRUM_RPC. Exiting.")
+        return 1
+    all_data = tracker.load_json_data(tracker.JSON_DATA_FILE)
+    pos_configs = tracker.get_position_configs()
+    investment_by_id = {pos_config['id']: pos_config['initial_investment_usd'] for pos_config in pos_configs}
+    position_ids = [int(pid) for pid in args.positions.split(",")] if args.positions else list(investment_by_id)
+    since = datetime.strptime(args.since, '%Y-%m-%d').date() if args.since else None
+    until = datetime.strptime(args.until, '%Y-%m-%d').date() if args.until else None
+
+    missing = missing_days_by_position(all_data, position_ids, since, until)
+    if not missing:
+        print("Keine fehlenden Tage gefunden.")
+        return 0
+    print(f"{sum(len(ids) for ids in missing.values())} fehlende Position-Tage über {len(missing)} Tag(e).")
+
+    checkpoint = load_checkpoint()
+    checkpoint_lock = threading.Lock()
+    block_finder = BlockFinder(tracker.ARBITRUM_RPC_URL)
+    # Pro Tag nur die IDs lesen, die der Checkpoint noch nicht hat; Tage mit anderer Gebührenquelle ganz neu (ältere Checkpoints: collect)
+    def ids_to_read(date_str):
+        day = checkpoint["days"].get(date_str)
+        if not day or day.get("fee_source", "collect") != args.fee_source:
+            return missing[date_str]
+        done = _read_position_ids(day)
+        return [position_id for position_id in missing[date_str] if position_id not in done]
+    todo = {}
+    for date_str in missing:
+        ids = ids_to_read(date_str)
+        if ids:
+            todo[date_str] = ids
+    try:
+        pool_address_by_id = tracker._pool_addresses_by_id(pools.resolve_position_pools(tracker.ARBITRUM_RPC_URL, position_ids))
+    except Exception as e:
+        print(f"Warnung: Pools nicht auflösbar ({e}), berechne sie pro Tag aus positions().")
+        pool_address_by_id = {}
+    completed_since_save = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(read_day, tracker.ARBITRUM_RPC_URL, block_finder, date_str, ids, pool_address_by_id, args.fee_source): date_str
+                   for date_str, ids in sorted(todo.items())}
+        for future in as_completed(futures):
+            date_str = futures[future]
+            try:
+                day = future.result()
+            except Exception as e:
+                print(f"  {date_str}: Fehler beim Lesen ({e}), wird beim nächsten Lauf erneut versucht.")
+                continue
+            with checkpoint_lock:
+                merge_day(checkpoint["days"], date_str, day)
+                completed_since_save += 1
+                if completed_since_save >= CHECKPOINT_EVERY_DAYS:
+                    save_checkpoint(checkpoint)
+                    completed_since_save = 0
+            print(f"  {date_str}: Block {day['block']}, {len(day['positions'])} Position(en) gelesen.")
+    save_checkpoint(checkpoint)
+
+    days = {date_str: checkpoint["days"][date_str] for date_str in missing if not ids_to_read(date_str)}
+    read_days = [day for day in days.values() if day["positions"]] # Tage vor dem ersten Block haben keinen timestamp
+    if not read_days:
+        print(f"Keine Positionsdaten gelesen ({len(days)}/{len(missing)} Tag(e) erfolgreich), nichts zu ergänzen.")
+        if len(days) < len(missing):
+            return 1
+        os.remove(BACKFILL_CHECKPOINT_FILE)
+        return 0
+    token_addresses = sorted({to_checksum_address(pos[token]) for day in days.values() for pos in day["positions"].values() for token in ("token0", "token1")})
+    token_meta, _, _ = tracker.fetch_tokens_and_pools_batched(tracker.ARBITRUM_RPC_URL, token_addresses, [])
+    price_client = PriceClient()
+    first_ts = min(day["timestamp"] for day in read_days) - 86400
+    last_ts = max(day["timestamp"] for day in read_days) + 86400
+    price_histories = {addr: price_client.get_price_history(addr, first_ts, last_ts) for addr in token_addresses}
+
+    entries_by_position = {}
+    for date_str, day in sorted(days.items()):
+        for position_id_str, pos in day["positions"].items():
+            position_key = f"position_{position_id_str}"
+            token0, token1 = to_checksum_address(pos["token0"]), to_checksum_address(pos["token1"])
+            token0_decimals, token1_decimals = token_meta[token0]["decimals"], token_meta[token1]["decimals"]
+            if token0_decimals is None or token1_decimals is None:
+                continue
+            if position_key not in all_data:
+                all_data[position_key] = {"history": {}, "is_active": int(position_id_str) in investment_by_id,
+                                          "initial_investment_usd": investment_by_id.get(int(position_id_str)), "token_pair_symbols": ""}
+            symbols = (all_data[position_key].get("token_pair_symbols") or "").split('/')
+            if len(symbols) != 2 or not all(symbols):
+                symbols = [token_meta[token0]["symbol"] or "T0", token_meta[token1]["symbol"] or "T1"]
+                all_data[position_key]["token_pair_symbols"] = "/".join(symbols)
+            price0 = _nearest_price(price_histories.get(token0), day["timestamp"])
+            price1 = _nearest_price(price_histories.get(token1), day["timestamp"])
+            # Ältere Checkpoints haben nur einen sqrt_price_x96 pro Tag (WETH/WBTC-Pool)
+            position_range = tracker.compute_position_range(pos["tick_lower"], pos["tick_upper"], pos.get("sqrt_price_x96", day.get("sqrt_price_x96")),
+                                                            token0_decimals, token1_decimals, symbols[0], symbols[1])
+            if pos.get("pool"):
+                position_range["pool_address"] = pos["pool"]
+            entries_by_position.setdefault(position_key, {})[date_str] = {
+                "total_unclaimed_fees": tracker.fee_amounts_entry(pos["collected"][0] / 10**token0_decimals, pos["collected"][1] / 10**token1_decimals, price0, price1),
+                "daily_earned_fees": {},
+                "position_range": position_range,
+                "backfilled": True,
+                "block_number": pos.get("block", day["block"]),
+            }
+
+    merged = merge_backfill(all_data, entries_by_position)
+    tracker.save_json_data(all_data, tracker.JSON_DATA_FILE)
+    if len(days) == len(missing):
+        os.remove(BACKFILL_CHECKPOINT_FILE)
+    else:
+        print(f"{len(missing) - len(days)} Tag(e) fehlgeschlagen, Checkpoint {BACKFILL_CHECKPOINT_FILE} bleibt für den nächsten Lauf erhalten.")
+    print(f"\n--- Backfill Finished ({merged} Einträge ergänzt) ---")
+    return 0 if len(days) == len(missing) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,364 @@
+import os
+import sys
+import json
+import math
+import time
+import argparse
+from datetime import datetime, timezone
+import numpy as np
+import pools
+import tick_store
+from pools import PRICE_PRESENTATION_IS_TOKEN0_BASE
+from tickmath import MIN_TICK, MAX_TICK, amounts_per_liquidity, price_to_tick, ticks_to_prices
+from time_in_range import TickHistory, history_for_range, load_tick_histories, time_in_range_matrix
+
+# Backtest von Kandidaten-Ranges (tickLower, tickUpper) über den Preispfad aus dem Tick-Store/price_ticks.json.
+# Pro Range, vektorisiert über das ganze Raster: Time-in-Range, Konzentration gegenüber einer Full-Range-Position
+# (Liquidität pro eingesetztem Kapital), geschätzte Gebühren = kalibrierte Tagesrendite * Konzentration * TiR, sowie
+# die Inventar-Drift entlang des Pfads (IL gegenüber HODL am Ende und im schlechtesten Moment, Anteil Token0).
+# Die Tagesrendite einer Full-Range-Position wird aus den daily_earned_fees in fees_data.json zurückgerechnet.
+# Start: python backtest.py [--pair WETH/WBTC | --pool 0x...] [--days 15] [--grid-lines 160] [--top 20] [--output ranges.json]
+BACKTEST_WINDOW_DAYS = 15
+BACKTEST_GRID_LINES = 160 # Tick-Grenzen im Raster -> bis zu ~80*80 = 6400 Kandidaten um den Einstiegspreis
+BACKTEST_GRID_MARGIN = 0.5 # Raster reicht um diesen Anteil der Pfadspanne über Min/Max hinaus
+BACKTEST_MIN_GRID_SPAN_TICKS = 200 # Mindestspanne des Rasters bei (fast) flachem Pfad, ~2 %
+BACKTEST_PATH_POINTS = 720 # Stützstellen des Pfads für die IL-Berechnung (15 Tage -> halbstündlich)
+BACKTEST_CHUNK_RANGES = 1024 # Ranges pro Block bei der Pfadmatrix (Ranges x Stützstellen)
+BACKTEST_TOP = 20
+BACKTEST_DEFAULT_CAPITAL_USD = 1000.0
+BACKTEST_SNAPSHOT_HOUR_UTC = 17 # Wie der tägliche Cron in fees.yml: daily_earned_fees gilt für die 24h davor
+BACKTEST_MIN_DAY_COVERAGE = 0.5 # Ab diesem Anteil Tick-Daten im Tag zählt die TiR aus dem Pfad, sonst der Snapshot-Preis
+TICK_SPACING_BY_FEE = {100: 1, 500: 10, 3000: 60, 10000: 200}
+SORT_KEYS = ("net_usd", "est_fees_usd", "fee_score", "tir_pct", "il_end_pct")
+
+def native_history(history, is_token0_base=PRICE_PRESENTATION_IS_TOKEN0_BASE):
+    # Ticks liegen in der Darstellung (Token0 pro Token1); gerechnet wird in Token1 pro Token0 wie im Pool
+    return history if is_token0_base else TickHistory(history.ts, 1.0 / history.prices)
+
+def to_presentation(native_lowers, native_uppers, is_token0_base=PRICE_PRESENTATION_IS_TOKEN0_BASE):
+    if is_token0_base:
+        return native_lowers, native_uppers
+    return 1.0 / native_uppers, 1.0 / native_lowers
+
+def concentration(native_lowers, native_uppers, prices):
+    # Liquidität pro Kapital (in Token1) relativ zur Full-Range-Position (L = V / (2*sqrt(P))) beim selben Preis
+    sqrt_lowers, sqrt_uppers = np.sqrt(native_lowers), np.sqrt(native_uppers)
+    amount0, amount1 = amounts_per_liquidity(sqrt_lowers, sqrt_uppers, prices)
+    return 2.0 * np.sqrt(prices) / (amount0 * prices + amount1)
+
+def tick_grid(native_prices, decimals0, decimals1, tick_spacing, lines=BACKTEST_GRID_LINES, margin=BACKTEST_GRID_MARGIN):
+    # An tick_spacing ausgerichtete Grenzen über die Pfadspanne plus Rand; Schrittweite so, dass höchstens lines Grenzen entstehen
+    tick_min = price_to_tick(float(native_prices.min()), decimals0, decimals1, True)
+    tick_max = price_to_tick(float(native_prices.max()), decimals0, decimals1, True)
+    span = max(tick_max - tick_min, BACKTEST_MIN_GRID_SPAN_TICKS)
+    low = (tick_min + tick_max) / 2 - span * (0.5 + margin)
+    high = (tick_min + tick_max) / 2 + span * (0.5 + margin)
+    step = max(1, math.ceil((high - low) / max(lines - 1, 1) / tick_spacing)) * tick_spacing
+    first = math.floor(low / tick_spacing) * tick_spacing
+    grid = first + step * np.arange(lines, dtype=np.int64)
+    min_tick = math.ceil(MIN_TICK / tick_spacing) * tick_spacing
+    max_tick = math.floor(MAX_TICK / tick_spacing) * tick_spacing
+    return np.unique(np.clip(grid, min_tick, max_tick))
+
+def candidate_ranges(grid, max_width_ticks=None, containing_tick=None):
+    # Alle Paare lower < upper aus dem Raster; mit containing_tick nur Ranges, die beim Einstieg in Range sind
+    # (eine Range komplett auf einer Seite ist eine Limit-Order und bekommt sonst eine unrealistische Konzentration)
+    lower_idx, upper_idx = np.triu_indices(len(grid), 1)
+    tick_lowers, tick_uppers = grid[lower_idx], grid[upper_idx]
+    keep = np.ones(len(tick_lowers), dtype=bool)
+    if max_width_ticks:
+        keep &= tick_uppers - tick_lowers <= max_width_ticks
+    if containing_tick is not None:
+        keep &= (tick_lowers <= containing_tick) & (containing_tick < tick_uppers)
+    return tick_lowers[keep], tick_uppers[keep]
+
+def sample_path(history, start, end, points=BACKTEST_PATH_POINTS):
+    # Gültiger Preis (letzter Tick davor) zu points gleichabständigen Zeitpunkten in [start, end]
+    times = np.linspace(start, end, max(points, 2))
+    idx = np.clip(np.searchsorted(history.ts, times, side='right') - 1, 0, len(history) - 1)
+    return history.prices[idx]
+
+def evaluate_ranges(history, tick_lowers, tick_uppers, decimals0, decimals1, window_seconds=BACKTEST_WINDOW_DAYS * 86400, now=None,
+                    fee_yield=None, capital_usd=BACKTEST_DEFAULT_CAPITAL_USD, path_points=BACKTEST_PATH_POINTS,
+                    is_token0_base=PRICE_PRESENTATION_IS_TOKEN0_BASE):
+    # history: TickHistory in Darstellungspreisen. Ergebnis: Dict gleich langer Arrays (eine Zeile pro Range) plus "meta".
+    # Einstieg am Fensteranfang zum dann gültigen Preis; fee_yield = Tagesgebühren einer Full-Range-Position pro USD Kapital.
+    native = native_history(history, is_token0_base)
+    now = float(native.ts[-1]) if now is None else now
+    start = max(now - window_seconds, float(native.ts[0]))
+    tick_lowers = np.asarray(tick_lowers, dtype=np.int64)
+    tick_uppers = np.asarray(tick_uppers, dtype=np.int64)
+    native_lowers = ticks_to_prices(tick_lowers, decimals0, decimals1, True)
+    native_uppers = ticks_to_prices(tick_uppers, decimals0, decimals1, True)
+    tir = time_in_range_matrix(native, native_lowers, native_uppers, [now - start], now)[:, 0]
+
+    path = sample_path(native, start, now, path_points)
+    entry_price, exit_price = path[0], path[-1]
+    count = len(tick_lowers)
+    conc = np.empty(count)
+    il_end = np.empty(count)
+    il_worst = np.empty(count)
+    share0_start = np.empty(count)
+    share0_end = np.empty(count)
+    for first in range(0, count, BACKTEST_CHUNK_RANGES):
+        block = slice(first, first + BACKTEST_CHUNK_RANGES)
+        sqrt_lowers = np.sqrt(native_lowers[block])[:, None]
+        sqrt_uppers = np.sqrt(native_uppers[block])[:, None]
+        amount0_start, amount1_start = amounts_per_liquidity(sqrt_lowers, sqrt_uppers, entry_price)
+        value_start = amount0_start * entry_price + amount1_start # in Token1 je Einheit Liquidität
+        amount0, amount1 = amounts_per_liquidity(sqrt_lowers, sqrt_uppers, path[None, :])
+        lp_values = amount0 * path + amount1
+        hodl_values = amount0_start * path + amount1_start
+        drift = lp_values / hodl_values - 1.0
+        conc[block] = (2.0 * np.sqrt(entry_price) / value_start)[:, 0]
+        il_end[block] = drift[:, -1] * 100
+        il_worst[block] = drift.min(axis=1) * 100
+        share0_start[block] = (amount0_start * entry_price / value_start)[:, 0] * 100
+        share0_end[block] = amount0[:, -1] * exit_price / lp_values[:, -1] * 100
+
+    days = (now - start) / 86400
+    fee_score = conc * np.nan_to_num(tir) / 100 # Full-Range-Tage-Äquivalent pro Tag
+    price_lowers, price_uppers = to_presentation(native_lowers, native_uppers, is_token0_base)
+    results = {
+        "tick_lower": tick_lowers, "tick_upper": tick_uppers, "price_lower": price_lowers, "price_upper": price_uppers,
+        "width_pct": (native_uppers / native_lowers - 1) * 100, "tir_pct": tir, "concentration": conc, "fee_score": fee_score,
+        "il_end_pct": il_end, "il_worst_pct": il_worst, "token0_share_start_pct": share0_start, "token0_share_end_pct": share0_end,
+        "est_fees_usd": np.full(count, np.nan), "il_usd": il_end / 100 * capital_usd, "net_usd": np.full(count, np.nan),
+    }
+    if fee_yield is not None:
+        results["est_fees_usd"] = fee_yield * capital_usd * fee_score * days
+        results["net_usd"] = results["est_fees_usd"] + results["il_usd"]
+    results["meta"] = {
+        "start": start, "now": now, "days": days, "ticks": int(np.count_nonzero((native.ts >= start) & (native.ts <= now))),
+        "entry_price": float(entry_price if is_token0_base else 1 / entry_price), "exit_price": float(exit_price if is_token0_base else 1 / exit_price),
+        "fee_yield": fee_yield, "capital_usd": capital_usd, "ranges": count,
+    }
+    return results
+
+def sweep(history, decimals0, decimals1, tick_spacing, window_seconds=BACKTEST_WINDOW_DAYS * 86400, grid_lines=BACKTEST_GRID_LINES,
+          margin=BACKTEST_GRID_MARGIN, max_width_ticks=None, include_out_of_range=False, extra_ranges=(), fee_yield=None,
+          capital_usd=BACKTEST_DEFAULT_CAPITAL_USD, sort_key="net_usd"):
+    # Raster über den Pfad im Fenster aufspannen, alle Kandidaten (plus extra_ranges am Ende) bewerten, Ranking -> (results, order)
+    native = native_history(history)
+    start = max(native.ts[-1] - window_seconds, native.ts[0])
+    window_prices = native.prices[native.ts >= start]
+    grid = tick_grid(window_prices if len(window_prices) else native.prices, decimals0, decimals1, tick_spacing, grid_lines, margin)
+    entry_tick = None if include_out_of_range else price_to_tick(float(sample_path(native, start, start, 2)[0]), decimals0, decimals1, True)
+    tick_lowers, tick_uppers = candidate_ranges(grid, max_width_ticks, entry_tick)
+    tick_lowers = np.concatenate([tick_lowers, [ticks[0] for ticks in extra_ranges]]).astype(np.int64)
+    tick_uppers = np.concatenate([tick_uppers, [ticks[1] for ticks in extra_ranges]]).astype(np.int64)
+    results = evaluate_ranges(history, tick_lowers, tick_uppers, decimals0, decimals1, window_seconds, fee_yield=fee_yield, capital_usd=capital_usd)
+    return results, rank(results, sort_key)
+
+def _snapshot_timestamp(date_str):
+    return datetime.strptime(date_str, '%Y-%m-%d').replace(hour=BACKTEST_SNAPSHOT_HOUR_UTC, tzinfo=timezone.utc).timestamp()
+
+def calibrate_fee_yield(all_data, history, base_token, quote_token, pool_address=None, is_token0_base=PRICE_PRESENTATION_IS_TOKEN0_BASE):
+    # Tagesgebühren pro USD Kapital einer gedachten Full-Range-Position: Summe der daily_earned_fees geteilt durch
+    # Summe aus Kapital * Konzentration der tatsächlichen Range * In-Range-Anteil des Tages, über alle Tage aller Positionen im Pool.
+    # In-Range-Anteil aus dem Pfad, wenn Ticks den Tag abdecken, sonst 1/0 nach dem Snapshot-Preis (Tage außerhalb fallen heraus).
+    # Ergebnis: (fee_yield oder None, Anzahl Tage, mittleres Kapital)
+    samples = []
+    for position_key, position in all_data.items():
+        capital = position.get("initial_investment_usd") if position_key.startswith("position_") else None
+        if not capital:
+            continue
+        for date_str, entry in (position.get("history") or {}).items():
+            earned = (entry.get("daily_earned_fees") or {}).get("total_usd")
+            position_range = entry.get("position_range") or {}
+            if earned is None or earned < 0 or None in (position_range.get("price_lower"), position_range.get("price_upper"), position_range.get("current_market_price")):
+                continue
+            if (position_range.get("base_token_for_price"), position_range.get("quote_token_for_price")) != (base_token, quote_token):
+                continue
+            if pool_address and position_range.get("pool_address") and position_range["pool_address"].lower() != pool_address.lower():
+                continue
+            samples.append((_snapshot_timestamp(date_str), float(capital), float(earned), position_range["price_lower"],
+                            position_range["price_upper"], position_range["current_market_price"]))
+    if not samples:
+        return None, 0, None
+
+    day_ends, capitals, earned, lowers, uppers, current = (np.array(column, dtype=np.float64) for column in zip(*samples))
+    if is_token0_base:
+        native_lowers, native_uppers, native_current = np.minimum(lowers, uppers), np.maximum(lowers, uppers), current
+    else:
+        native_lowers, native_uppers, native_current = 1.0 / np.maximum(lowers, uppers), 1.0 / np.minimum(lowers, uppers), 1.0 / current
+    in_range = ((native_current >= native_lowers) & (native_current <= native_uppers)).astype(np.float64)
+    if history is not None and len(history):
+        native = native_history(history, is_token0_base)
+        for day_end in np.unique(day_ends):
+            covered = min(day_end, native.ts[-1]) - max(day_end - 86400, native.ts[0])
+            if covered < 86400 * BACKTEST_MIN_DAY_COVERAGE:
+                continue
+            mask = day_ends == day_end
+            fraction = time_in_range_matrix(native, native_lowers[mask], native_uppers[mask], [86400], day_end)[:, 0] / 100
+            in_range[mask] = np.where(np.isnan(fraction), in_range[mask], fraction)
+    exposure = capitals * concentration(native_lowers, native_uppers, native_current) * in_range
+    used = exposure > 0
+    if not used.any():
+        return None, 0, float(capitals.mean())
+    return float(earned[used].sum() / exposure[used].sum()), int(used.sum()), float(capitals.mean())
+
+def rank(results, sort_key="net_usd"):
+    # Indizes absteigend (il_end_pct: am wenigsten negativ zuerst), NaN ans Ende
+    values = np.nan_to_num(results[sort_key].astype(np.float64), nan=-np.inf)
+    return np.argsort(-values, kind='stable')
+
+def find_pool(pool_cache, pool_address=None, pair=None, is_token0_base=PRICE_PRESENTATION_IS_TOKEN0_BASE):
+    # Pool-Eintrag aus pool_cache.json (Adresse, decimals, fee, Symbole); bei mehreren Fee-Stufen zum Paar die kleinste
+    matches = []
+    for entry in pool_cache.get("pools", {}).values():
+        if pool_address and entry.get("address", "").lower() == pool_address.lower():
+            return entry
+        if pair and pools.price_symbols(entry, is_token0_base) == pair:
+            matches.append(entry)
+    return min(matches, key=lambda entry: entry["fee"]) if matches else None
+
+def default_target(all_data):
+    # Pool der zuletzt aktualisierten Position (aktive vor geschlossenen): (pool_address oder None, (base, quote))
+    best = None
+    for position_key, position in all_data.items():
+        history = position.get("history") if position_key.startswith("position_") else None
+        if not history:
+            continue
+        last_date = max(history)
+        position_range = history[last_date].get("position_range") or {}
+        order_key = (bool(position.get("is_active", True)), last_date)
+        if position_range.get("base_token_for_price") and (best is None or order_key > best[0]):
+            best = (order_key, position_range.get("pool_address"), (position_range["base_token_for_price"], position_range["quote_token_for_price"]))
+    return (best[1], best[2]) if best else (None, None)
+
+def reference_ranges(all_data, pool_address, pair, decimals0, decimals1, tick_spacing, is_token0_base=PRICE_PRESENTATION_IS_TOKEN0_BASE):
+    # Aktuelle Ranges der getrackten Positionen im Pool als Ticks, um sie im Ranking wiederzufinden
+    references = {}
+    for position_key, position in all_data.items():
+        history = position.get("history") if position_key.startswith("position_") else None
+        if not history or not position.get("is_active", True):
+            continue
+        position_range = history[max(history)].get("position_range") or {}
+        if (position_range.get("base_token_for_price"), position_range.get("quote_token_for_price")) != pair:
+            continue
+        if pool_address and position_range.get("pool_address") and position_range["pool_address"].lower() != pool_address.lower():
+            continue
+        if position_range.get("price_lower") is None or position_range.get("price_upper") is None:
+            continue
+        ticks = sorted(price_to_tick(position_range[key], decimals0, decimals1, is_token0_base) for key in ("price_lower", "price_upper"))
+        # price_to_tick rundet ab; die Grenzen stammen aus tick_to_price, liegen also (bis auf Float-Rundung) auf einem Tick
+        ticks = [round(tick / tick_spacing) * tick_spacing for tick in ticks]
+        if ticks[0] < ticks[1]:
+            references[position_key] = tuple(ticks)
+    return references
+
+def format_table(results, order, top, labels=None, symbols=("token0", "token1")):
+    labels = labels or {}
+    lines = [f"{'Rang':>5} {'tickLower':>10} {'tickUpper':>10} {'Preisbereich':>23} {'Breite':>8} {'TiR':>6} {'Konz.':>6} "
+             f"{'Gebühren':>9} {'IL Ende':>8} {'IL max':>8} {f'{symbols[0]}-Anteil':>17} {'Netto':>9}"]
+    shown = list(order[:top]) + [i for i in labels if i not in set(order[:top].tolist())]
+    positions = {int(index): rank_no for rank_no, index in enumerate(order, 1)}
+    for i in shown:
+        fees = results["est_fees_usd"][i]
+        net = results["net_usd"][i]
+        lines.append(
+            f"{positions[int(i)]:>5} {results['tick_lower'][i]:>10} {results['tick_upper'][i]:>10} "
+            f"{results['price_lower'][i]:>11.6g}-{results['price_upper'][i]:<11.6g} {results['width_pct'][i]:>7.1f}% "
+            f"{results['tir_pct'][i]:>5.1f}% {results['concentration'][i]:>5.1f}x "
+            f"{'-' if np.isnan(fees) else f'{fees:.2f}':>9} {results['il_end_pct'][i]:>7.2f}% {results['il_worst_pct'][i]:>7.2f}% "
+            f"{results['token0_share_start_pct'][i]:>7.1f}%->{results['token0_share_end_pct'][i]:>5.1f}% "
+            f"{'-' if np.isnan(net) else f'{net:.2f}':>9}{'  <- ' + labels[i] if i in labels else ''}")
+    return "\n".join(lines)
+
+def export_results(path, results, order, pair):
+    columns = [key for key in results if key != "meta"]
+    rows = [{key: (None if isinstance(results[key][i], float) and math.isnan(results[key][i]) else results[key][i].item()) for key in columns}
+            for i in order]
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"pair": list(pair), "meta": results["meta"], "ranges": rows}, f, indent=1, allow_nan=False)
+    os.replace(tmp_path, path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Kandidaten-Ranges über den Preispfad der letzten Tage backtesten")
+    parser.add_argument("--pair", help="Darstellungspaar BASE/QUOTE wie in price_ticks.json, z.B. WETH/WBTC")
+    parser.add_argument("--pool", help="Pool-Adresse (Vorrang vor --pair)")
+    parser.add_argument("--days", type=float, default=BACKTEST_WINDOW_DAYS)
+    parser.add_argument("--grid-lines", type=int, default=BACKTEST_GRID_LINES, help="Anzahl Tick-Grenzen im Raster")
+    parser.add_argument("--margin", type=float, default=BACKTEST_GRID_MARGIN, help="Rand des Rasters als Anteil der Pfadspanne")
+    parser.add_argument("--max-width-ticks", type=int, help="Nur Ranges bis zu dieser Breite in Ticks")
+    parser.add_argument("--include-out-of-range", action="store_true", help="Auch Ranges, die beim Einstieg außerhalb liegen")
+    parser.add_argument("--capital", type=float, help="Kapital in USD (Default: mittleres initial_investment_usd der Positionen)")
+    parser.add_argument("--fee-yield", type=float, help="Tagesgebühren einer Full-Range-Position pro USD statt Kalibrierung aus fees_data.json")
+    parser.add_argument("--decimals", help="token0,token1-Decimals, falls der Pool nicht in pool_cache.json steht (z.B. 8,18)")
+    parser.add_argument("--fee", type=int, help="Fee-Stufe (500, 3000, ...), falls der Pool nicht in pool_cache.json steht")
+    parser.add_argument("--sort", choices=SORT_KEYS, help="Sortierung (Default: net_usd, ohne Gebührenrendite fee_score)")
+    parser.add_argument("--top", type=int, default=BACKTEST_TOP)
+    parser.add_argument("--output", help="Vollständiges Ranking als JSON schreiben")
+    parser.add_argument("--store-dir", default=tick_store.DEFAULT_STORE_DIR)
+    parser.add_argument("--ticks-json", default="price_ticks.json")
+    parser.add_argument("--fees-file", default="fees_data.json")
+    parser.add_argument("--pool-cache", default=pools.POOL_CACHE_FILE)
+    args = parser.parse_args()
+
+    import tracker # Laden wie im Cron-Lauf
+    started = time.perf_counter()
+    all_data = tracker.load_json_data(args.fees_file) if os.path.exists(args.fees_file) else {}
+    pool_address, pair = (args.pool.lower() if args.pool else None), (tuple(args.pair.split("/")) if args.pair else None)
+    if not pool_address and not pair:
+        pool_address, pair = default_target(all_data)
+    entry = find_pool(pools.load_pool_cache(args.pool_cache), pool_address, pair)
+    if entry:
+        pool_address, pair = entry["address"].lower(), pools.price_symbols(entry, PRICE_PRESENTATION_IS_TOKEN0_BASE)
+        decimals0, decimals1, fee = entry["decimals0"], entry["decimals1"], entry["fee"]
+    elif args.decimals and args.fee:
+        decimals0, decimals1 = (int(value) for value in args.decimals.split(","))
+        fee = args.fee
+    else:
+        print(f"Pool {pool_address or pair} nicht in {args.pool_cache}; --decimals und --fee angeben.")
+        return 1
+    if pair is None:
+        print("Paar unbekannt; --pair angeben.")
+        return 1
+    tick_spacing = TICK_SPACING_BY_FEE.get(fee)
+    if tick_spacing is None:
+        print(f"Unbekannte Fee-Stufe {fee}.")
+        return 1
+
+    histories = load_tick_histories(args.store_dir, json_path=args.ticks_json)
+    history = history_for_range(histories, {"pool_address": pool_address, "base_token_for_price": pair[0], "quote_token_for_price": pair[1]})
+    if history is None or len(history) < 2:
+        print(f"Keine Tick-Historie für {pair[0]}/{pair[1]} gefunden.")
+        return 1
+    window_seconds = args.days * 86400
+    loaded = time.perf_counter()
+
+    fee_yield, calibration_days, mean_capital = args.fee_yield, 0, None
+    if fee_yield is None:
+        fee_yield, calibration_days, mean_capital = calibrate_fee_yield(all_data, history, pair[0], pair[1], pool_address)
+    capital = args.capital or mean_capital or BACKTEST_DEFAULT_CAPITAL_USD
+    sort_key = args.sort or "net_usd"
+    if fee_yield is None and sort_key in ("net_usd", "est_fees_usd"):
+        sort_key = "fee_score" # Ohne Gebührenrendite gibt es keine USD-Schätzung
+
+    references = reference_ranges(all_data, pool_address, pair, decimals0, decimals1, tick_spacing)
+    results, order = sweep(history, decimals0, decimals1, tick_spacing, window_seconds, args.grid_lines, args.margin, args.max_width_ticks,
+                           args.include_out_of_range, list(references.values()), fee_yield, capital, sort_key)
+    finished = time.perf_counter()
+
+    meta = results["meta"]
+    start_str = datetime.fromtimestamp(meta["start"], timezone.utc).strftime('%Y-%m-%d %H:%M')
+    end_str = datetime.fromtimestamp(meta["now"], timezone.utc).strftime('%Y-%m-%d %H:%M')
+    print(f"Backtest {pair[0]}/{pair[1]} (Pool {pool_address or '?'}, Fee {fee}, tickSpacing {tick_spacing}): {start_str} - {end_str} UTC, "
+          f"{meta['ticks']} Ticks, Preis {meta['entry_price']:.6g} -> {meta['exit_price']:.6g}")
+    if fee_yield is not None:
+        source = "vorgegeben" if args.fee_yield is not None else f"aus {calibration_days} Tag(en) fees_data"
+        print(f"Full-Range-Gebührenrendite {fee_yield * 100:.4f} %/Tag ({source}), Kapital {capital:.0f} USD")
+    else:
+        print("Keine Gebührenhistorie für das Paar; sortiert nach fee_score (Konzentration x TiR), --fee-yield setzt eine Rendite.")
+    reference_rows = {len(results["tick_lower"]) - len(references) + i: key for i, key in enumerate(references)}
+    print(format_table(results, order, args.top, reference_rows, pair[::-1] if not PRICE_PRESENTATION_IS_TOKEN0_BASE else pair))
+    print(f"{meta['ranges']} Ranges, sortiert nach {sort_key}; Laden {loaded - started:.2f}s, Sweep {finished - loaded:.2f}s.")
+    if args.output:
+        export_results(args.output, results, order, pair)
+        print(f"Ranking nach {args.output} geschrieben.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,331 @@
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import platform
+import subprocess
+import contextlib
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import fees_db
+import rpc_cache
+import stand_in_node
+import tick_store
+from pools import PRICE_PRESENTATION_IS_TOKEN0_BASE
+from tickmath import sqrt_price_x96_to_price
+
+# Benchmarks für die heißen Pfade: fees_data.json laden/speichern (JSON und SQLite-Backend), Retention + Export des Tick-Stores,
+# Time-in-Range, Range-Backtest, Dashboard-Dateien, Kaltstart (Import) der Cron-Skripte und komplette tracker/price_updater-Läufe gegen stand_in_node.py mit Latenz.
+# Alle Daten kommen aus deterministischen Generatoren (fester Seed, Zeitachse endet an der vollen Stunde).
+# Start: python benchmark.py [--scale quick|full] [--output results.json] [--update-baseline]
+# Vergleich gegen benchmark_baseline.json; Exit-Code 1, wenn ein Fall langsamer als Baseline * Toleranz ist.
+BENCHMARK_BASELINE_FILE = "benchmark_baseline.json"
+BENCHMARK_SCALES = {
+    # Ticks im Store, Positionen x Tage in fees_data.json, Positionen/Pools für die End-to-End-Läufe
+    "quick": {"ticks": 100_000, "positions": 100, "days": 365, "e2e_positions": 20, "pools": 3},
+    "full": {"ticks": 1_000_000, "positions": 1_000, "days": 730, "e2e_positions": 200, "pools": 5},
+}
+BENCHMARK_SEED = 42
+BENCHMARK_TICK_DAYS = 15
+BENCHMARK_TOLERANCE = 1.5 # Median darf bis zum 1,5-fachen der Baseline liegen
+BENCHMARK_MIN_DELTA_SECONDS = 0.005 # Kleinere Abweichungen sind Rauschen
+COLD_START_MODULES = ("price_updater", "tracker")
+
+def anchor_time():
+    now = time.time()
+    return now - now % 3600
+
+def chain_state(positions, pool_count):
+    return stand_in_node.default_state(positions, pool_count=pool_count)
+
+def pool_specs(state):
+    # (Adresse, base, quote, Startpreis) pro Pool, so wie price_updater.py die Ticks ablegt
+    specs = []
+    for address, pool in state["pools"].items():
+        token0, token1 = state["tokens"][pool["token0"]], state["tokens"][pool["token1"]]
+        price = sqrt_price_x96_to_price(pool["sqrtPriceX96"], token0["decimals"], token1["decimals"], PRICE_PRESENTATION_IS_TOKEN0_BASE)
+        base, quote = (token0["symbol"], token1["symbol"]) if PRICE_PRESENTATION_IS_TOKEN0_BASE else (token1["symbol"], token0["symbol"])
+        specs.append((address, base, quote, price))
+    return specs
+
+def generate_ticks(store_dir, count, specs, anchor, days=BENCHMARK_TICK_DAYS, seed=BENCHMARK_SEED):
+    # count Ticks gleichmäßig auf die Pools verteilt, zufällige Abstände, Preis als geometrischer Random Walk
+    rng = np.random.default_rng(seed)
+    per_pool = count // len(specs)
+    records = []
+    for address, base, quote, start_price in specs:
+        pair_id = tick_store.get_pair_id(base, quote, store_dir, pool=address)
+        ts = np.sort(rng.uniform(anchor - days * 86400, anchor, per_pool))
+        prices = start_price * np.exp(np.cumsum(rng.normal(0, 0.0005, per_pool)))
+        records.append(np.rec.fromarrays([ts, prices, np.full(per_pool, pair_id)], dtype=tick_store.TICK_DTYPE))
+    ticks = np.concatenate(records)
+    ticks = ticks[np.argsort(ticks["ts"], kind='stable')]
+    return tick_store.append_ticks(zip(ticks["ts"].tolist(), ticks["price"].tolist(), ticks["pair"].tolist()), store_dir)
+
+def generate_fees_data(state, specs, days, anchor, seed=BENCHMARK_SEED):
+    # fees_data.json wie von tracker.py geschrieben: pro Position und Tag kumulierte Gebühren, Tagesertrag, Range
+    import tracker
+    rng = np.random.default_rng(seed)
+    spec_by_pool = {spec[0]: spec for spec in specs}
+    pool_by_tokens = {(pool["token0"], pool["token1"], pool["fee"]): address for address, pool in state["pools"].items()}
+    first_day = datetime.fromtimestamp(anchor, timezone.utc).date() - timedelta(days=days - 1)
+    all_data = {}
+    for position_id, pos in state["positions"].items():
+        pool_address = pool_by_tokens[(pos["token0"], pos["token1"], pos["fee"])]
+        _, base, quote, price = spec_by_pool[pool_address]
+        token0, token1 = state["tokens"][pos["token0"]], state["tokens"][pos["token1"]]
+        price0 = state["usd_prices"].get(pos["token0"], 1.0)
+        price1 = state["usd_prices"].get(pos["token1"], 1.0)
+        width = rng.uniform(0.05, 0.2)
+        position_range = {"price_lower": price * (1 - width), "price_upper": price * (1 + width), "current_market_price": price,
+                          "base_token_for_price": base, "quote_token_for_price": quote, "pool_address": pool_address}
+        daily0 = rng.uniform(0.5, 2.0, days) * 10 / price0
+        daily1 = rng.uniform(0.5, 2.0, days) * 10 / price1
+        cumulative0, cumulative1 = np.cumsum(daily0), np.cumsum(daily1)
+        history = {}
+        previous = None
+        for day in range(days):
+            date_str = (first_day + timedelta(days=day)).strftime('%Y-%m-%d')
+            total = tracker.fee_amounts_entry(float(cumulative0[day]), float(cumulative1[day]), price0, price1)
+            entry = {"total_unclaimed_fees": total, "daily_earned_fees": tracker.compute_daily_earned(total, previous, price0, price1),
+                     "position_range": dict(position_range)}
+            history[date_str] = entry
+            previous = entry
+        all_data[f"position_{position_id}"] = {
+            "history": history, "is_active": True, "initial_investment_usd": 1000.0,
+            "token_pair_symbols": f"{token0['symbol']}/{token1['symbol']}",
+            "last_updated_utc": datetime.fromtimestamp(anchor, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        }
+    return all_data
+
+def write_positions_file(path, state):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("# Benchmark\n" + "".join(f"{position_id},1000\n" for position_id in state["positions"]))
+
+@contextlib.contextmanager
+def working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+def measure(function, repeats, setup=None):
+    # Wall-Time pro Wiederholung; setup läuft vor jeder Wiederholung und zählt nicht mit
+    timings = []
+    for _ in range(repeats):
+        if setup:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+    return {"median_s": float(np.median(timings)), "min_s": min(timings), "max_s": max(timings), "repeats": repeats}
+
+def run_benchmarks(scale, latency_ms, repeats, only=None, work_dir=None):
+    import tracker
+    import price_updater
+    import coingecko
+    import backtest
+    import valuation
+    from dashboard_payloads import generate_dashboard
+    from time_in_range import TIME_IN_RANGE_WINDOWS, compute_time_in_range_for_positions, history_for_range, load_tick_histories
+
+    config = BENCHMARK_SCALES[scale]
+    anchor = anchor_time()
+    work_dir = work_dir or tempfile.mkdtemp(prefix="liqfee-bench-")
+    store_dir = os.path.join(work_dir, "price_ticks_store")
+    fees_path = os.path.join(work_dir, "fees_data.json")
+    ticks_json = os.path.join(work_dir, "price_ticks.json")
+    results = {}
+    def selected(name):
+        return not only or any(name.startswith(prefix) for prefix in only)
+
+    print(f"Erzeuge Daten ({scale}: {config['ticks']} Ticks, {config['positions']} Positionen x {config['days']} Tage) in {work_dir}...")
+    started = time.perf_counter()
+    state = chain_state(config["positions"], config["pools"])
+    specs = pool_specs(state)
+    generate_ticks(store_dir, config["ticks"], specs, anchor)
+    all_data = generate_fees_data(state, specs, config["days"], anchor)
+    with contextlib.redirect_stdout(io.StringIO()):
+        tracker.save_json_data(all_data, fees_path)
+    print(f"  fertig nach {time.perf_counter() - started:.1f}s, fees_data.json {os.path.getsize(fees_path) / 1e6:.1f} MB")
+
+    def run(name, function, repeat_count=repeats, setup=None):
+        if not selected(name):
+            return
+        results[name] = measure(function, repeat_count, setup)
+        print(f"  {name:<28} median {results[name]['median_s'] * 1000:9.1f} ms  (min {results[name]['min_s'] * 1000:.1f} ms)")
+
+    print("Benchmarks:")
+    run("json_load_fees_data", lambda: tracker.load_json_data(fees_path))
+    run("json_save_fees_data", lambda: tracker.save_json_data(all_data, fees_path))
+    if selected("fees_db_"):
+        # Gleiche Daten im SQLite-Backend: Migration, Laden, ein neuer Tag für alle Positionen (Upsert), Export ins JSON-Format
+        fees_db_path = os.path.join(work_dir, "fees_data.sqlite")
+        run("fees_db_migrate", lambda: fees_db.migrate(fees_path, fees_db_path), repeat_count=1)
+        run("fees_db_load", lambda: fees_db.load(fees_db_path))
+        db_data = fees_db.load(fees_db_path)
+        next_day = [datetime.fromtimestamp(anchor, timezone.utc).date()]
+        def fees_db_update_day():
+            next_day[0] += timedelta(days=1)
+            for position in db_data.values():
+                position["history"][next_day[0].isoformat()] = dict(position["history"][max(position["history"])])
+                position["last_updated_utc"] = f"{next_day[0].isoformat()}T17:00:00Z"
+            fees_db.save(db_data, fees_db_path)
+        run("fees_db_update_day", fees_db_update_day)
+        run("fees_db_export_json", lambda: fees_db.export_json(os.path.join(work_dir, "fees_data_export.json"), fees_db_path))
+        run("fees_db_export_json_compact", lambda: fees_db.export_json(os.path.join(work_dir, "fees_data_export.json"), fees_db_path, indent=None))
+    now_utc = datetime.fromtimestamp(anchor, timezone.utc)
+    run("tick_retention_compact", lambda: tick_store.compact(price_updater.MAX_AGE_DAYS, store_dir, now=now_utc))
+    run("tick_export_json", lambda: tick_store.export_json(ticks_json, store_dir, max_age_days=price_updater.MAX_AGE_DAYS, now=now_utc,
+                                                           min_interval_seconds=price_updater.PRICE_TICKS_EXPORT_MIN_INTERVAL_SECONDS))
+    run("tick_load_histories", lambda: load_tick_histories(store_dir, start=anchor - max(TIME_IN_RANGE_WINDOWS.values())))
+    first_range = next(iter(all_data.values()))["history"]
+    first_range = first_range[max(first_range)]["position_range"]
+    with working_directory(work_dir):
+        run("time_in_range_single", lambda: tracker.calculate_time_in_range_percentage(ticks_json, first_range))
+    histories = load_tick_histories(store_dir, start=anchor - max(TIME_IN_RANGE_WINDOWS.values()))
+    ranges = {key: data["history"][max(data["history"])]["position_range"] for key, data in all_data.items()}
+    run("time_in_range_all_positions", lambda: compute_time_in_range_for_positions(histories, ranges, TIME_IN_RANGE_WINDOWS, now=anchor))
+    # Range-Backtest über den ersten Pool: Gebührenrendite aus fees_data kalibrieren, dann das volle Raster bewerten
+    address, base, quote, _ = specs[0]
+    pool = state["pools"][address]
+    def backtest_sweep():
+        fee_yield, _, capital = backtest.calibrate_fee_yield(all_data, histories[address.lower()], base, quote, address)
+        return backtest.sweep(histories[address.lower()], state["tokens"][pool["token0"]]["decimals"], state["tokens"][pool["token1"]]["decimals"],
+                              backtest.TICK_SPACING_BY_FEE[pool["fee"]], fee_yield=fee_yield, capital_usd=capital)
+    run("backtest_sweep", backtest_sweep)
+    # Bewertung vs. HODL für alle Positionen mit liquidity/Ticks aus dem Stand-in-State, wie update_valuation im Tracker
+    def valuation_all_positions():
+        for position_id, pos in state["positions"].items():
+            valuation.compute_valuation(all_data[f"position_{position_id}"], pos["liquidity"], pos["tickLower"], pos["tickUpper"],
+                                        state["tokens"][pos["token0"]]["decimals"], state["tokens"][pos["token1"]]["decimals"],
+                                        token1_usd=state["usd_prices"].get(pos["token1"], 1.0),
+                                        tick_history=history_for_range(histories, ranges[f"position_{position_id}"]), now=anchor)
+    run("valuation_all_positions", valuation_all_positions)
+    dashboard_dir = os.path.join(work_dir, "dashboard")
+    run("dashboard_generate", lambda: generate_dashboard(all_data, dashboard_dir, store_dir, now=anchor),
+        setup=lambda: shutil.rmtree(dashboard_dir, ignore_errors=True))
+    # Frischer Interpreter pro Messung, der nur das Skript importiert: das zahlt jeder Cron-Aufruf vor dem ersten eth_call
+    for module in COLD_START_MODULES:
+        run(f"cold_start_{module}", lambda module=module: subprocess.run([sys.executable, "-c", f"import {module}"],
+                                                                        cwd=os.path.dirname(os.path.abspath(__file__)), check=True))
+
+    if selected("e2e_"):
+        # Komplette Läufe gegen den Stand-in-Node (RPC + CoinGecko) mit künstlicher Latenz pro HTTP-Request
+        e2e_dir = os.path.join(work_dir, "e2e")
+        os.makedirs(e2e_dir, exist_ok=True)
+        e2e_state = chain_state(config["e2e_positions"], config["pools"])
+        server, chain, url = stand_in_node.start_server(e2e_state, latency_ms=latency_ms)
+        previous_urls = (tracker.ARBITRUM_RPC_URL, tracker.WALLET_ADDRESS, price_updater.ARBITRUM_RPC_URL, coingecko.COINGECKO_API_URL)
+        tracker.ARBITRUM_RPC_URL = price_updater.ARBITRUM_RPC_URL = url
+        tracker.WALLET_ADDRESS = stand_in_node.DEFAULT_WALLET
+        coingecko.COINGECKO_API_URL = url + "/api/v3"
+        try:
+            shutil.copytree(store_dir, os.path.join(e2e_dir, "price_ticks_store"), dirs_exist_ok=True)
+            with contextlib.redirect_stdout(io.StringIO()):
+                tracker.save_json_data(generate_fees_data(e2e_state, pool_specs(e2e_state), config["days"], anchor - 86400),
+                                       os.path.join(e2e_dir, "fees_data.json"))
+            write_positions_file(os.path.join(e2e_dir, "positions_to_track.txt"), e2e_state)
+            # Eigener RPC-Cache; "latest"-Einträge wären zwischen zwei Cron-Läufen längst abgelaufen
+            rpc_cache.open_cache(os.path.join(e2e_dir, "rpc_cache.sqlite"), latest_ttl=0)
+            with working_directory(e2e_dir):
+                e2e_repeats = max(1, min(repeats, 3))
+                for name, function in (("e2e_tracker", tracker.main), ("e2e_tracker_async", lambda: tracker.main(use_async=True)),
+                                       ("e2e_price_updater", price_updater.main)):
+                    if not selected(name):
+                        continue
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        function() # Aufwärmen: Pool-Cache, Preis-Cache und Migration wie im eingeschwungenen Cron-Betrieb
+                    chain.request_count = 0
+                    run(name, function, e2e_repeats)
+                    results[name]["http_requests"] = chain.request_count // e2e_repeats
+        finally:
+            tracker.ARBITRUM_RPC_URL, tracker.WALLET_ADDRESS, price_updater.ARBITRUM_RPC_URL, coingecko.COINGECKO_API_URL = previous_urls
+            server.shutdown()
+
+    return {
+        "scale": scale, "config": config, "latency_ms": latency_ms, "seed": BENCHMARK_SEED,
+        "created_utc": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(), "machine": platform.machine(), "numpy": np.__version__,
+        "results": results,
+    }
+
+def compare(report, baseline, tolerance=BENCHMARK_TOLERANCE, min_delta=BENCHMARK_MIN_DELTA_SECONDS):
+    # Liefert die Liste der Regressionen (Name, Baseline, aktuell); Fälle ohne Baseline werden nur gemeldet.
+    reference = (baseline or {}).get(report["scale"], {})
+    if reference.get("latency_ms", report["latency_ms"]) != report["latency_ms"]:
+        print(f"Warnung: Baseline wurde mit {reference['latency_ms']} ms Latenz gemessen, aktuell {report['latency_ms']} ms.")
+    regressions = []
+    print(f"Vergleich mit Baseline ({report['scale']}, Toleranz x{tolerance:g}):")
+    for name, result in report["results"].items():
+        expected = reference.get("results", {}).get(name)
+        if expected is None:
+            print(f"  {name:<28} keine Baseline")
+            continue
+        ratio = result["median_s"] / expected if expected else float("inf")
+        regressed = result["median_s"] > expected * tolerance and result["median_s"] - expected > min_delta
+        print(f"  {name:<28} {expected * 1000:9.1f} ms -> {result['median_s'] * 1000:9.1f} ms  x{ratio:.2f}{'  LANGSAMER' if regressed else ''}")
+        if regressed:
+            regressions.append((name, expected, result["median_s"]))
+    return regressions
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def update_baseline(path, report):
+    baseline = load_baseline(path)
+    baseline[report["scale"]] = {
+        "latency_ms": report["latency_ms"], "created_utc": report["created_utc"], "python": report["python"], "machine": report["machine"],
+        "results": {name: round(result["median_s"], 6) for name, result in report["results"].items()},
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks für tracker.py/price_updater.py mit synthetischen Daten")
+    parser.add_argument("--scale", choices=sorted(BENCHMARK_SCALES), default="quick")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=50, help="Künstliche Latenz des Stand-in-Nodes pro HTTP-Request")
+    parser.add_argument("--only", action="append", help="Nur Fälle mit diesem Namenspräfix (mehrfach möglich)")
+    parser.add_argument("--output", help="Ergebnisse als JSON schreiben")
+    parser.add_argument("--baseline", default=BENCHMARK_BASELINE_FILE)
+    parser.add_argument("--tolerance", type=float, default=BENCHMARK_TOLERANCE)
+    parser.add_argument("--update-baseline", action="store_true", help="Ergebnisse als neue Baseline für diese Skala speichern")
+    parser.add_argument("--work-dir", help="Verzeichnis für die erzeugten Daten (Default: temporär, wird gelöscht)")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="liqfee-bench-")
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        report = run_benchmarks(args.scale, args.latency_ms, args.repeats, args.only, work_dir)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Ergebnisse nach {args.output} geschrieben.")
+    if args.update_baseline:
+        update_baseline(args.baseline, report)
+        print(f"Baseline {args.baseline} ({args.scale}) aktualisiert.")
+        return 0
+    regressions = compare(report, load_baseline(args.baseline), args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} Fall/Fälle langsamer als die Baseline.")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
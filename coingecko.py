@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import random
+import threading
+import requests
+import instrumentation
+
+# Preis-Client für CoinGecko: ein simple/token_price-Request für alle Token eines Laufs, geteilte HTTP-Session,
+# TTL-Cache (Speicher + Datei), Token-Bucket-Rate-Limit, Backoff mit Jitter und Fallback auf den letzten Preis.
+COINGECKO_API_URL = os.getenv('COINGECKO_API_URL', "https://api.coingecko.com/api/v3") # Für Tests auf einen lokalen Stub zeigen lassen
+COINGECKO_API_KEY = os.getenv('COINGECKO_API_KEY') # Optional (Demo-Key)
+PRICE_CACHE_FILE = "price_cache.json"
+PRICE_CACHE_TTL_SECONDS = 5 * 60
+PRICE_CACHE_MAX_AGE_SECONDS = 14 * 24 * 3600 # Älter wird auch als Fallback nicht mehr verwendet
+PRICE_CACHE_MAX_ENTRIES = 500
+MAX_ADDRESSES_PER_REQUEST = 100
+REQUESTS_PER_MINUTE = 10
+
+class TokenBucket:
+    def __init__(self, rate_per_second, capacity):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class PriceQuote:
+    def __init__(self, usd, fetched_at, stale=False):
+        self.usd = usd
+        self.fetched_at = fetched_at
+        self.stale = stale
+
+    def __repr__(self):
+        return f"PriceQuote(usd={self.usd}, fetched_at={self.fetched_at}, stale={self.stale})"
+
+class PriceClient:
+    def __init__(self, platform_id="arbitrum-one", base_url=None, cache_file=PRICE_CACHE_FILE,
+                 ttl_seconds=PRICE_CACHE_TTL_SECONDS, max_entries=PRICE_CACHE_MAX_ENTRIES,
+                 requests_per_minute=REQUESTS_PER_MINUTE, retries=3, backoff_base=1.0, backoff_max=10.0, timeout=10):
+        self.platform_id = platform_id
+        self.base_url = (base_url or COINGECKO_API_URL).rstrip("/")
+        self.cache_file = cache_file
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["Accept"] = "application/json"
+        if COINGECKO_API_KEY:
+            self.session.headers["x-cg-demo-api-key"] = COINGECKO_API_KEY
+        self.rate_limiter = TokenBucket(requests_per_minute / 60.0, capacity=max(1, requests_per_minute // 2))
+        self.cache = self._load_cache()
+
+    def _load_cache(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return {addr: entry for addr, entry in data.get(self.platform_id, {}).items() if isinstance(entry, dict) and "usd" in entry}
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"    Warnung: Preis-Cache {self.cache_file} nicht lesbar ({e}). Starte mit leerem Cache.")
+            return {}
+
+    def save_cache(self):
+        if not self.cache_file:
+            return
+        self._evict()
+        data = {}
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                data = {}
+        data[self.platform_id] = self.cache
+        tmp_path = self.cache_file + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.cache_file)
+        except OSError as e:
+            print(f"    Warnung: Preis-Cache {self.cache_file} nicht gespeichert: {e}")
+
+    def _evict(self):
+        now = time.time()
+        for addr in [addr for addr, entry in self.cache.items() if now - entry["ts"] > PRICE_CACHE_MAX_AGE_SECONDS]:
+            del self.cache[addr]
+        if len(self.cache) > self.max_entries:
+            for addr in sorted(self.cache, key=lambda a: self.cache[a]["ts"])[:len(self.cache) - self.max_entries]:
+                del self.cache[addr]
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            delay = min(self.backoff_max, retry_after)
+        else:
+            delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        delay *= random.uniform(0.5, 1.5)
+        print(f"    Retrying CoinGecko in {delay:.1f} seconds...")
+        time.sleep(delay)
+
+    def _get_json(self, url, params, description):
+        endpoint = "market_chart/range" if url.endswith("/market_chart/range") else "simple/token_price"
+        for attempt in range(self.retries):
+            if attempt:
+                instrumentation.record_retry("coingecko")
+            self.rate_limiter.acquire()
+            start = time.perf_counter()
+            try:
+                try:
+                    response = self.session.get(url, params=params, timeout=self.timeout)
+                except requests.exceptions.RequestException:
+                    instrumentation.record_http("coingecko", endpoint, time.perf_counter() - start, error=True)
+                    raise
+                instrumentation.record_http("coingecko", endpoint, time.perf_counter() - start, len(response.request.url or ""),
+                                            len(response.content), error=not response.ok)
+                if response.status_code == 429 or response.status_code >= 500:
+                    retry_after = response.headers.get("Retry-After")
+                    print(f"    CoinGecko HTTP {response.status_code}. Attempt {attempt + 1}/{self.retries}.")
+                    if attempt < self.retries - 1:
+                        self._backoff(attempt, float(retry_after) if retry_after and retry_after.isdigit() else None)
+                    continue
+                response.raise_for_status()
+                return response.json()
+            except requests.exceptions.RequestException as req_err:
+                print(f"    CoinGecko API request error: {req_err}. Attempt {attempt + 1}/{self.retries}.")
+            except json.JSONDecodeError as json_err:
+                print(f"    Error decoding CoinGecko JSON response: {json_err}. Attempt {attempt + 1}/{self.retries}.")
+            if attempt < self.retries - 1:
+                self._backoff(attempt)
+        print(f"    All CoinGecko retries failed for {description}.")
+        return None
+
+    def _fetch_chunk(self, addresses):
+        url = f"{self.base_url}/simple/token_price/{self.platform_id}"
+        params = {"contract_addresses": ",".join(addresses), "vs_currencies": "usd"}
+        data = self._get_json(url, params, f"{len(addresses)} token(s)")
+        if not isinstance(data, dict):
+            return {}
+        return {addr.lower(): values.get("usd") for addr, values in data.items() if isinstance(values, dict)}
+
+    def get_price_history(self, contract_address, start_ts, end_ts):
+        # [(epoch, usd), ...] aufsteigend, für Backfills. Wird nicht gecacht.
+        url = f"{self.base_url}/coins/{self.platform_id}/contract/{contract_address.lower()}/market_chart/range"
+        params = {"vs_currency": "usd", "from": int(start_ts), "to": int(end_ts)}
+        data = self._get_json(url, params, f"price history of {contract_address}")
+        if not isinstance(data, dict):
+            return []
+        return sorted((point[0] / 1000.0, point[1]) for point in data.get("prices", []) if len(point) == 2 and point[1] is not None)
+
+    def get_prices(self, contract_addresses):
+        # Ergebnis: {adresse (wie übergeben): PriceQuote oder None}
+        now = time.time()
+        quotes = {}
+        missing = []
+        for address in contract_addresses:
+            entry = self.cache.get(address.lower())
+            if entry and now - entry["ts"] < self.ttl_seconds:
+                quotes[address] = PriceQuote(entry["usd"], entry["ts"])
+            elif address.lower() not in missing:
+                missing.append(address.lower())
+
+        fetched = {}
+        for start in range(0, len(missing), MAX_ADDRESSES_PER_REQUEST):
+            fetched.update(self._fetch_chunk(missing[start:start + MAX_ADDRESSES_PER_REQUEST]))
+        for address, usd in fetched.items():
+            if usd is not None:
+                self.cache[address] = {"usd": usd, "ts": now}
+
+        for address in contract_addresses:
+            if address in quotes:
+                continue
+            if fetched.get(address.lower()) is not None:
+                quotes[address] = PriceQuote(fetched[address.lower()], now)
+                continue
+            entry = self.cache.get(address.lower())
+            if entry is None or now - entry["ts"] > PRICE_CACHE_MAX_AGE_SECONDS:
+                print(f"    Warning: No USD price for {address} (kein Cache-Eintrag vorhanden).")
+                quotes[address] = None
+            else:
+                print(f"    Warning: Using last known USD price for {address} ({(now - entry['ts']) / 3600:.1f}h alt).")
+                quotes[address] = PriceQuote(entry["usd"], entry["ts"], stale=True)
+        if fetched:
+            self.save_cache()
+        return quotes
@@ -0,0 +1,229 @@
+import os
+import re
+import sys
+import json
+import gzip
+import hashlib
+from datetime import datetime, timezone
+import numpy as np
+import tick_store
+from time_in_range import history_for_range, history_key, load_tick_histories
+
+# Vorberechnete Dateien für index.html: eine kleine Übersicht (index.json) plus pro Position Gebühren-Rollups
+# und pro Paar/Zoomstufe LTTB-verkleinerte Preisserien. Alles außer index.json hat einen Content-Hash im Namen
+# (unbegrenzt cachebar) und liegt zusätzlich vorkomprimiert als .gz daneben.
+DASHBOARD_DIR = "dashboard"
+DASHBOARD_INDEX_FILE = "index.json"
+CHART_ZOOM_LEVELS = {"24h": (24 * 3600, 300), "7d": (7 * 24 * 3600, 400), "15d": (15 * 24 * 3600, 500)} # Fenster, max. Punkte
+RECENT_FEES_DAYS = 3
+PRICE_SIGNIFICANT_DIGITS = 8
+HASH_LENGTH = 12
+
+def lttb(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: Indizes der Punkte, die die Form der Kurve am besten erhalten.
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    every = (n - 2) / (threshold - 2)
+    bounds = np.minimum((np.arange(threshold - 1) * every).astype(np.int64) + 1, n - 1)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    # Mittelwerte aller Folge-Buckets vorab über Präfixsummen statt .mean() pro Bucket
+    next_bounds = np.append(bounds[1:], n)
+    counts = next_bounds - bounds
+    sum_x, sum_y = np.concatenate(([0.0], np.cumsum(x, dtype=np.float64))), np.concatenate(([0.0], np.cumsum(y, dtype=np.float64)))
+    avg_xs = ((sum_x[next_bounds] - sum_x[bounds]) / counts).tolist()
+    avg_ys = ((sum_y[next_bounds] - sum_y[bounds]) / counts).tolist()
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = bounds[i], bounds[i + 1]
+        avg_x, avg_y = avg_xs[i + 1], avg_ys[i + 1]
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def _slug(text):
+    return re.sub(r"[^a-z0-9]+", "-", str(text).lower()).strip("-") or "x"
+
+def _round_price(price):
+    return float(f"{price:.{PRICE_SIGNIFICANT_DIGITS}g}")
+
+def _write_if_missing(path, content):
+    if os.path.exists(path):
+        return
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def write_hashed(out_dir, stem, payload):
+    # Schreibt <stem>.<hash>.json und .json.gz; gleicher Inhalt ergibt denselben Namen, die Datei bleibt dann unberührt.
+    content = json.dumps(payload, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    name = f"{stem}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}.json"
+    _write_if_missing(os.path.join(out_dir, name), content)
+    _write_if_missing(os.path.join(out_dir, name + ".gz"), gzip.compress(content, compresslevel=9, mtime=0))
+    return name
+
+def _latest_range(position_data):
+    history = position_data.get("history") or {}
+    for date in sorted(history, reverse=True):
+        if history[date].get("position_range"):
+            return history[date]["position_range"]
+    return None
+
+def price_series(history, window_seconds, max_points, now):
+    if history is None or len(history) == 0:
+        return None
+    lo = int(np.searchsorted(history.ts, now - window_seconds, side='left'))
+    hi = int(np.searchsorted(history.ts, now, side='right'))
+    if hi <= lo:
+        return None
+    ts, prices = history.ts[lo:hi], history.prices[lo:hi]
+    keep = lttb(ts - ts[0], prices, max_points)
+    return {"t": [int(t) for t in ts[keep].tolist()], "p": [_round_price(p) for p in prices[keep].tolist()]}
+
+def fee_rollup(position_data):
+    # Tageswerte aufsteigend als Spalten, dazu die kumulierte USD-Summe.
+    rollup = {"dates": [], "token0": [], "token1": [], "usd": [], "cumulative_usd": []}
+    cumulative = 0.0
+    history = position_data.get("history") or {}
+    for date in sorted(history):
+        earned = history[date].get("daily_earned_fees")
+        if not earned:
+            continue
+        usd = earned.get("total_usd")
+        if usd is not None:
+            cumulative += float(usd)
+        rollup["dates"].append(date)
+        rollup["token0"].append(earned.get("token0_actual"))
+        rollup["token1"].append(earned.get("token1_actual"))
+        rollup["usd"].append(usd)
+        rollup["cumulative_usd"].append(round(cumulative, 6))
+    return rollup
+
+def analytics_summary(analytics):
+    # fee_analytics ohne die internen Fortschreibungsfelder
+    if not analytics:
+        return None
+    return {
+        "cumulative_usd": analytics["cumulative"]["usd"],
+        "mean_daily_usd": analytics.get("mean_daily_usd"),
+        "apr_percent": analytics.get("apr_percent"),
+        "windows": {name: {key: window.get(key) for key in ("sum_usd", "mean_usd", "apr_percent", "usd_days")}
+                    for name, window in analytics["windows"].items()},
+        "best_day": analytics.get("best_day"),
+        "worst_day": analytics.get("worst_day"),
+    }
+
+def valuation_summary(valuation_data):
+    # Bewertung ohne die Serie (die liegt in einer eigenen Hash-Datei)
+    if not valuation_data:
+        return None
+    return {key: value for key, value in valuation_data.items() if key != "series"}
+
+def position_summary(position_data, rollup):
+    history_dates = sorted(position_data.get("history") or {})
+    recent = [[date, usd] for date, usd in zip(rollup["dates"], rollup["usd"]) if usd is not None][-RECENT_FEES_DAYS:]
+    return {
+        "is_active": position_data.get("is_active") is True,
+        "token_pair_symbols": position_data.get("token_pair_symbols"),
+        "initial_investment_usd": position_data.get("initial_investment_usd"),
+        "last_updated_utc": position_data.get("last_updated_utc"),
+        "time_in_range_24h_percentage": position_data.get("time_in_range_24h_percentage"),
+        "time_in_range_percentages": position_data.get("time_in_range_percentages"),
+        "usd_prices_stale": position_data.get("usd_prices_stale", False),
+        "total_earned_usd": rollup["cumulative_usd"][-1] if rollup["cumulative_usd"] else 0.0,
+        "history_days": len(history_dates),
+        "first_date": history_dates[0] if history_dates else None,
+        "last_date": history_dates[-1] if history_dates else None,
+        "recent_fees": list(reversed(recent)),
+        "fee_analytics": analytics_summary(position_data.get("fee_analytics")),
+        "position_range": _latest_range(position_data),
+        "valuation": valuation_summary(position_data.get("valuation")),
+    }
+
+def _referenced_files(index):
+    names = set()
+    for entry in (index or {}).get("positions", {}).values():
+        files = entry.get("files", {})
+        names.update(name for name in [files.get("fees"), files.get("valuation")] + list(files.get("charts", {}).values()) if name)
+    return names | {name + ".gz" for name in names}
+
+def _load_index(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return None
+
+def prune(out_dir, keep):
+    removed = 0
+    for name in os.listdir(out_dir):
+        if name == DASHBOARD_INDEX_FILE or name in keep or not (name.endswith(".json") or name.endswith(".json.gz")):
+            continue
+        os.remove(os.path.join(out_dir, name))
+        removed += 1
+    return removed
+
+def generate_dashboard(all_data, out_dir=DASHBOARD_DIR, store_dir=tick_store.DEFAULT_STORE_DIR, ticks_json=None, now=None):
+    now = datetime.now(timezone.utc).timestamp() if now is None else now
+    os.makedirs(out_dir, exist_ok=True)
+    index_path = os.path.join(out_dir, DASHBOARD_INDEX_FILE)
+    previous_index = _load_index(index_path)
+    histories = load_tick_histories(store_dir, ticks_json, start=now - max(window for window, _ in CHART_ZOOM_LEVELS.values()))
+
+    chart_files = {} # Pool-Adresse bzw. (base, quote) -> {zoom: Dateiname}; Positionen im selben Pool teilen sich die Dateien
+    positions = {}
+    for position_key in sorted(key for key in all_data if key.startswith("position_")):
+        position_data = all_data[position_key]
+        rollup = fee_rollup(position_data)
+        summary = position_summary(position_data, rollup)
+        summary["files"] = {"fees": write_hashed(out_dir, f"fees_{_slug(position_key.replace('position_', ''))}", rollup), "charts": {}}
+        valuation_data = position_data.get("valuation")
+        if valuation_data and valuation_data.get("series"):
+            series = dict(valuation_data["series"], token1_usd=valuation_data.get("token1_usd"))
+            summary["files"]["valuation"] = write_hashed(out_dir, f"valuation_{_slug(position_key.replace('position_', ''))}", series)
+        position_range = summary["position_range"]
+        if summary["is_active"] and position_range:
+            key = history_key(position_range)
+            if key not in chart_files:
+                chart_files[key] = {}
+                base, quote = position_range.get("base_token_for_price"), position_range.get("quote_token_for_price")
+                pool = position_range.get("pool_address")
+                stem = f"price_{_slug(quote)}_{_slug(base)}" + (f"_{pool.lower()[2:10]}" if pool else "")
+                for zoom, (window_seconds, max_points) in CHART_ZOOM_LEVELS.items():
+                    series = price_series(history_for_range(histories, position_range), window_seconds, max_points, now)
+                    if series is not None:
+                        series.update({"base_token": base, "quote_token": quote, "zoom": zoom})
+                        if pool:
+                            series["pool"] = pool
+                        chart_files[key][zoom] = write_hashed(out_dir, f"{stem}_{zoom}", series)
+            summary["files"]["charts"] = chart_files[key]
+        positions[position_key] = summary
+
+    index = {
+        "generated_at_utc": datetime.fromtimestamp(now, timezone.utc).isoformat(),
+        "zoom_levels": list(CHART_ZOOM_LEVELS),
+        "positions": positions,
+    }
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, separators=(",", ":")) # Reihenfolge der Zoomstufen bleibt erhalten
+    os.replace(tmp_path, index_path)
+    # Dateien der vorigen Generation bleiben bis zum nächsten Lauf liegen, falls ein Browser den alten Index noch hat.
+    prune(out_dir, _referenced_files(index) | _referenced_files(previous_index))
+    return index
+
+def main():
+    fees_path = sys.argv[1] if len(sys.argv) > 1 else "fees_data.json"
+    with open(fees_path, 'r', encoding='utf-8') as f:
+        all_data = json.load(f)
+    index = generate_dashboard(all_data, ticks_json="price_ticks.json")
+    total = sum(os.path.getsize(os.path.join(DASHBOARD_DIR, name)) for name in os.listdir(DASHBOARD_DIR))
+    print(f"{len(index['positions'])} Position(en) nach '{DASHBOARD_DIR}' geschrieben ({total / 1024:.1f} KB inkl. .gz).")
+
+if __name__ == "__main__":
+    main()
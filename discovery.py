@@ -0,0 +1,173 @@
+import os
+import sys
+import json
+import argparse
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+import pools
+from abi_codec import keccak256, to_checksum_address
+from multicall import ChunkSizer, RpcError, aggregate3, encode_call, rpc_batch, rpc_request
+
+# Findet alle NFPM-Positionen einer Wallet. Erster Lauf: balanceOf + tokenOfOwnerByIndex als aggregate3 an einem
+# festen Block; danach nur noch Transfer-Logs des NFPM (an bzw. von der Wallet) seit dem gespeicherten Cursor.
+# Normalfall ist eine einzige Batch-Anfrage (eth_blockNumber + zwei eth_getLogs bis "latest"), große Lücken
+# laufen in Chunks. Logs der letzten DISCOVERY_CONFIRMATIONS Blöcke werden erst im nächsten Lauf übernommen (Reorgs).
+# Positionen mit Liquidität 0 merkt sich tracker.py hier als "closed" (inaktiv, aber weiter beobachtet).
+# Anzeigen/Neu scannen: python discovery.py [--rescan]
+load_dotenv()
+
+ARBITRUM_RPC_URL = os.getenv('ARBITRUM_RPC')
+WALLET_ADDRESS = os.getenv('WALLET_ADDRESS')
+POSITION_DISCOVERY = os.getenv('POSITION_DISCOVERY', "1") == "1" # 0: nur positions_to_track.txt wie bisher
+DISCOVERY_STATE_FILE = "positions_discovered.json"
+DISCOVERY_CONFIRMATIONS = 20 # Wie swap_ingest.py
+DISCOVERY_INITIAL_CHUNK_BLOCKS = 50000 # Nur für den Chunk-Fallback; Transfers einer Wallet sind selten
+TRANSFER_EVENT_TOPIC = "0x" + keccak256(b"Transfer(address,address,uint256)").hex()
+
+def _address_topic(address):
+    return "0x" + "00" * 12 + address[2:].lower()
+
+def load_state(filename=DISCOVERY_STATE_FILE):
+    if not os.path.exists(filename):
+        return {}
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        print(f"Warnung: {filename} ist korrupt. Positionen werden neu gescannt.")
+        return {}
+
+def save_state(state, filename=DISCOVERY_STATE_FILE):
+    tmp_path = filename + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, filename)
+
+def enumerate_positions(rpc_url, wallet_address, block):
+    # Alle Token-IDs der Wallet am Block (ERC721Enumerable); unvollständige Antworten sind ein Fehler, kein Ergebnis
+    block_tag = hex(block)
+    balance = aggregate3(rpc_url, [(pools.NFPM_ADDRESS, encode_call("balanceOf(address)", ["address"], [wallet_address]), ["uint256"])], block_tag)[0]
+    if balance is None:
+        raise RpcError(f"NFPM.balanceOf({wallet_address}) fehlgeschlagen")
+    results = aggregate3(rpc_url, [(pools.NFPM_ADDRESS, encode_call("tokenOfOwnerByIndex(address,uint256)", ["address", "uint256"], [wallet_address, index]), ["uint256"])
+                                   for index in range(balance[0])], block_tag)
+    if any(result is None for result in results):
+        raise RpcError(f"NFPM.tokenOfOwnerByIndex für {sum(result is None for result in results)} Index(e) fehlgeschlagen")
+    return sorted(result[0] for result in results)
+
+def _transfer_log_calls(wallet_address, from_block, to_block):
+    # Zwei Filter (an die Wallet, von der Wallet): eth_getLogs kennt kein ODER über verschiedene Topic-Positionen
+    wallet_topic = _address_topic(wallet_address)
+    to_tag = to_block if isinstance(to_block, str) else hex(to_block)
+    return [("eth_getLogs", [{"address": pools.NFPM_ADDRESS, "topics": topics, "fromBlock": hex(from_block), "toBlock": to_tag}])
+            for topics in ([TRANSFER_EVENT_TOPIC, None, wallet_topic], [TRANSFER_EVENT_TOPIC, wallet_topic])]
+
+def _merge_logs(results):
+    logs = {}
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+        for log in result:
+            logs[(int(log["blockNumber"], 16), int(log["logIndex"], 16))] = log # Transfer an sich selbst steht in beiden Listen
+    return [logs[key] for key in sorted(logs)]
+
+def apply_transfers(position_ids, logs, wallet_address, max_block=None):
+    # Transfers in Block-Reihenfolge anwenden: an die Wallet -> hinzu, von der Wallet -> weg (Mint/Burn über die Null-Adresse)
+    wallet_topic = _address_topic(wallet_address)
+    owned = set(position_ids)
+    applied = 0
+    for log in logs:
+        if max_block is not None and int(log["blockNumber"], 16) > max_block:
+            continue
+        topics = [topic.lower() for topic in log["topics"]]
+        if len(topics) != 4 or topics[0] != TRANSFER_EVENT_TOPIC:
+            continue
+        token_id = int(topics[3], 16)
+        if topics[2] == wallet_topic:
+            owned.add(token_id)
+        elif topics[1] == wallet_topic:
+            owned.discard(token_id)
+        applied += 1
+    return sorted(owned), applied
+
+def _scan_chunked(rpc_url, wallet_address, position_ids, from_block, to_block, sizer):
+    # Für große Lücken: feste Blockbereiche, bei Provider-Fehlern wird derselbe Bereich kleiner erneut angefragt
+    applied = 0
+    start = from_block
+    while start <= to_block:
+        end = min(to_block, start + sizer.size - 1)
+        try:
+            logs = _merge_logs(rpc_batch(rpc_url, _transfer_log_calls(wallet_address, start, end)))
+        except Exception as e:
+            if not sizer.failed():
+                raise
+            print(f"  eth_getLogs {start}-{end} fehlgeschlagen ({e}). Neue Chunk-Größe: {sizer.size} Blöcke.")
+            continue
+        sizer.succeeded(len(logs))
+        position_ids, chunk_applied = apply_transfers(position_ids, logs, wallet_address)
+        applied += chunk_applied
+        start = end + 1
+    return position_ids, applied
+
+def discover(rpc_url, wallet_address, state_file=DISCOVERY_STATE_FILE, rescan=False):
+    # Aktuelle Token-IDs der Wallet; der Stand landet mit Cursor in state_file
+    wallet_address = to_checksum_address(wallet_address)
+    state = load_state(state_file)
+    same_wallet = state.get("wallet", "").lower() == wallet_address.lower()
+    if rescan or not same_wallet or state.get("cursor") is None:
+        head = int(rpc_request(rpc_url, "eth_blockNumber", []), 16) - DISCOVERY_CONFIRMATIONS
+        position_ids = enumerate_positions(rpc_url, wallet_address, head)
+        print(f"Positions-Scan für {wallet_address} an Block {head}: {len(position_ids)} Position(en).")
+        state = {"wallet": wallet_address, "closed": state.get("closed", []) if same_wallet and not rescan else []}
+    else:
+        position_ids = state.get("position_ids", [])
+        # Ein Request im Normalfall: Kopf und alle Transfers seit dem Cursor; übernommen wird nur bis Kopf - Bestätigungen
+        latest, *log_results = rpc_batch(rpc_url, [("eth_blockNumber", [])] + _transfer_log_calls(wallet_address, state["cursor"] + 1, "latest"))
+        if isinstance(latest, Exception):
+            raise latest
+        head = max(state["cursor"], int(latest, 16) - DISCOVERY_CONFIRMATIONS)
+        try:
+            position_ids, applied = apply_transfers(position_ids, _merge_logs(log_results), wallet_address, max_block=head)
+        except Exception as e:
+            print(f"  eth_getLogs ab Block {state['cursor'] + 1} fehlgeschlagen ({e}), lese in Chunks.")
+            sizer = ChunkSizer(state.get("chunk_size", DISCOVERY_INITIAL_CHUNK_BLOCKS))
+            position_ids, applied = _scan_chunked(rpc_url, wallet_address, position_ids, state["cursor"] + 1, head, sizer)
+            state["chunk_size"] = sizer.size
+        if applied:
+            print(f"{applied} NFPM-Transfer(s) seit Block {state['cursor'] + 1}: {len(position_ids)} Position(en) in der Wallet.")
+    state.update({"cursor": head, "position_ids": position_ids, "updated_utc": datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')})
+    save_state(state, state_file)
+    return position_ids
+
+def known_position_ids(state_file=DISCOVERY_STATE_FILE, include_closed=False):
+    # Zuletzt gefundene Positionen ohne RPC (price_updater.py, Fallback bei RPC-Fehlern)
+    state = load_state(state_file)
+    closed = set() if include_closed else set(state.get("closed", []))
+    return [position_id for position_id in state.get("position_ids", []) if position_id not in closed]
+
+def closed_position_ids(state_file=DISCOVERY_STATE_FILE):
+    return set(load_state(state_file).get("closed", []))
+
+def set_closed(position_ids, state_file=DISCOVERY_STATE_FILE):
+    state = load_state(state_file)
+    if sorted(position_ids) != state.get("closed", []):
+        state["closed"] = sorted(position_ids)
+        save_state(state, state_file)
+
+def main():
+    parser = argparse.ArgumentParser(description="NFPM-Positionen einer Wallet finden (Erstscan + inkrementell über Transfer-Logs)")
+    parser.add_argument("--wallet", default=WALLET_ADDRESS)
+    parser.add_argument("--state-file", default=DISCOVERY_STATE_FILE)
+    parser.add_argument("--rescan", action="store_true", help="Cursor verwerfen und per balanceOf/tokenOfOwnerByIndex neu aufzählen")
+    args = parser.parse_args()
+    if not ARBITRUM_RPC_URL or not args.wallet:
+        print("CRITICAL Error: ARBITRUM_RPC und WALLET_ADDRESS (bzw. --wallet) müssen gesetzt sein.")
+        return 1
+    position_ids = discover(ARBITRUM_RPC_URL, args.wallet, args.state_file, rescan=args.rescan)
+    closed = closed_position_ids(args.state_file)
+    for position_id in position_ids:
+        print(f"  {position_id}" + (" (Liquidität 0, inaktiv)" if position_id in closed else ""))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
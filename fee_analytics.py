@@ -0,0 +1,238 @@
+import sys
+import math
+import argparse
+from datetime import date, timedelta
+
+# Laufende Kennzahlen pro Position, gespeichert als position_data["fee_analytics"] neben der history:
+# kumulierte Gebühren, rollierende 7/30-Tage-Summen und -Mittel, annualisierte APR gegen initial_investment_usd
+# sowie bester/schlechtester Tag. tracker.main schreibt sie pro neuem Tag in O(1) fort (für Tage, die aus einem
+# Fenster fallen, wird der Wert per Datum in der history nachgeschlagen). Fällt ein Tag aus der Reihe (Lücke
+# rückwärts, Backfill, manuelle Änderung), wird aus der history neu aufgebaut.
+# Prüfen/Reparieren: python fee_analytics.py verify|repair [--file fees_data.json] [--positions 4806838,...]
+ANALYTICS_VERSION = 1
+ANALYTICS_WINDOWS_DAYS = (7, 30)
+DAYS_PER_YEAR = 365
+VERIFY_REL_TOLERANCE = 1e-9
+VERIFY_ABS_TOLERANCE = 1e-9 # USD; gleitende Summen entstehen durch Addieren/Subtrahieren und driften minimal
+
+def _parse_date(date_str):
+    return date.fromisoformat(date_str)
+
+def day_values(history_entry):
+    # (usd, token0, token1) eines Tages oder None, wenn für den Tag keine Tageseinnahmen vorliegen; usd kann None sein
+    earned = (history_entry or {}).get("daily_earned_fees")
+    if not earned:
+        return None
+    usd = earned.get("total_usd")
+    return (float(usd) if usd is not None else None, float(earned.get("token0_actual") or 0.0), float(earned.get("token1_actual") or 0.0))
+
+def empty_state():
+    return {
+        "version": ANALYTICS_VERSION,
+        "first_date": None, "last_date": None, "last_day": None,
+        "days": 0, "usd_days": 0,
+        "cumulative": {"token0": 0.0, "token1": 0.0, "usd": 0.0},
+        "best_day": None, "worst_day": None,
+        "windows": {f"{days}d": {"days": days, "sum_usd": 0.0, "usd_days": 0} for days in ANALYTICS_WINDOWS_DAYS},
+    }
+
+def _apr_percent(mean_daily_usd, investment):
+    if mean_daily_usd is None or not investment:
+        return None
+    return mean_daily_usd * DAYS_PER_YEAR / investment * 100
+
+def derive(state, investment):
+    # Abgeleitete Werte (Mittel, APR) hängen vom aktuellen Initialinvestment ab und werden bei jedem Schreiben neu gesetzt
+    investment = float(investment) if investment else None
+    state["mean_daily_usd"] = state["cumulative"]["usd"] / state["usd_days"] if state["usd_days"] else None
+    state["apr_percent"] = _apr_percent(state["mean_daily_usd"], investment)
+    for window in state["windows"].values():
+        window["mean_usd"] = window["sum_usd"] / window["usd_days"] if window["usd_days"] else None
+        window["apr_percent"] = _apr_percent(window["mean_usd"], investment)
+    return state
+
+def _add(state, values, sign=1):
+    usd, token0, token1 = values
+    state["days"] += sign
+    state["cumulative"]["token0"] += sign * token0
+    state["cumulative"]["token1"] += sign * token1
+    if usd is not None:
+        state["usd_days"] += sign
+        state["cumulative"]["usd"] += sign * usd
+
+def _add_to_windows(state, values, sign=1):
+    if values is None or values[0] is None:
+        return
+    for window in state["windows"].values():
+        window["sum_usd"] += sign * values[0]
+        window["usd_days"] += sign
+
+def _track_extremes(state, date_str, usd):
+    if usd is None:
+        return
+    if state["best_day"] is None or usd > state["best_day"]["usd"]:
+        state["best_day"] = {"date": date_str, "usd": usd}
+    if state["worst_day"] is None or usd < state["worst_day"]["usd"]:
+        state["worst_day"] = {"date": date_str, "usd": usd}
+
+def _advance_windows(state, history, new_date):
+    # Verschiebt jedes Fenster von [last-N+1, last] auf [new-N+1, new]: höchstens N Lookups, unabhängig von der History-Länge
+    last_date = _parse_date(state["last_date"])
+    for window in state["windows"].values():
+        days = window["days"]
+        if (new_date - last_date).days >= days:
+            window["sum_usd"], window["usd_days"] = 0.0, 0 # Ganzes Fenster fällt heraus
+            continue
+        evict = last_date - timedelta(days=days - 1)
+        while evict <= new_date - timedelta(days=days):
+            values = day_values(history.get(evict.isoformat()))
+            if values is not None and values[0] is not None:
+                window["sum_usd"] -= values[0]
+                window["usd_days"] -= 1
+            evict += timedelta(days=1)
+
+def add_day(state, history, date_str):
+    # Nimmt einen Tag nach state["last_date"] auf. Rückgabe False, wenn das inkrementell nicht geht (Neuaufbau nötig).
+    values = day_values(history.get(date_str))
+    if state["last_date"] is not None:
+        if date_str < state["last_date"]:
+            return False
+        if date_str == state["last_date"]:
+            # Zweiter Lauf am selben Tag: alten Beitrag herausrechnen. War er bester/schlechtester Tag, hilft nur Neuaufbau.
+            previous = tuple(state["last_day"]) if state["last_day"] else None
+            if previous is not None and previous[0] is not None and any(
+                    extreme and extreme["date"] == date_str for extreme in (state["best_day"], state["worst_day"])):
+                return False
+            if previous is not None:
+                _add(state, previous, sign=-1)
+                _add_to_windows(state, previous, sign=-1)
+        else:
+            _advance_windows(state, history, _parse_date(date_str))
+    if state["first_date"] is None:
+        state["first_date"] = date_str
+    state["last_date"] = date_str
+    state["last_day"] = list(values) if values is not None else None
+    if values is not None:
+        _add(state, values)
+        _add_to_windows(state, values)
+        _track_extremes(state, date_str, values[0])
+    return True
+
+def rebuild(position_data):
+    history = position_data.get("history") or {}
+    state = empty_state()
+    for date_str in sorted(history):
+        add_day(state, history, date_str)
+    return derive(state, position_data.get("initial_investment_usd"))
+
+def update(position_data, date_str):
+    # Nach dem Schreiben von history[date_str] aufrufen; legt das Ergebnis in position_data["fee_analytics"] ab.
+    state = position_data.get("fee_analytics")
+    history = position_data.get("history") or {}
+    if not state or state.get("version") != ANALYTICS_VERSION or not add_day(state, history, date_str):
+        state = rebuild(position_data)
+    else:
+        derive(state, position_data.get("initial_investment_usd"))
+    position_data["fee_analytics"] = state
+    return state
+
+def refresh_investment(position_data):
+    # Nur APR neu berechnen, z.B. nachdem sich initial_investment_usd in der Config geändert hat
+    if position_data.get("fee_analytics"):
+        derive(position_data["fee_analytics"], position_data.get("initial_investment_usd"))
+
+def expected_analytics(position_data):
+    # Unabhängige Referenz für verify: direkte Summen über die History statt Fortschreibung
+    history = position_data.get("history") or {}
+    dates = sorted(history)
+    values = {date_str: day_values(history[date_str]) for date_str in dates}
+    usd_values = [(date_str, v[0]) for date_str, v in values.items() if v is not None and v[0] is not None]
+    investment = position_data.get("initial_investment_usd")
+    expected = {
+        "first_date": dates[0] if dates else None,
+        "last_date": dates[-1] if dates else None,
+        "days": sum(1 for v in values.values() if v is not None),
+        "usd_days": len(usd_values),
+        "cumulative": {
+            "token0": math.fsum(v[1] for v in values.values() if v is not None),
+            "token1": math.fsum(v[2] for v in values.values() if v is not None),
+            "usd": math.fsum(usd for _, usd in usd_values),
+        },
+        "best_day": None, "worst_day": None, "windows": {},
+    }
+    if usd_values:
+        best = max(usd_values, key=lambda item: item[1])
+        worst = min(usd_values, key=lambda item: item[1])
+        expected["best_day"] = {"date": best[0], "usd": best[1]}
+        expected["worst_day"] = {"date": worst[0], "usd": worst[1]}
+    for days in ANALYTICS_WINDOWS_DAYS:
+        start = (_parse_date(dates[-1]) - timedelta(days=days - 1)).isoformat() if dates else None
+        in_window = [usd for date_str, usd in usd_values if start <= date_str]
+        expected["windows"][f"{days}d"] = {"days": days, "sum_usd": math.fsum(in_window), "usd_days": len(in_window)}
+    return derive(expected, investment)
+
+def _differences(expected, actual, path=""):
+    if isinstance(expected, dict):
+        if not isinstance(actual, dict):
+            return [f"{path or '/'}: erwartet Objekt, gefunden {actual!r}"]
+        found = []
+        for key, value in expected.items():
+            found.extend(_differences(value, actual.get(key), f"{path}/{key}"))
+        return found
+    if isinstance(expected, float) and isinstance(actual, (int, float)) and not isinstance(actual, bool):
+        if math.isclose(expected, actual, rel_tol=VERIFY_REL_TOLERANCE, abs_tol=VERIFY_ABS_TOLERANCE):
+            return []
+    elif expected == actual:
+        return []
+    return [f"{path}: erwartet {expected!r}, gefunden {actual!r}"]
+
+def verify(position_data):
+    # Liste der Abweichungen zwischen gespeicherten und frisch berechneten Kennzahlen (leer = in Ordnung)
+    state = position_data.get("fee_analytics")
+    if not state:
+        return ["fee_analytics fehlt"] if position_data.get("history") else []
+    if state.get("version") != ANALYTICS_VERSION:
+        return [f"Version {state.get('version')} statt {ANALYTICS_VERSION}"]
+    return _differences(expected_analytics(position_data), state)
+
+def repair(all_data, position_keys=None):
+    repaired = []
+    for position_key in position_keys or [key for key in all_data if key.startswith("position_")]:
+        if position_key in all_data and verify(all_data[position_key]):
+            all_data[position_key]["fee_analytics"] = rebuild(all_data[position_key])
+            repaired.append(position_key)
+    return repaired
+
+def main():
+    parser = argparse.ArgumentParser(description="Gebühren-Kennzahlen in fees_data.json prüfen oder neu berechnen")
+    parser.add_argument("command", choices=["verify", "repair"])
+    parser.add_argument("--file", default="fees_data.json")
+    parser.add_argument("--positions", help="Kommagetrennte Positions-IDs (Default: alle)")
+    args = parser.parse_args()
+
+    import tracker # Laden/Speichern wie im Cron-Lauf
+    all_data = tracker.load_json_data(args.file)
+    position_keys = [key for key in all_data if key.startswith("position_")]
+    if args.positions:
+        position_keys = [f"position_{pid.strip()}" for pid in args.positions.split(",") if pid.strip()]
+
+    if args.command == "repair":
+        repaired = repair(all_data, position_keys)
+        if repaired:
+            tracker.save_json_data(all_data, args.file)
+        print(f"{len(repaired)} von {len(position_keys)} Position(en) neu berechnet{': ' + ', '.join(repaired) if repaired else ''}.")
+        return 0
+
+    failures = 0
+    for position_key in position_keys:
+        differences = verify(all_data.get(position_key, {}))
+        if differences:
+            failures += 1
+            print(f"{position_key}: {len(differences)} Abweichung(en)")
+            for difference in differences[:10]:
+                print(f"  {difference}")
+    print(f"{len(position_keys) - failures}/{len(position_keys)} Position(en) in Ordnung." + (" Reparatur: python fee_analytics.py repair" if failures else ""))
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
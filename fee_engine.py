@@ -0,0 +1,157 @@
+import os
+import sys
+import argparse
+from dotenv import load_dotenv
+import pools
+from abi_codec import decode
+from multicall import aggregate3, encode_call, rpc_batch, rpc_request
+
+# Nicht abgeholte Gebühren aus dem Fee-Growth-State statt per collect()-Simulation: feeGrowthGlobal0/1X128 des Pools,
+# feeGrowthOutside der beiden Range-Ticks und feeGrowthInside*LastX128/tokensOwed* aus NFPM.positions().
+# Rechnet wie Pool und NFPM (Solidity 0.7, uint256/uint128 mit Überlauf), braucht keinen Owner als msg.sender und
+# läuft für beliebig viele Positionen in einem aggregate3.
+# Abgleich mit collect(): python fee_engine.py [--positions 4806838,...]  bzw. gegen den Stand-in-Node: --stand-in 50
+Q128 = 2**128
+UINT256_MASK = 2**256 - 1
+UINT128_MASK = 2**128 - 1
+MAX_FEE_GROWTH_DELTA = 2**255 # feeGrowthInside wächst nur; eine "negative" Differenz heißt: Reads aus verschiedenen Blöcken
+POOL_TICKS_OUTPUT_TYPES = ["uint128", "int128", "uint256", "uint256", "int56", "uint160", "uint32", "bool"]
+
+def fee_growth_inside(tick_current, tick_lower, tick_upper, fee_growth_global, lower_outside, upper_outside):
+    # Tick.getFeeGrowthInside für einen Token; alle Differenzen modulo 2**256
+    below = lower_outside if tick_current >= tick_lower else (fee_growth_global - lower_outside) & UINT256_MASK
+    above = upper_outside if tick_current < tick_upper else (fee_growth_global - upper_outside) & UINT256_MASK
+    return (fee_growth_global - below - above) & UINT256_MASK
+
+def owed_amount(tokens_owed, liquidity, fee_growth_inside_now, fee_growth_inside_last):
+    # NFPM.collect: tokensOwed += uint128(mulDiv(inside - insideLast, liquidity, Q128)).
+    # None statt eines umgebrochenen Werts (~2**128 Token), wenn der State nicht konsistent ist.
+    delta = (fee_growth_inside_now - fee_growth_inside_last) & UINT256_MASK
+    accrued = delta * liquidity // Q128
+    if delta >= MAX_FEE_GROWTH_DELTA or accrued > UINT128_MASK:
+        return None
+    return (tokens_owed + accrued) & UINT128_MASK
+
+def uncollected_fees(position_details, tick_current, fee_growth_globals, lower_tick, upper_tick):
+    # position_details: NFPM.positions()-Tupel, lower_tick/upper_tick: Pool.ticks()-Tupel -> (amount0, amount1) oder None
+    tick_lower, tick_upper, liquidity = position_details[5], position_details[6], position_details[7]
+    amounts = []
+    for token in (0, 1):
+        inside = fee_growth_inside(tick_current, tick_lower, tick_upper, fee_growth_globals[token], lower_tick[2 + token], upper_tick[2 + token])
+        amounts.append(owed_amount(position_details[10 + token], liquidity, inside, position_details[8 + token]))
+    return None if None in amounts else tuple(amounts)
+
+def state_calls(positions_by_id, pool_address_by_id, include_slot0=False):
+    # Calls für den Fee-Growth-State aller Pools/Range-Ticks (jeder Pool und jeder Tick nur einmal) plus Layout zum Zuordnen
+    layout, calls = [], []
+    for pool_address in sorted({address for pid, address in pool_address_by_id.items() if address and positions_by_id.get(pid)}):
+        for token in (0, 1):
+            layout.append(("global", pool_address, token))
+            calls.append((pool_address, encode_call(f"feeGrowthGlobal{token}X128()"), ["uint256"]))
+        if include_slot0:
+            layout.append(("slot0", pool_address, None))
+            calls.append((pool_address, encode_call("slot0()"), pools.SLOT0_OUTPUT_TYPES))
+    ticks = sorted({(address, positions_by_id[pid][i]) for pid, address in pool_address_by_id.items() if address and positions_by_id.get(pid) for i in (5, 6)})
+    for pool_address, tick in ticks:
+        layout.append(("tick", pool_address, tick))
+        calls.append((pool_address, encode_call("ticks(int24)", ["int24"], [tick]), POOL_TICKS_OUTPUT_TYPES))
+    return calls, layout
+
+def parse_state(layout, results):
+    state = {"globals": {}, "ticks": {}, "slot0": {}}
+    for (kind, pool_address, key), result in zip(layout, results):
+        if kind == "global":
+            state["globals"].setdefault(pool_address, [None, None])[key] = result[0] if result else None
+        elif kind == "slot0":
+            state["slot0"][pool_address] = result
+        else:
+            state["ticks"][(pool_address, key)] = result
+    return state
+
+def compute_uncollected(positions_by_id, pool_address_by_id, pool_slot0, fee_state):
+    # {position_id: (amount0, amount1) oder None, wenn ein Teil des States fehlt}
+    uncollected = {}
+    for pid, details in positions_by_id.items():
+        pool_address = pool_address_by_id.get(pid)
+        slot0 = pool_slot0.get(pool_address) if pool_address else None
+        globals_ = fee_state["globals"].get(pool_address)
+        lower_tick = fee_state["ticks"].get((pool_address, details[5])) if details else None
+        upper_tick = fee_state["ticks"].get((pool_address, details[6])) if details else None
+        if not details or not slot0 or not globals_ or None in globals_ or not lower_tick or not upper_tick:
+            uncollected[pid] = None
+            continue
+        uncollected[pid] = uncollected_fees(details, slot0[1], globals_, lower_tick, upper_tick)
+        if uncollected[pid] is None:
+            print(f"  Warnung: Fee-Growth-State für Position {pid} inkonsistent (feeGrowthInside kleiner als beim letzten Update), verworfen.")
+    return uncollected
+
+def read_uncollected(rpc_url, positions_by_id, pool_address_by_id, block="latest"):
+    # Eigenständiger Read (ein aggregate3 inkl. slot0) für Aufrufer, die slot0 nicht ohnehin schon lesen
+    calls, layout = state_calls(positions_by_id, pool_address_by_id, include_slot0=True)
+    fee_state = parse_state(layout, aggregate3(rpc_url, calls, block))
+    return compute_uncollected(positions_by_id, pool_address_by_id, fee_state["slot0"], fee_state)
+
+def simulate_collect(rpc_url, position_ids, block="latest"):
+    # Referenz: collect() je Position mit from=ownerOf(id), als JSON-RPC-Batch
+    owners = aggregate3(rpc_url, [(pools.NFPM_ADDRESS, encode_call("ownerOf(uint256)", ["uint256"], [pid]), ["address"]) for pid in position_ids], block)
+    batch_ids, calls = [], []
+    for pid, owner in zip(position_ids, owners):
+        if not owner:
+            continue
+        data = encode_call("collect((uint256,address,uint128,uint128))", ["(uint256,address,uint128,uint128)"], [(pid, owner[0], UINT128_MASK, UINT128_MASK)])
+        batch_ids.append(pid)
+        calls.append(("eth_call", [{"from": owner[0], "to": pools.NFPM_ADDRESS, "data": "0x" + data.hex()}, block]))
+    collected = {pid: None for pid in position_ids}
+    for pid, result in zip(batch_ids, rpc_batch(rpc_url, calls)):
+        if not isinstance(result, Exception):
+            collected[pid] = decode(["uint256", "uint256"], bytes.fromhex(result[2:]))
+    return collected
+
+def cross_check(rpc_url, position_ids, cache_file=pools.POOL_CACHE_FILE):
+    block = hex(int(rpc_request(rpc_url, "eth_blockNumber", [], cache=False), 16)) # Beide Seiten am selben Block
+    calls = [(pools.NFPM_ADDRESS, encode_call("positions(uint256)", ["uint256"], [pid]), pools.NFPM_POSITIONS_OUTPUT_TYPES) for pid in position_ids]
+    positions_by_id = dict(zip(position_ids, aggregate3(rpc_url, calls, block)))
+    pool_by_position = pools.resolve_position_pools(rpc_url, position_ids, positions_by_id, cache_file)
+    pool_address_by_id = {pid: entry["address"] if entry else None for pid, entry in pool_by_position.items()}
+    engine = read_uncollected(rpc_url, positions_by_id, pool_address_by_id, block)
+    collected = simulate_collect(rpc_url, position_ids, block)
+    mismatches = 0
+    for pid in position_ids:
+        ok = engine[pid] is not None and collected[pid] is not None and tuple(engine[pid]) == tuple(collected[pid])
+        mismatches += 0 if ok else 1
+        print(f"  Position {pid}: fee_engine {engine[pid]}, collect {collected[pid]}{'' if ok else '  ABWEICHUNG'}")
+    return mismatches
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="fee_engine gegen collect()-Simulation abgleichen")
+    parser.add_argument("--positions", help="Kommagetrennte Positions-IDs (Default: positions_to_track.txt)")
+    parser.add_argument("--stand-in", type=int, metavar="N", help="Gegen einen lokalen Stand-in-Node mit N Positionen prüfen")
+    parser.add_argument("--pools", type=int, default=3, help="Pools im Stand-in-Node")
+    args = parser.parse_args()
+
+    rpc_url = os.getenv('ARBITRUM_RPC')
+    server = None
+    if args.stand_in:
+        import stand_in_node
+        state = stand_in_node.default_state(args.stand_in, pool_count=args.pools)
+        server, _, rpc_url = stand_in_node.start_server(state)
+        position_ids = [int(pid) for pid in state["positions"]]
+        cache_file = None
+    else:
+        import tracker
+        position_ids = [int(pid) for pid in args.positions.split(",")] if args.positions else [config['id'] for config in tracker.get_position_configs()]
+        cache_file = pools.POOL_CACHE_FILE
+    if not rpc_url or not position_ids:
+        print("ARBITRUM_RPC und mindestens eine Position nötig.")
+        return 1
+    try:
+        mismatches = cross_check(rpc_url, position_ids, cache_file) # Stand-in: ohne pool_cache.json
+    finally:
+        if server:
+            server.shutdown()
+    print(f"{len(position_ids) - mismatches}/{len(position_ids)} Position(en) stimmen mit collect() überein.")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
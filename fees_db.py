@@ -0,0 +1,290 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+from dotenv import load_dotenv
+
+# Optionales SQLite-Backend für fees_data.json (FEES_DB_FILE setzen, z.B. fees_data.sqlite):
+# - positions: ein Eintrag pro Top-Level-Key (Reihenfolge = Einfügereihenfolge), data = Position ohne history/fee_analytics
+#   (beide bleiben als Platzhalter null im Objekt stehen, damit die Key-Reihenfolge beim Export erhalten bleibt)
+# - snapshots: ein Eintrag pro Position und Tag, Primärschlüssel (position_key, date)
+# - aggregates: fee_analytics pro Position
+# WAL-Modus, Schreiben in einer Transaktion: price_updater.py kann lesen, während tracker.py schreibt.
+# load() liefert dasselbe Dict wie json.load (und ist schneller als json.load der eingerückten Datei); die History merkt
+# sich geänderte Tage, save() schreibt nur diese (Upsert) plus geänderte Positions-/Aggregat-Zeilen. Einträge nur in-place
+# zu verändern (history[date]["x"] = ...) wird nicht erkannt; dann den Tag neu zuweisen oder die History ersetzen
+# (wird komplett neu geschrieben).
+# export_json() streamt die Datenbank zeilenweise ins bisherige Format (indent=2, bytegleich zu json.dump) oder kompakt;
+# tracker.py exportiert nach jedem Speichern kompakt (FEES_DB_EXPORT_JSON=0 schaltet das ab).
+# Pflege: python fees_db.py migrate|export|verify|stats [--db fees_data.sqlite] [--json fees_data.json]
+load_dotenv()
+
+FEES_DB_FILE = os.getenv('FEES_DB_FILE', "") # Leer: fees_data.json bleibt der Speicher
+FEES_DB_EXPORT_JSON = os.getenv('FEES_DB_EXPORT_JSON', "1") == "1" # Nach jedem Speichern fees_data.json für bisherige Leser erzeugen (kompakt)
+FEES_DB_JSON_INDENT = 2 # Wie save_json_data
+PLACEHOLDER_KEYS = ("history", "fee_analytics")
+COMPACT_SEPARATORS = (",", ":")
+
+class TrackedHistory(dict):
+    # History einer Position; merkt sich gesetzte und gelöschte Tage seit dem Laden bzw. letzten Speichern
+    def __init__(self, *args, source=None):
+        super().__init__(*args)
+        self.source = source
+        self.changed = set()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.changed.add(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.changed.add(key)
+
+    def pop(self, key, *default):
+        self.changed.add(key)
+        return super().pop(key, *default)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        self.changed.update(self.keys())
+        super().clear()
+
+class FeesData(dict):
+    # Ergebnis von load(): merkt sich Quelle und geladene Keys, damit save() gelöschte Positionen erkennt
+    def __init__(self, source=None):
+        super().__init__()
+        self.source = source
+        self.loaded_keys = set()
+
+def _source(path):
+    return os.path.abspath(path)
+
+def exists(path=FEES_DB_FILE):
+    return bool(path) and os.path.exists(path)
+
+def connect(path=FEES_DB_FILE):
+    connection = sqlite3.connect(path, timeout=30, isolation_level=None) # Transaktionen explizit (BEGIN IMMEDIATE)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("""CREATE TABLE IF NOT EXISTS positions (
+        position_key TEXT PRIMARY KEY, position_id INTEGER, is_active INTEGER, data TEXT NOT NULL)""")
+    connection.execute("""CREATE TABLE IF NOT EXISTS snapshots (
+        position_key TEXT NOT NULL, date TEXT NOT NULL, daily_earned_usd REAL, total_unclaimed_usd REAL, data TEXT NOT NULL,
+        PRIMARY KEY (position_key, date)) WITHOUT ROWID""")
+    connection.execute("CREATE TABLE IF NOT EXISTS aggregates (position_key TEXT PRIMARY KEY, data TEXT NOT NULL)")
+    return connection
+
+def _dumps(value):
+    return json.dumps(value, separators=COMPACT_SEPARATORS)
+
+def _is_position(key, value):
+    return key.startswith("position_") and isinstance(value, dict)
+
+def _position_id(key):
+    try:
+        return int(key.replace("position_", ""))
+    except ValueError:
+        return None
+
+def _snapshot_row(key, date_str, entry):
+    entry = entry if isinstance(entry, dict) else {}
+    daily = (entry.get("daily_earned_fees") or {}).get("total_usd")
+    total = (entry.get("total_unclaimed_fees") or {}).get("total_usd")
+    return key, date_str, daily, total, _dumps(entry)
+
+def load(path=FEES_DB_FILE):
+    # Komplettes fees_data-Dict. Die History jeder Position setzt SQLite per group_concat zu einem JSON-Objekt zusammen
+    # (die Tage sind bereits kompaktes JSON, Datumsstrings brauchen kein Escaping), Python parst sie mit einem json.loads.
+    source = _source(path)
+    all_data = FeesData(source)
+    connection = connect(path)
+    try:
+        rows = connection.execute("""SELECT p.position_key, p.data, a.data,
+            (SELECT '{' || group_concat('"' || date || '":' || data, ',') || '}' FROM
+                (SELECT date, data FROM snapshots WHERE position_key = p.position_key ORDER BY date))
+            FROM positions p LEFT JOIN aggregates a ON a.position_key = p.position_key ORDER BY p.rowid""")
+        for key, data, aggregates, history in rows:
+            value = json.loads(data)
+            if _is_position(key, value):
+                if "history" in value:
+                    value["history"] = TrackedHistory(json.loads(history) if history else {}, source=source)
+                if "fee_analytics" in value:
+                    value["fee_analytics"] = json.loads(aggregates) if aggregates else None
+            all_data[key] = value
+            all_data.loaded_keys.add(key)
+    finally:
+        connection.close()
+    return all_data
+
+def _save_position(connection, key, value, source, known):
+    # Schreibt eine Position; Rückgabe: Anzahl geschriebener/gelöschter Zeilen
+    written = 0
+    meta = {field: (None if field in PLACEHOLDER_KEYS else field_value) for field, field_value in value.items()}
+    written += connection.execute("""INSERT INTO positions (position_key, position_id, is_active, data) VALUES (?, ?, ?, ?)
+        ON CONFLICT (position_key) DO UPDATE SET position_id = excluded.position_id, is_active = excluded.is_active, data = excluded.data
+        WHERE positions.data IS NOT excluded.data""", (key, _position_id(key), int(bool(value.get("is_active"))), _dumps(meta))).rowcount
+    if value.get("fee_analytics") is not None:
+        written += connection.execute("""INSERT INTO aggregates (position_key, data) VALUES (?, ?)
+            ON CONFLICT (position_key) DO UPDATE SET data = excluded.data WHERE aggregates.data IS NOT excluded.data""",
+            (key, _dumps(value["fee_analytics"]))).rowcount
+    else:
+        written += connection.execute("DELETE FROM aggregates WHERE position_key = ?", (key,)).rowcount
+
+    history = value.get("history")
+    history = history if isinstance(history, dict) else {}
+    if isinstance(history, TrackedHistory) and history.source == source and known:
+        dates = history.changed
+    else:
+        written += connection.execute("DELETE FROM snapshots WHERE position_key = ?", (key,)).rowcount
+        dates = history.keys()
+    upserts = [_snapshot_row(key, date_str, history[date_str]) for date_str in dates if date_str in history]
+    written += connection.executemany("""INSERT INTO snapshots (position_key, date, daily_earned_usd, total_unclaimed_usd, data) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (position_key, date) DO UPDATE SET daily_earned_usd = excluded.daily_earned_usd,
+        total_unclaimed_usd = excluded.total_unclaimed_usd, data = excluded.data WHERE snapshots.data IS NOT excluded.data""", upserts).rowcount
+    deleted = [(key, date_str) for date_str in dates if date_str not in history]
+    if deleted:
+        written += connection.executemany("DELETE FROM snapshots WHERE position_key = ? AND date = ?", deleted).rowcount
+    return written
+
+def save(all_data, path=FEES_DB_FILE):
+    # Upsert aller Änderungen in einer Transaktion; Rückgabe: Anzahl geschriebener/gelöschter Zeilen
+    source = _source(path)
+    connection = connect(path)
+    same_source = isinstance(all_data, FeesData) and all_data.source == source
+    written = 0
+    try:
+        connection.execute("BEGIN IMMEDIATE")
+        stored_keys = all_data.loaded_keys if same_source else {row[0] for row in connection.execute("SELECT position_key FROM positions")}
+        for key, value in all_data.items():
+            if _is_position(key, value):
+                written += _save_position(connection, key, value, source, same_source and key in all_data.loaded_keys)
+            else:
+                written += connection.execute("""INSERT INTO positions (position_key, data) VALUES (?, ?)
+                    ON CONFLICT (position_key) DO UPDATE SET data = excluded.data WHERE positions.data IS NOT excluded.data""",
+                    (key, _dumps(value))).rowcount
+        for key in stored_keys - set(all_data):
+            for table in ("snapshots", "aggregates", "positions"):
+                written += connection.execute(f"DELETE FROM {table} WHERE position_key = ?", (key,)).rowcount
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    finally:
+        connection.close()
+    # Ab jetzt entspricht der Speicherstand dem Dict: Änderungsverfolgung zurücksetzen
+    for key, value in all_data.items():
+        if _is_position(key, value) and isinstance(value.get("history"), TrackedHistory):
+            value["history"].changed.clear()
+            value["history"].source = source
+    if isinstance(all_data, FeesData):
+        all_data.source = source
+        all_data.loaded_keys = set(all_data)
+    return written
+
+def _indented(value, indent, level):
+    text = json.dumps(value, indent=indent, separators=None if indent else COMPACT_SEPARATORS)
+    return text.replace("\n", "\n" + " " * (indent * level)) if indent else text
+
+def export_json(json_path, path=FEES_DB_FILE, indent=FEES_DB_JSON_INDENT):
+    # Streamt die Datenbank nach json_path (tmp + os.replace), ohne das ganze Dict im Speicher aufzubauen.
+    # indent=2 ergibt dieselben Bytes wie json.dump(load(), f, indent=2); indent=None kompakt und ohne Neu-Serialisierung der Tage.
+    newline = (lambda level: "\n" + " " * (indent * level)) if indent else (lambda level: "")
+    colon = ": " if indent else ":"
+    connection = connect(path)
+    count = 0
+    tmp_path = json_path + ".tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("{")
+            rows = connection.execute("""SELECT p.position_key, p.data, a.data FROM positions p
+                LEFT JOIN aggregates a ON a.position_key = p.position_key ORDER BY p.rowid""").fetchall()
+            for index, (key, data, aggregates) in enumerate(rows):
+                f.write(("," if index else "") + newline(1) + json.dumps(key) + colon)
+                value = json.loads(data)
+                if not _is_position(key, value) or not value:
+                    f.write(_indented(value, indent, 1))
+                    continue
+                f.write("{")
+                for field_index, (field, field_value) in enumerate(value.items()):
+                    f.write(("," if field_index else "") + newline(2) + json.dumps(field) + colon)
+                    if field == "fee_analytics":
+                        f.write(_indented(json.loads(aggregates) if aggregates else None, indent, 2))
+                    elif field == "history":
+                        empty = True
+                        for date_str, entry in connection.execute("SELECT date, data FROM snapshots WHERE position_key = ? ORDER BY date", (key,)):
+                            f.write(("{" if empty else ",") + newline(3) + json.dumps(date_str) + colon)
+                            f.write(_indented(json.loads(entry), indent, 3) if indent else entry)
+                            empty = False
+                            count += 1
+                        f.write("{}" if empty else newline(2) + "}")
+                    else:
+                        f.write(_indented(field_value, indent, 2))
+                f.write(newline(1) + "}")
+            f.write(newline(0) + "}" if rows else "}")
+        os.replace(tmp_path, json_path)
+    finally:
+        connection.close()
+    return count
+
+def migrate(json_path, path=FEES_DB_FILE):
+    # Übernimmt eine bestehende fees_data.json komplett (vorhandene Einträge mit gleichem Key werden überschrieben)
+    with open(json_path, 'r', encoding='utf-8') as f:
+        all_data = json.load(f)
+    save(all_data, path)
+    return all_data
+
+def stats(path=FEES_DB_FILE):
+    connection = connect(path)
+    try:
+        result = {table: connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in ("positions", "snapshots", "aggregates")}
+        result["active_positions"] = connection.execute("SELECT COUNT(*) FROM positions WHERE is_active = 1").fetchone()[0]
+        result["first_date"], result["last_date"] = connection.execute("SELECT MIN(date), MAX(date) FROM snapshots").fetchone()
+        return result
+    finally:
+        connection.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite-Backend für fees_data.json migrieren, exportieren und prüfen")
+    parser.add_argument("command", choices=["migrate", "export", "verify", "stats"])
+    parser.add_argument("--db", default=FEES_DB_FILE or "fees_data.sqlite")
+    parser.add_argument("--json", default="fees_data.json", help="Quelle für migrate/verify, Ziel für export")
+    parser.add_argument("--compact", action="store_true", help="export ohne Einrückung (schneller, kleiner)")
+    args = parser.parse_args()
+
+    if args.command != "migrate" and not os.path.exists(args.db):
+        print(f"{args.db} existiert nicht. Zuerst: python fees_db.py migrate --db {args.db} --json {args.json}")
+        return 1
+    started = time.perf_counter()
+    if args.command == "migrate":
+        all_data = migrate(args.json, args.db)
+        print(f"{len(all_data)} Einträge aus {args.json} nach {args.db} übernommen ({time.perf_counter() - started:.2f}s).")
+    elif args.command == "export":
+        count = export_json(args.json, args.db, None if args.compact else FEES_DB_JSON_INDENT)
+        print(f"{count} Tage nach {args.json} exportiert ({time.perf_counter() - started:.2f}s).")
+    elif args.command == "verify":
+        with open(args.json, 'r', encoding='utf-8') as f:
+            expected = json.load(f)
+        actual = load(args.db)
+        differing = sorted(key for key in set(expected) | set(actual) if expected.get(key) != actual.get(key))
+        print(f"{len(expected) - len([key for key in differing if key in expected])}/{len(expected)} Einträge stimmen überein"
+              + (f", abweichend: {', '.join(differing[:10])}" if differing else "."))
+        return 1 if differing else 0
+    if args.command == "export":
+        return 0
+    for name, value in stats(args.db).items():
+        print(f"  {name:<18} {value}")
+    print(f"Datei: {os.path.getsize(args.db) / 1e6:.2f} MB")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
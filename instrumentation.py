@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import pstats
+import cProfile
+import threading
+import contextlib
+from datetime import datetime, timezone
+
+# Messwerte eines Laufs: Wall-Time pro Phase, HTTP-Requests pro Dienst/Methode (Anzahl, Latenz, Bytes, Fehler),
+# Sub-Calls pro RPC-Methode, Retries, Cache-Treffer/-Fehlgriffe (rpc_cache.py) und Zähler pro RPC-Endpunkt (rpc_pool.py). Am Ende als JSON-Report und als Prometheus-Textfile
+# (node_exporter textfile collector) geschrieben. Ohne start_run() sammelt ein Default-Lauf, der nie geschrieben wird.
+RUN_REPORT_DIR = os.getenv('RUN_REPORT_DIR', "run_reports")
+PROMETHEUS_TEXTFILE_DIR = os.getenv('PROMETHEUS_TEXTFILE_DIR') # Default: RUN_REPORT_DIR
+METRIC_PREFIX = "liqfee"
+PROFILE_TOP_FUNCTIONS = 30
+
+class RunMetrics:
+    def __init__(self, job):
+        self.job = job
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.finished = None
+        self.success = None
+        self.lock = threading.Lock()
+        self.phases = {} # name -> {"seconds", "count", ...Zusatzfelder}
+        self.http = {} # (service, method) -> Zähler
+        self.rpc_calls = {} # JSON-RPC-Methode -> Anzahl (Batch-Einträge einzeln gezählt)
+        self.retries = {} # service -> Anzahl
+        self.caches = {} # Cache-Name -> {"hits", "misses"}
+        self.endpoints = {} # RPC-Endpunkt -> {"requests", "errors", "seconds_total", "hedges", "hedges_won", "circuit_opens"}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        # Zusatzwerte (z.B. bytes) können in das gelieferte Dict geschrieben werden; Phasen dürfen sich überlappen (async).
+        extra = {}
+        start = time.perf_counter()
+        try:
+            yield extra
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                entry = self.phases.setdefault(name, {"seconds": 0.0, "count": 0})
+                entry["seconds"] += elapsed
+                entry["count"] += 1
+                for key, value in extra.items():
+                    entry[key] = entry.get(key, 0) + value if isinstance(value, (int, float)) else value
+
+    def record_http(self, service, method, seconds, request_bytes=0, response_bytes=0, error=False):
+        with self.lock:
+            entry = self.http.setdefault((service, method), {"requests": 0, "errors": 0, "seconds_total": 0.0, "seconds_max": 0.0,
+                                                             "request_bytes": 0, "response_bytes": 0})
+            entry["requests"] += 1
+            entry["errors"] += 1 if error else 0
+            entry["seconds_total"] += seconds
+            entry["seconds_max"] = max(entry["seconds_max"], seconds)
+            entry["request_bytes"] += request_bytes
+            entry["response_bytes"] += response_bytes
+
+    def record_rpc_calls(self, methods):
+        with self.lock:
+            for method in methods:
+                self.rpc_calls[method] = self.rpc_calls.get(method, 0) + 1
+
+    def record_retry(self, service):
+        with self.lock:
+            self.retries[service] = self.retries.get(service, 0) + 1
+
+    def record_cache(self, name, hits, misses):
+        with self.lock:
+            entry = self.caches.setdefault(name, {"hits": 0, "misses": 0})
+            entry["hits"] += hits
+            entry["misses"] += misses
+
+    def record_endpoint(self, name, seconds=None, error=False, hedge=False, hedge_won=False, circuit_open=False):
+        with self.lock:
+            entry = self.endpoints.setdefault(name, {"requests": 0, "errors": 0, "seconds_total": 0.0, "hedges": 0, "hedges_won": 0, "circuit_opens": 0})
+            if seconds is not None:
+                entry["requests"] += 1
+                entry["seconds_total"] += seconds
+            entry["errors"] += 1 if error else 0
+            entry["hedges"] += 1 if hedge else 0
+            entry["hedges_won"] += 1 if hedge_won else 0
+            entry["circuit_opens"] += 1 if circuit_open else 0
+
+    def finish(self, success=True):
+        self.finished = time.perf_counter()
+        self.success = success
+
+    def report(self):
+        with self.lock:
+            duration = (self.finished or time.perf_counter()) - self.started
+            return {
+                "job": self.job,
+                "started_utc": datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(),
+                "duration_seconds": round(duration, 6),
+                "success": self.success,
+                "phases": {name: dict(entry, seconds=round(entry["seconds"], 6)) for name, entry in self.phases.items()},
+                "http": [dict(entry, service=service, method=method, seconds_total=round(entry["seconds_total"], 6), seconds_max=round(entry["seconds_max"], 6))
+                         for (service, method), entry in sorted(self.http.items())],
+                "rpc_calls": dict(sorted(self.rpc_calls.items())),
+                "retries": dict(sorted(self.retries.items())),
+                "caches": {name: dict(entry) for name, entry in sorted(self.caches.items())},
+                "rpc_endpoints": {name: dict(entry, seconds_total=round(entry["seconds_total"], 6)) for name, entry in sorted(self.endpoints.items())},
+            }
+
+    def prometheus(self):
+        report = self.report()
+        job = _label(report["job"])
+        lines = []
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{_label(val)}"' for key, val in [("job", job)] + labels)
+                lines.append(f"{METRIC_PREFIX}_{name}{{{label_text}}} {value}")
+        metric("run_duration_seconds", "gauge", "Wall time of the last run.", [([], report["duration_seconds"])])
+        metric("run_success", "gauge", "1 if the last run finished without a fatal error.", [([], 1 if report["success"] else 0)])
+        metric("run_timestamp_seconds", "gauge", "Start of the last run (unix time).", [([], round(self.started_at, 3))])
+        metric("phase_seconds", "gauge", "Wall time per phase of the last run.",
+               [([("phase", name)], entry["seconds"]) for name, entry in report["phases"].items()])
+        metric("http_requests", "gauge", "HTTP requests per service and method in the last run.",
+               [([("service", entry["service"]), ("method", entry["method"])], entry["requests"]) for entry in report["http"]])
+        metric("http_errors", "gauge", "Failed HTTP requests per service and method in the last run.",
+               [([("service", entry["service"]), ("method", entry["method"])], entry["errors"]) for entry in report["http"]])
+        metric("http_request_seconds_sum", "gauge", "Summed HTTP latency per service and method in the last run.",
+               [([("service", entry["service"]), ("method", entry["method"])], entry["seconds_total"]) for entry in report["http"]])
+        metric("http_request_seconds_max", "gauge", "Slowest HTTP request per service and method in the last run.",
+               [([("service", entry["service"]), ("method", entry["method"])], entry["seconds_max"]) for entry in report["http"]])
+        metric("http_bytes", "gauge", "Payload bytes per service and method in the last run.",
+               [([("service", entry["service"]), ("method", entry["method"]), ("direction", direction)], entry[f"{direction}_bytes"])
+                for entry in report["http"] for direction in ("request", "response")])
+        metric("rpc_calls", "gauge", "JSON-RPC calls per method in the last run (batch entries counted individually).",
+               [([("method", method)], count) for method, count in report["rpc_calls"].items()])
+        metric("retries", "gauge", "Retries per service in the last run.",
+               [([("service", service)], count) for service, count in report["retries"].items()])
+        metric("cache_hits", "gauge", "Cache hits per cache in the last run.",
+               [([("cache", name)], entry["hits"]) for name, entry in report["caches"].items()])
+        metric("cache_misses", "gauge", "Cache misses per cache in the last run.",
+               [([("cache", name)], entry["misses"]) for name, entry in report["caches"].items()])
+        for key, help_text in (("requests", "Requests per RPC endpoint in the last run (hedged duplicates included)."),
+                               ("errors", "Failed requests per RPC endpoint in the last run."),
+                               ("seconds_total", "Summed latency per RPC endpoint in the last run."),
+                               ("hedges", "Hedged duplicate requests sent to an RPC endpoint in the last run."),
+                               ("hedges_won", "Hedged requests that answered first per RPC endpoint in the last run."),
+                               ("circuit_opens", "Circuit breaker trips per RPC endpoint in the last run.")):
+            metric(f"rpc_endpoint_{key}", "gauge", help_text,
+                   [([("endpoint", name)], entry[key]) for name, entry in report["rpc_endpoints"].items()])
+        return "\n".join(lines) + "\n"
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+def _write_atomic(path, content):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+_current = RunMetrics("default")
+
+def start_run(job):
+    global _current
+    _current = RunMetrics(job)
+    return _current
+
+def current():
+    return _current
+
+def phase(name):
+    return _current.phase(name)
+
+async def timed(name, awaitable):
+    # Für asyncio.gather: misst die Wall-Time eines einzelnen awaitables als Phase
+    with phase(name):
+        return await awaitable
+
+def record_http(service, method, seconds, request_bytes=0, response_bytes=0, error=False):
+    _current.record_http(service, method, seconds, request_bytes, response_bytes, error)
+
+def record_rpc_calls(methods):
+    _current.record_rpc_calls(methods)
+
+def record_retry(service):
+    _current.record_retry(service)
+
+def record_cache(name, hits, misses):
+    _current.record_cache(name, hits, misses)
+
+def record_endpoint(name, seconds=None, error=False, hedge=False, hedge_won=False, circuit_open=False):
+    _current.record_endpoint(name, seconds, error, hedge, hedge_won, circuit_open)
+
+def write_outputs(metrics=None, report_dir=RUN_REPORT_DIR, textfile_dir=PROMETHEUS_TEXTFILE_DIR):
+    # run_report_<job>.json und <prefix>_<job>.prom, jeweils atomar (der textfile collector liest sonst halbe Dateien)
+    metrics = metrics or _current
+    report_path = os.path.join(report_dir, f"run_report_{metrics.job}.json")
+    textfile_path = os.path.join(textfile_dir or report_dir, f"{METRIC_PREFIX}_{metrics.job}.prom")
+    try:
+        _write_atomic(report_path, json.dumps(metrics.report(), indent=2) + "\n")
+        _write_atomic(textfile_path, metrics.prometheus())
+    except OSError as e:
+        print(f"Warnung: Run-Report/Metriken nicht geschrieben: {e}")
+        return None
+    return report_path, textfile_path
+
+def summary_line(metrics=None):
+    report = (metrics or _current).report()
+    requests_total = sum(entry["requests"] for entry in report["http"])
+    slowest = sorted(report["phases"].items(), key=lambda item: -item[1]["seconds"])[:3]
+    caches = "".join(f"{name}-Cache {entry['hits']}/{entry['hits'] + entry['misses']} Treffer, " for name, entry in report["caches"].items())
+    return (f"{report['duration_seconds']:.2f}s, {requests_total} HTTP-Requests, {caches}"
+            + ", ".join(f"{name} {entry['seconds']:.2f}s" for name, entry in slowest))
+
+def run_instrumented(job, function, profile_path=None, report_dir=RUN_REPORT_DIR):
+    # Führt function() als Lauf <job> aus, optional unter cProfile (.prof + Textauszug), und schreibt Report + Metriken.
+    # function() liefert einen Exit-Status wie main(): None/0 = Erfolg, sonst Fehler (auch als Exit-Code für sys.exit).
+    metrics = start_run(job)
+    profiler = cProfile.Profile() if profile_path else None
+    success = False
+    try:
+        if profiler:
+            profiler.enable()
+        status = function()
+        success = not status
+        return status or 0
+    finally:
+        if profiler:
+            profiler.disable()
+            os.makedirs(os.path.dirname(profile_path) or ".", exist_ok=True)
+            profiler.dump_stats(profile_path)
+            with open(profile_path + ".txt", 'w', encoding='utf-8') as f:
+                pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+            print(f"cProfile-Ausgabe nach {profile_path} (+ .txt) geschrieben.")
+        metrics.finish(success)
+        paths = write_outputs(metrics, report_dir)
+        if paths:
+            print(f"Run-Report: {paths[0]}, Metriken: {paths[1]} ({summary_line(metrics)})")
@@ -0,0 +1,156 @@
+import time
+import itertools
+import requests
+import instrumentation
+import rpc_cache
+import rpc_pool
+from abi_codec import decode, encode_call
+
+# Multicall3 ist auf Arbitrum (und fast allen EVM-Chains) unter derselben Adresse deployed
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+MULTICALL_BATCH_SIZE = 200 # Sub-Calls pro aggregate3-Request
+RPC_TIMEOUT = 30
+LOG_CHUNK_MIN_BLOCKS = 10
+LOG_CHUNK_MAX_BLOCKS = 500000
+LOG_CHUNK_TARGET_LOGS = 2000
+
+_session = requests.Session()
+_request_ids = itertools.count(1)
+
+class RpcError(Exception):
+    pass
+
+def method_label(method, params):
+    # eth_calls an Multicall3 getrennt ausweisen, sonst landet fast alles unter "eth_call"
+    if method == "eth_call" and params and str(params[0].get("to", "")).lower() == MULTICALL3_ADDRESS.lower():
+        return "eth_call:aggregate3"
+    return method
+
+def _post(url, payload, label):
+    # Mehrere kommagetrennte URLs: Endpunkt-Auswahl, Failover und Hedging über rpc_pool
+    if not rpc_pool.is_pool_url(url):
+        return _post_once(url, payload, label)
+    return rpc_pool.get_pool(url).post(lambda endpoint: _checked(_post_once(endpoint.url, payload, label)))
+
+def _checked(response):
+    response.raise_for_status()
+    return response
+
+def _post_once(url, payload, label):
+    start = time.perf_counter()
+    try:
+        response = _session.post(url, json=payload, timeout=RPC_TIMEOUT)
+    except requests.exceptions.RequestException:
+        instrumentation.record_http("rpc", label, time.perf_counter() - start, error=True)
+        raise
+    instrumentation.record_http("rpc", label, time.perf_counter() - start, len(response.request.body or b""), len(response.content),
+                                error=not response.ok)
+    return response
+
+def rpc_request(url, method, params, cache=True, latest_ttl=None):
+    # cache=False für Anfragen, deren Teile anderswo gecacht werden (aggregate3)
+    keys, cached = rpc_cache.lookup_requests([(method, params)], latest_ttl) if cache else ([None], [None])
+    if cached[0] is not None:
+        return cached[0]
+    payload = {"jsonrpc": "2.0", "id": next(_request_ids), "method": method, "params": params}
+    label = method_label(method, params)
+    instrumentation.record_rpc_calls([label])
+    response = _post(url, payload, label)
+    response.raise_for_status()
+    data = response.json()
+    if data.get("error"):
+        raise RpcError(f"{method}: {data['error'].get('message', data['error'])}")
+    rpc_cache.store_requests([(method, params)], keys, [data.get("result")])
+    return data.get("result")
+
+def rpc_batch(url, calls, latest_ttl=None):
+    # JSON-RPC Batch: eine HTTP-Anfrage, Antwort pro Call entweder Ergebnis oder RpcError; nur Cache-Misses gehen an den Node
+    if not calls:
+        return []
+    keys, results = rpc_cache.lookup_requests(calls, latest_ttl)
+    missing = [index for index, result in enumerate(results) if result is None]
+    if not missing:
+        return results
+    fetched = _send_batch(url, [calls[index] for index in missing])
+    for index, result in zip(missing, fetched):
+        results[index] = result
+    rpc_cache.store_requests([calls[index] for index in missing], [keys[index] for index in missing], fetched)
+    return results
+
+def _send_batch(url, calls):
+    payload = []
+    for method, params in calls:
+        payload.append({"jsonrpc": "2.0", "id": next(_request_ids), "method": method, "params": params})
+    labels = [method_label(method, params) for method, params in calls]
+    instrumentation.record_rpc_calls(labels)
+    response = _post(url, payload, "batch:" + "+".join(sorted(set(labels))))
+    response.raise_for_status()
+    data = response.json()
+    if isinstance(data, dict): # Manche Provider antworten bei Batch-Fehlern mit einem einzelnen Error-Objekt
+        raise RpcError(f"Batch request failed: {data.get('error', data)}")
+    by_id = {item.get("id"): item for item in data}
+    results = []
+    for request in payload:
+        item = by_id.get(request["id"])
+        if item is None:
+            results.append(RpcError(f"{request['method']}: no response in batch"))
+        elif item.get("error"):
+            results.append(RpcError(f"{request['method']}: {item['error'].get('message', item['error'])}"))
+        else:
+            results.append(item.get("result"))
+    return results
+
+def eth_call(url, to, data, block="latest", from_address=None, cache=True):
+    tx = {"to": to, "data": "0x" + data.hex()}
+    if from_address:
+        tx["from"] = from_address
+    return bytes.fromhex(rpc_request(url, "eth_call", [tx, block], cache)[2:])
+
+def aggregate3_calldata(chunk):
+    return encode_call("aggregate3((address,bool,bytes)[])", ["(address,bool,bytes)[]"], [[(target, True, calldata) for target, calldata, _ in chunk]])
+
+def decode_results(calls, returned):
+    # returned: pro Call return_data (bytes) oder None, falls der Sub-Call fehlschlug
+    results = []
+    for (target, calldata, output_types), return_data in zip(calls, returned):
+        if return_data is None:
+            results.append(None)
+            continue
+        try:
+            results.append(decode(list(output_types), return_data))
+        except Exception:
+            results.append(None)
+    return results
+
+def aggregate3(url, calls, block="latest", batch_size=MULTICALL_BATCH_SIZE, latest_ttl=None):
+    # calls: Liste von (target, calldata, output_types)
+    # Ergebnis: pro Call das dekodierte Tupel oder None, falls der Sub-Call (oder das Dekodieren) fehlschlug.
+    # Sub-Calls aus dem RPC-Cache (rpc_cache.py) werden nicht erneut gesendet; latest_ttl=0 liest "latest" immer frisch.
+    keys, returned = rpc_cache.lookup_calls(calls, block, latest_ttl)
+    missing = [index for index, return_data in enumerate(returned) if return_data is None]
+    for start in range(0, len(missing), batch_size):
+        indexes = missing[start:start + batch_size]
+        raw = eth_call(url, MULTICALL3_ADDRESS, aggregate3_calldata([calls[index] for index in indexes]), block, cache=False)
+        (chunk_returned,) = decode(["(bool,bytes)[]"], raw)
+        for index, (success, return_data) in zip(indexes, chunk_returned):
+            returned[index] = return_data if success else None
+        rpc_cache.store_calls([keys[index] for index in indexes], [returned[index] for index in indexes])
+    return decode_results(calls, returned)
+
+class ChunkSizer:
+    # Blockspanne für eth_getLogs (swap_ingest, discovery): halbiert bei Fehlern, passt sich sonst an die Zahl der Logs pro Antwort an.
+    def __init__(self, size, target_logs=LOG_CHUNK_TARGET_LOGS):
+        self.size = max(LOG_CHUNK_MIN_BLOCKS, min(LOG_CHUNK_MAX_BLOCKS, int(size)))
+        self.target_logs = target_logs
+
+    def failed(self):
+        if self.size <= LOG_CHUNK_MIN_BLOCKS:
+            return False
+        self.size = max(LOG_CHUNK_MIN_BLOCKS, self.size // 2)
+        return True
+
+    def succeeded(self, log_count):
+        if log_count > self.target_logs:
+            self.size = max(LOG_CHUNK_MIN_BLOCKS, int(self.size * self.target_logs / log_count))
+        elif log_count < self.target_logs // 4:
+            self.size = min(LOG_CHUNK_MAX_BLOCKS, self.size * 2)
@@ -0,0 +1,141 @@
+import os
+import json
+from abi_codec import encode, keccak256, to_checksum_address
+from multicall import RpcError, aggregate3, encode_call
+
+# Pool-Adressen aus (token0, token1, fee) der Positionen statt eines fest eingetragenen Pools.
+# Die Adresse wird lokal per CREATE2 berechnet und beim ersten Auftauchen einmal gegen Factory.getPool geprüft;
+# Ergebnis, Token-Metadaten und die Zuordnung Position -> Pool landen in pool_cache.json.
+UNISWAP_V3_FACTORY_ADDRESS = "0x1F98431c8aD98523631AE4a59f267346ea31F984" # Gleiche Adresse auf Arbitrum
+POOL_INIT_CODE_HASH = bytes.fromhex("e34f199b19b2b4f47f68442619d555527d244f78a3297ea89325f843f87b8b54")
+NFPM_ADDRESS = "0xC36442b4a4522E871399CD717aBDD847Ab11FE88"
+NFPM_POSITIONS_OUTPUT_TYPES = ["uint96", "address", "address", "address", "uint24", "int24", "int24", "uint128", "uint256", "uint256", "uint128", "uint128"]
+SLOT0_OUTPUT_TYPES = ["uint160", "int24", "uint16", "uint16", "uint16", "uint8", "bool"]
+# Für alle Module: Preise als Token0 pro Token1 (Base = Token1), beim WETH/WBTC-Pool also WBTC pro WETH
+PRICE_PRESENTATION_IS_TOKEN0_BASE = False
+POOL_CACHE_FILE = "pool_cache.json"
+ZERO_ADDRESS = "0x" + "00" * 20
+
+# Fallback, falls die Pool-Auflösung komplett scheitert (RPC-Fehler beim ersten Lauf ohne pool_cache.json)
+FALLBACK_POOLS = [{
+    "address": "0x2f5e87C9312fa29aed5c179E456625D79015299c", "fee": 500,
+    "token0": "0x2f2a2543B76A4166549F7aaB2e75Bef0aefC5B0f", "token1": "0x82aF49447D8a07e3bd95BD0d56f35241523fBab1",
+    "decimals0": 8, "decimals1": 18, "symbol0": "WBTC", "symbol1": "WETH",
+}]
+
+def pool_key(token0, token1, fee):
+    token0, token1 = sorted([token0.lower(), token1.lower()])
+    return f"{token0}:{token1}:{int(fee)}"
+
+def compute_pool_address(token0, token1, fee, factory=UNISWAP_V3_FACTORY_ADDRESS, init_code_hash=POOL_INIT_CODE_HASH):
+    token0, token1 = sorted([token0.lower(), token1.lower()])
+    salt = keccak256(encode(["address", "address", "uint24"], [token0, token1, int(fee)]))
+    return to_checksum_address(keccak256(b"\xff" + bytes.fromhex(factory[2:]) + salt + init_code_hash)[12:])
+
+def load_pool_cache(filename=POOL_CACHE_FILE):
+    if not filename or not os.path.exists(filename):
+        return {"pools": {}, "positions": {}}
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        cache.setdefault("pools", {})
+        cache.setdefault("positions", {})
+        return cache
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"    Warnung: Pool-Cache {filename} nicht lesbar ({e}). Starte mit leerem Cache.")
+        return {"pools": {}, "positions": {}}
+
+def save_pool_cache(cache, filename=POOL_CACHE_FILE):
+    if not filename:
+        return
+    tmp_path = filename + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, filename)
+
+def _resolve_new_pools(rpc_url, keys, cache):
+    # Ein aggregate3 für alle neuen Pools: getPool zur Kontrolle der CREATE2-Adresse plus decimals/symbol beider Token
+    calls = []
+    for key in keys:
+        token0, token1, fee = key.split(":")
+        calls.append((UNISWAP_V3_FACTORY_ADDRESS, encode_call("getPool(address,address,uint24)", ["address", "address", "uint24"], [token0, token1, int(fee)]), ["address"]))
+        for token in (token0, token1):
+            calls.append((to_checksum_address(token), encode_call("decimals()"), ["uint8"]))
+            calls.append((to_checksum_address(token), encode_call("symbol()"), ["string"]))
+    results = aggregate3(rpc_url, calls)
+    for i, key in enumerate(keys):
+        token0, token1, fee = key.split(":")
+        get_pool, dec0, sym0, dec1, sym1 = results[5 * i:5 * i + 5]
+        computed = compute_pool_address(token0, token1, fee)
+        address = computed
+        if get_pool is None:
+            print(f"    Warnung: Factory.getPool für {key} fehlgeschlagen, verwende CREATE2-Adresse {computed} ungeprüft.")
+        elif get_pool[0].lower() == ZERO_ADDRESS:
+            print(f"    Warnung: Kein Pool für {key} bei der Factory registriert.")
+            address = None
+        elif get_pool[0].lower() != computed.lower():
+            print(f"    Warnung: CREATE2-Adresse {computed} für {key} weicht von getPool ab, verwende {get_pool[0]}.")
+            address = to_checksum_address(get_pool[0])
+        if address is None or dec0 is None or dec1 is None:
+            continue # Nicht cachen, beim nächsten Lauf erneut versuchen
+        cache["pools"][key] = {
+            "address": address, "token0": to_checksum_address(token0), "token1": to_checksum_address(token1), "fee": int(fee),
+            "decimals0": dec0[0], "decimals1": dec1[0],
+            "symbol0": sym0[0] if sym0 else "T0S_ERR", "symbol1": sym1[0] if sym1 else "T1S_ERR",
+            "verified": get_pool is not None,
+        }
+
+def resolve_position_pools(rpc_url, position_ids, positions_by_id=None, cache_file=POOL_CACHE_FILE):
+    # Ergebnis: {position_id: Pool-Eintrag oder None}. positions() wird nur für Positionen gelesen, die weder im
+    # Cache stehen noch als positions_by_id (bereits gelesene positions()-Tupel) übergeben wurden.
+    cache = load_pool_cache(cache_file)
+    changed = False
+    positions_by_id = dict(positions_by_id or {})
+    unknown_ids = [pid for pid in position_ids if str(pid) not in cache["positions"] and not positions_by_id.get(pid)]
+    if unknown_ids:
+        calls = [(NFPM_ADDRESS, encode_call("positions(uint256)", ["uint256"], [pid]), NFPM_POSITIONS_OUTPUT_TYPES) for pid in unknown_ids]
+        positions_by_id.update(zip(unknown_ids, aggregate3(rpc_url, calls)))
+    for pid in position_ids:
+        details = positions_by_id.get(pid)
+        if details and cache["positions"].get(str(pid)) != pool_key(details[2], details[3], details[4]):
+            cache["positions"][str(pid)] = pool_key(details[2], details[3], details[4])
+            changed = True
+
+    new_keys = sorted({cache["positions"][str(pid)] for pid in position_ids if str(pid) in cache["positions"]} - set(cache["pools"]))
+    if new_keys:
+        print(f"  Löse {len(new_keys)} neue(n) Pool(s) auf...")
+        _resolve_new_pools(rpc_url, new_keys, cache)
+        changed = True
+    if changed:
+        save_pool_cache(cache, cache_file)
+    return {pid: cache["pools"].get(cache["positions"].get(str(pid))) for pid in position_ids}
+
+def pool_for_address(rpc_url, pool_address, cache_file=POOL_CACHE_FILE):
+    # Pool-Eintrag zu einer Adresse (z.B. swap_ingest.py --pool): aus pool_cache.json bzw. FALLBACK_POOLS, sonst
+    # token0/token1/fee am Pool lesen und wie ein neuer Pool einer Position auflösen und cachen
+    cache = load_pool_cache(cache_file)
+    for entry in list(cache["pools"].values()) + FALLBACK_POOLS:
+        if entry["address"].lower() == pool_address.lower():
+            return entry
+    results = aggregate3(rpc_url, [(pool_address, encode_call(f"{name}()"), [output]) for name, output in (("token0", "address"), ("token1", "address"), ("fee", "uint24"))])
+    if None in results:
+        raise RpcError(f"token0/token1/fee von Pool {pool_address} nicht lesbar")
+    key = pool_key(*[result[0] for result in results])
+    _resolve_new_pools(rpc_url, [key], cache)
+    entry = cache["pools"].get(key)
+    if entry is None or entry["address"].lower() != pool_address.lower():
+        raise RpcError(f"{pool_address} ist kein Pool der Uniswap-V3-Factory")
+    save_pool_cache(cache, cache_file)
+    return entry
+
+def distinct_pools(pool_by_position):
+    # Jeder Pool nur einmal, stabile Reihenfolge nach Adresse
+    pools = {entry["address"]: entry for entry in pool_by_position.values() if entry}
+    return [pools[address] for address in sorted(pools)]
+
+def slot0_calls(pool_entries):
+    return [(entry["address"], encode_call("slot0()"), SLOT0_OUTPUT_TYPES) for entry in pool_entries]
+
+def price_symbols(entry, is_token0_base):
+    # (base, quote) wie in price_ticks/position_range: is_token0_base=False -> Preis als Token0 pro Token1
+    return (entry["symbol0"], entry["symbol1"]) if is_token0_base else (entry["symbol1"], entry["symbol0"])
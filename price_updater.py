@@ -1,9 +1,23 @@
 import os
+import sys
 import json
-from datetime import datetime, timedelta, timezone
-from web3 import Web3
+import time
+import signal
+import argparse
+import asyncio
+import threading
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 import math
+import instrumentation
+import discovery
+import fees_db
+import pools
+import tick_store
+from dashboard_payloads import DASHBOARD_DIR, generate_dashboard
+from tickmath import sqrt_price_x96_to_price
+from multicall import aggregate3
+from pools import FALLBACK_POOLS, PRICE_PRESENTATION_IS_TOKEN0_BASE
 # import shutil # Nicht für einfache save_json_data benötigt
 # import tempfile # Nicht für einfache save_json_data benötigt
 # import time # Nicht für Web3-Calls ohne Retry benötigt
@@ -13,141 +27,247 @@ load_dotenv()
 
 ARBITRUM_RPC_URL = os.getenv('ARBITRUM_RPC')
 CONFIG_FILE_POSITIONS = "positions_to_track.txt"
-PRICE_TICKS_FILE = "price_ticks.json"
+PRICE_TICKS_FILE = "price_ticks.json" # JSON-Export (Fallback-Quelle für Time-in-Range)
+JSON_DATA_FILE = "fees_data.json" # Nur gelesen, für die Dashboard-Dateien
+PRICE_TICKS_STORE_DIR = tick_store.DEFAULT_STORE_DIR
 MAX_AGE_DAYS = 15 
-WETH_WBTC_005_POOL_ADDRESS_ARBITRUM = "0x2f5e87C9312fa29aed5c179E456625D79015299c" 
-
-UNISWAP_V3_POOL_ABI_MINIMAL = json.loads("""
-[
-    {"inputs": [],"name": "slot0","outputs": [{"internalType": "uint160", "name": "sqrtPriceX96", "type": "uint160"},{"internalType": "int24", "name": "tick", "type": "int24"},{"internalType": "uint16", "name": "observationIndex", "type": "uint16"},{"internalType": "uint16", "name": "observationCardinality", "type": "uint16"},{"internalType": "uint16", "name": "observationCardinalityNext", "type": "uint16"},{"internalType": "uint8", "name": "feeProtocol", "type": "uint8"},{"internalType": "bool", "name": "unlocked", "type": "bool"}],"stateMutability": "view","type": "function"},
-    {"inputs": [],"name": "token0","outputs": [{"internalType": "address", "name": "", "type": "address"}],"stateMutability": "view","type": "function"},
-    {"inputs": [],"name": "token1","outputs": [{"internalType": "address", "name": "", "type": "address"}],"stateMutability": "view","type": "function"}
-]
-""")
-ERC20_ABI_MINIMAL = json.loads("""
-[
-    {"constant":true,"inputs":[],"name":"decimals","outputs":[{"name":"","type":"uint8"}],"payable":false,"stateMutability":"view","type":"function"},
-    {"constant":true,"inputs":[],"name":"symbol","outputs":[{"name":"","type":"string"}],"payable":false,"stateMutability":"view","type":"function"}
-]
-""")
-
-def load_json_data(filename=PRICE_TICKS_FILE):
-    if os.path.exists(filename):
-        try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                content = json.load(f)
-                if isinstance(content, list): 
-                    return content
-                else: 
-                    print(f"Warnung: {filename} enthält keine Liste. Starte mit leerer Liste.")
-                    return []
-        except json.JSONDecodeError:
-            print(f"Warnung: Konnte JSON aus {filename} nicht dekodieren. Starte mit leerer Liste.")
-            return [] 
-        except Exception as e:
-            print(f"Fehler beim Laden von {filename}: {e}. Starte mit leerer Liste.")
-            return []
-    return []
+PRICE_TICKS_EXPORT_MIN_INTERVAL_SECONDS = 5 * 60 # price_ticks.json ausdünnen; der Tick-Store behält alle Ticks
 
-def save_json_data(data, filename=PRICE_TICKS_FILE): # Die ursprüngliche, einfache Speicherfunktion
-    try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2)
-        print(f"Daten erfolgreich nach {filename} gespeichert. {len(data)} Einträge.") # Info über Anzahl Einträge
-    except Exception as e:
-        print(f"FEHLER beim Speichern von Daten nach {filename}: {e}")
+# Daemon-Modus (--daemon): ein Prozess, eine Keep-Alive-Verbindung, slot0 aller Pools alle paar Sekunden
+DAEMON_SAMPLE_INTERVAL_SECONDS = float(os.getenv('PRICE_SAMPLE_INTERVAL', "10"))
+DAEMON_FLUSH_SECONDS = 60 # Puffer spätestens nach dieser Zeit in den Tick-Store schreiben
+DAEMON_FLUSH_MAX_TICKS = 500
+DAEMON_PUBLISH_SECONDS = 15 * 60 # Export nach price_ticks.json + Dashboard-Dateien
+DAEMON_HEARTBEAT_SECONDS = 15 * 60 # Unveränderter Preis wird spätestens dann erneut geschrieben (muss < MAX_TICK_HOLD_SECONDS sein)
 
-def get_active_position_id(filename=CONFIG_FILE_POSITIONS):
+def get_tracked_position_ids(filename=CONFIG_FILE_POSITIONS):
+    position_ids = []
     try:
         if os.path.exists(filename):
             with open(filename, 'r', encoding='utf-8') as f:
                 for line in f:
                     line = line.strip()
                     if not line or line.startswith('#'): continue
-                    parts = line.split(',')
-                    if len(parts) >= 1: 
-                        try: return int(parts[0].strip())
-                        except ValueError: continue 
-        return None
-    except Exception as e: print(f"Fehler beim Lesen der Position ID aus '{filename}': {e}"); return None
+                    try: position_ids.append(int(line.split(',')[0].strip()))
+                    except ValueError: continue
+    except Exception as e: print(f"Fehler beim Lesen der Position IDs aus '{filename}': {e}")
+    if discovery.POSITION_DISCOVERY: # Von tracker.py gefundene Positionen der Wallet (ohne RPC, Stand des letzten Tracker-Laufs)
+        position_ids += [pid for pid in discovery.known_position_ids() if pid not in position_ids]
+    return position_ids
 
-def sqrt_price_x96_to_price(sqrt_p, t0_dec, t1_dec, is_t0_base=True): 
-    pr = (sqrt_p / (2**96))**2; return pr / (10**(t1_dec-t0_dec)) if is_t0_base else (1/pr) / (10**(t0_dec-t1_dec))
+def resolve_sampled_pools(rpc_url, position_ids):
+    # Alle verschiedenen Pools der Positionen (pool_cache.json); nur neue Positionen/Pools kosten RPC-Reads
+    try:
+        pool_entries = pools.distinct_pools(pools.resolve_position_pools(rpc_url, position_ids))
+    except Exception as e:
+        print(f"Fehler beim Auflösen der Pools: {e}")
+        pool_entries = []
+    if not pool_entries:
+        print("  Keine Pools aufgelöst, verwende Fallback-Pool WETH/WBTC 0.05%.")
+        return FALLBACK_POOLS
+    return pool_entries
 
-def main():
+async def fetch_slot0_async(rpc_url, pool_entries):
+    from async_rpc import AsyncRpcClient
+    async with AsyncRpcClient(rpc_url) as client:
+        return await client.aggregate3(pools.slot0_calls(pool_entries), latest_ttl=0)
+
+def pool_price(entry, slot0):
+    return sqrt_price_x96_to_price(slot0[0], entry["decimals0"], entry["decimals1"], PRICE_PRESENTATION_IS_TOKEN0_BASE)
+
+def main(use_async=False):
     print(f"--- Starting Price Updater ({datetime.now(timezone.utc).isoformat()}) ---")
 
-    if not ARBITRUM_RPC_URL: print("CRITICAL Error: Missing ARBITRUM_RPC. Exiting."); return
-    w3 = Web3(Web3.HTTPProvider(ARBITRUM_RPC_URL))
-    if not w3.is_connected(): print(f"CRITICAL Error: Not connected to RPC. Exiting."); return
+    if not ARBITRUM_RPC_URL: print("CRITICAL Error: Missing ARBITRUM_RPC. Exiting."); return 1
+
+    position_ids = get_tracked_position_ids()
+    if not position_ids: print("Info: Keine aktive Position. Price Updater beendet."); return 0
+    print(f"Aktive Position IDs: {', '.join(str(pid) for pid in position_ids)}")
 
-    active_nft_id = get_active_position_id()
-    if not active_nft_id: print("Info: Keine aktive Position. Price Updater beendet."); return
-    print(f"Aktive Position ID: {active_nft_id}")
+    with instrumentation.phase("resolve_pools"):
+        pool_entries = resolve_sampled_pools(ARBITRUM_RPC_URL, position_ids)
+    # slot0 aller Pools in einem einzigen aggregate3, immer frisch (latest_ttl=0: am RPC-Cache vorbei)
+    try:
+        with instrumentation.phase("rpc_slot0"):
+            if use_async:
+                slot0_results = asyncio.run(fetch_slot0_async(ARBITRUM_RPC_URL, pool_entries))
+            else:
+                slot0_results = aggregate3(ARBITRUM_RPC_URL, pools.slot0_calls(pool_entries), latest_ttl=0)
+    except Exception as e: print(f"Fehler Abrufen Marktpreis: {e}"); return 1
+
+    ensure_tick_store()
+    now_utc = datetime.now(timezone.utc)
+    records = []
+    for entry, slot0 in zip(pool_entries, slot0_results):
+        base_sym, quote_sym = pools.price_symbols(entry, PRICE_PRESENTATION_IS_TOKEN0_BASE)
+        if not slot0:
+            print(f"  slot0() für Pool {entry['address']} ({quote_sym}/{base_sym}) fehlgeschlagen, kein Tick.")
+            continue
+        curr_mkt_price = pool_price(entry, slot0)
+        print(f"  Pool {entry['address']} ({entry['fee'] / 10000:g}%): {curr_mkt_price:.6f} {quote_sym}/{base_sym}")
+        pair_id = tick_store.get_pair_id(base_sym, quote_sym, PRICE_TICKS_STORE_DIR, pool=entry["address"])
+        records.append((now_utc.timestamp(), curr_mkt_price, pair_id))
+    if not records: print("Marktpreis nicht ermittelt. Kein Update."); return 1
 
-    t0_dec, t1_dec = None, None
-    PRICE_PRESENTATION_IS_TOKEN0_BASE = False # WICHTIG: Für WETH pro WBTC (Base=Token0=WBTC)
-    base_sym_for_json, quote_sym_for_json = "", ""
+    with instrumentation.phase("tick_append"):
+        tick_store.append_ticks(records, PRICE_TICKS_STORE_DIR)
+    publish(now_utc)
+    print(f"--- Price Updater Finished ({len(records)}/{len(pool_entries)} Pools) ---")
+    return 0
 
+def ensure_tick_store():
+    if not tick_store.store_exists(PRICE_TICKS_STORE_DIR) and os.path.exists(PRICE_TICKS_FILE):
+        print(f"Tick-Store '{PRICE_TICKS_STORE_DIR}' leer, einmalige Migration aus {PRICE_TICKS_FILE}...")
+        tick_store.migrate_from_json(PRICE_TICKS_FILE, PRICE_TICKS_STORE_DIR)
 
+def publish(now_utc):
+    # Retention, JSON-Export und Dashboard-Dateien; alles atomar geschrieben (tmp + os.replace)
+    with instrumentation.phase("tick_compact"):
+        removed_segments = tick_store.compact(MAX_AGE_DAYS, PRICE_TICKS_STORE_DIR, now=now_utc)
+    if removed_segments: print(f"  {removed_segments} Tick-Segment(e) älter als {MAX_AGE_DAYS} Tage entfernt.")
     try:
-        pool_c_tokens = w3.eth.contract(address=WETH_WBTC_005_POOL_ADDRESS_ARBITRUM, abi=UNISWAP_V3_POOL_ABI_MINIMAL)
-        t0_addr = pool_c_tokens.functions.token0().call() 
-        t1_addr = pool_c_tokens.functions.token1().call() 
-
-        t0_c = w3.eth.contract(address=t0_addr, abi=ERC20_ABI_MINIMAL)
-        t1_c = w3.eth.contract(address=t1_addr, abi=ERC20_ABI_MINIMAL)
-        
-        t0_dec = t0_c.functions.decimals().call() 
-        t1_dec = t1_c.functions.decimals().call() 
-        t0_s = t0_c.functions.symbol().call() or "T0S_ERR" 
-        t1_s = t1_c.functions.symbol().call() or "T1S_ERR" 
-
-        if PRICE_PRESENTATION_IS_TOKEN0_BASE: 
-            base_sym_for_json = t0_s # WBTC
-            quote_sym_for_json = t1_s # WETH
-        else: 
-            base_sym_for_json = t1_s # WETH
-            quote_sym_for_json = t0_s # WBTC
-        print(f"  Token Details für Preis-Ticks: Base={base_sym_for_json}, Quote={quote_sym_for_json}")
-        print(f"  (Pool Token0: {t0_s}({t0_dec}) / Pool Token1: {t1_s}({t1_dec}))")
+        with instrumentation.phase("json_export") as phase:
+            exported = tick_store.export_json(PRICE_TICKS_FILE, PRICE_TICKS_STORE_DIR, max_age_days=MAX_AGE_DAYS, now=now_utc,
+                                             min_interval_seconds=PRICE_TICKS_EXPORT_MIN_INTERVAL_SECONDS)
+            phase["bytes"] = os.path.getsize(PRICE_TICKS_FILE)
+        print(f"Daten erfolgreich nach {PRICE_TICKS_FILE} exportiert. {exported} Einträge.")
     except Exception as e:
-        print(f"Fehler Holen Token-Details: {e}")
-        if WETH_WBTC_005_POOL_ADDRESS_ARBITRUM.lower()=="0x2f5e87C9312fa29aed5c179E456625D79015299c".lower():
-            t0_dec,t1_dec,t0_s,t1_s = 8,18,"WBTC","WETH" # WBTC ist Token0, WETH ist Token1
-            if PRICE_PRESENTATION_IS_TOKEN0_BASE: base_sym_for_json,quote_sym_for_json = t0_s,t1_s
-            else: base_sym_for_json,quote_sym_for_json = t1_s,t0_s
-            print(f"  Fallback Token Details: Base={base_sym_for_json}, Quote={quote_sym_for_json}")
-        else: print("Unbekannter Pool für Fallback. Breche ab."); return
-    if t0_dec is None or t1_dec is None: print("Token-Dezimalstellen nicht ermittelt. Breche ab."); return
-
-    curr_mkt_price = None
+        print(f"FEHLER beim Exportieren nach {PRICE_TICKS_FILE}: {e}")
     try:
-        pool_c = w3.eth.contract(address=WETH_WBTC_005_POOL_ADDRESS_ARBITRUM, abi=UNISWAP_V3_POOL_ABI_MINIMAL)
-        slot0 = pool_c.functions.slot0().call() 
-        curr_mkt_price = sqrt_price_x96_to_price(slot0[0], t0_dec, t1_dec, PRICE_PRESENTATION_IS_TOKEN0_BASE)
-        print(f"  Aktueller Marktpreis: {curr_mkt_price:.6f} {quote_sym_for_json}/{base_sym_for_json}")
-    except Exception as e: print(f"Fehler Abrufen Marktpreis: {e}"); return 
-    if curr_mkt_price is None: print("Marktpreis nicht ermittelt. Kein Update."); return
-
-    new_entry = {"timestamp":datetime.now(timezone.utc).isoformat().replace("+00:00","Z"), "price":curr_mkt_price, "base_token":base_sym_for_json, "quote_token":quote_sym_for_json}
-    price_data = load_json_data(PRICE_TICKS_FILE)
-    cutoff_date_utc = datetime.now(timezone.utc) - timedelta(days=MAX_AGE_DAYS)
-    
-    filtered_ticks = []
-    for entry in price_data:
+        if fees_db.exists(fees_db.FEES_DB_FILE):
+            # Liest einen konsistenten Stand, auch während tracker.py gerade schreibt (WAL)
+            with instrumentation.phase("fees_db_load") as phase:
+                all_data = fees_db.load(fees_db.FEES_DB_FILE)
+                phase["bytes"] = os.path.getsize(fees_db.FEES_DB_FILE)
+        else:
+            with instrumentation.phase("json_load") as phase:
+                with open(JSON_DATA_FILE, 'r', encoding='utf-8') as f:
+                    all_data = json.load(f)
+                phase["bytes"] = os.path.getsize(JSON_DATA_FILE)
+        with instrumentation.phase("dashboard"):
+            generate_dashboard(all_data, DASHBOARD_DIR, PRICE_TICKS_STORE_DIR, now=now_utc.timestamp())
+        print(f"Dashboard-Dateien in '{DASHBOARD_DIR}' aktualisiert.")
+    except FileNotFoundError:
+        print(f"Info: {JSON_DATA_FILE} nicht gefunden, Dashboard-Dateien nicht aktualisiert.")
+    except Exception as e:
+        print(f"FEHLER beim Erzeugen der Dashboard-Dateien: {e}")
+
+class TickBuffer:
+    # Sammelt Samples im Speicher; unveränderte sqrtPriceX96 werden verworfen (bis auf einen Heartbeat).
+    def __init__(self, pair_id, store_dir=PRICE_TICKS_STORE_DIR, flush_seconds=DAEMON_FLUSH_SECONDS,
+                 max_ticks=DAEMON_FLUSH_MAX_TICKS, heartbeat_seconds=DAEMON_HEARTBEAT_SECONDS):
+        self.pair_id = pair_id
+        self.store_dir = store_dir
+        self.flush_seconds = flush_seconds
+        self.max_ticks = max_ticks
+        self.heartbeat_seconds = heartbeat_seconds
+        self.pending = []
+        self.last_sqrt_price = None
+        self.last_recorded_at = None
+        self.last_flush = time.monotonic()
+        self.samples = self.recorded = self.written = 0
+
+    def add(self, epoch, sqrt_price_x96, price):
+        self.samples += 1
+        if sqrt_price_x96 == self.last_sqrt_price and epoch - self.last_recorded_at < self.heartbeat_seconds:
+            return False
+        self.pending.append((epoch, price, self.pair_id))
+        self.last_sqrt_price, self.last_recorded_at = sqrt_price_x96, epoch
+        self.recorded += 1
+        return True
+
+    def due(self):
+        return len(self.pending) >= self.max_ticks or (self.pending and time.monotonic() - self.last_flush >= self.flush_seconds)
+
+    def flush(self):
+        pending, self.pending = self.pending, []
+        self.last_flush = time.monotonic()
+        if not pending:
+            return 0
         try:
-            entry_ts_str = entry["timestamp"]
-            entry_ts = datetime.fromisoformat(entry_ts_str.replace("Z", "+00:00"))
-            if entry_ts >= cutoff_date_utc:
-                filtered_ticks.append(entry)
+            written = tick_store.append_ticks(pending, self.store_dir)
         except Exception as e:
-            print(f"Warnung: Konnte Timestamp '{entry.get('timestamp')}' nicht parsen oder vergleichen: {e}. Eintrag wird ignoriert.")
-            continue
-            
-    filtered_ticks.append(new_entry)
-    save_json_data(filtered_ticks, PRICE_TICKS_FILE) 
-    print(f"--- Price Updater Finished ---")
+            self.pending = pending + self.pending # Beim nächsten Flush erneut versuchen
+            print(f"FEHLER beim Schreiben von {len(pending)} Ticks: {e}")
+            return 0
+        self.written += written
+        return written
+
+def run_daemon(interval=DAEMON_SAMPLE_INTERVAL_SECONDS, flush_seconds=DAEMON_FLUSH_SECONDS, publish_seconds=DAEMON_PUBLISH_SECONDS):
+    print(f"--- Starting Price Updater Daemon ({datetime.now(timezone.utc).isoformat()}, alle {interval:g}s) ---")
+    if not ARBITRUM_RPC_URL: print("CRITICAL Error: Missing ARBITRUM_RPC. Exiting."); return 1
+
+    # Pools und Token-Metadaten beim Start und bei jedem Publish (Config-Änderungen), pro Sample ein aggregate3 mit slot0 aller Pools
+    ensure_tick_store()
+    buffers = {}
+    def refresh_pools():
+        pool_entries = resolve_sampled_pools(ARBITRUM_RPC_URL, get_tracked_position_ids())
+        for entry in pool_entries:
+            if entry["address"] not in buffers:
+                base_sym, quote_sym = pools.price_symbols(entry, PRICE_PRESENTATION_IS_TOKEN0_BASE)
+                print(f"  Sample Pool {entry['address']} ({entry['fee'] / 10000:g}%), Preis als {quote_sym}/{base_sym}")
+                pair_id = tick_store.get_pair_id(base_sym, quote_sym, PRICE_TICKS_STORE_DIR, pool=entry["address"])
+                buffers[entry["address"]] = TickBuffer(pair_id, flush_seconds=flush_seconds)
+        return pool_entries
+    pool_entries = refresh_pools()
+
+    stop = threading.Event()
+    def request_stop(signum, frame):
+        print(f"Signal {signum} empfangen, schreibe Puffer und beende...")
+        stop.set()
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    errors = 0
+    last_publish = time.monotonic()
+    next_sample = time.monotonic()
+    while not stop.is_set():
+        try:
+            with instrumentation.phase("rpc_slot0"):
+                slot0_results = aggregate3(ARBITRUM_RPC_URL, pools.slot0_calls(pool_entries), latest_ttl=0)
+            sampled_at = time.time()
+            for entry, slot0 in zip(pool_entries, slot0_results):
+                if slot0:
+                    buffers[entry["address"]].add(sampled_at, slot0[0], pool_price(entry, slot0))
+                else:
+                    errors += 1
+        except Exception as e:
+            errors += 1
+            print(f"  Fehler beim slot0-Sample: {e}")
+        for buffer in buffers.values():
+            if buffer.due():
+                with instrumentation.phase("tick_append"):
+                    buffer.flush()
+        if time.monotonic() - last_publish >= publish_seconds:
+            for buffer in buffers.values():
+                buffer.flush()
+            publish(datetime.now(timezone.utc))
+            instrumentation.write_outputs() # Textfile bleibt im Dauerbetrieb aktuell
+            print(f"  {len(buffers)} Pool(s): {sum(b.samples for b in buffers.values())} Samples, {sum(b.recorded for b in buffers.values())} neue Preise, "
+                  f"{sum(b.written for b in buffers.values())} Ticks geschrieben, {errors} Fehler.")
+            pool_entries = refresh_pools()
+            last_publish = time.monotonic()
+        next_sample = max(next_sample + interval, time.monotonic()) # Verpasste Takte nicht nachholen
+        stop.wait(max(0.0, next_sample - time.monotonic()))
+
+    for buffer in buffers.values():
+        buffer.flush()
+    publish(datetime.now(timezone.utc))
+    print(f"--- Price Updater Daemon Finished ({sum(b.samples for b in buffers.values())} Samples, {sum(b.written for b in buffers.values())} Ticks geschrieben, {errors} Fehler) ---")
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Uniswap V3 Price Updater")
+    parser.add_argument("--async", dest="use_async", action="store_true", default=os.getenv('RPC_ASYNC') == "1",
+                        help="Unabhängige RPC-Reads parallel über asyncio ausführen (auch via RPC_ASYNC=1)")
+    parser.add_argument("--daemon", action="store_true", help="Dauerhaft laufen und slot0 aller Pools im festen Takt sampeln")
+    parser.add_argument("--interval", type=float, default=DAEMON_SAMPLE_INTERVAL_SECONDS, help="Sample-Intervall im Daemon-Modus in Sekunden")
+    parser.add_argument("--flush-seconds", type=float, default=DAEMON_FLUSH_SECONDS, help="Puffer spätestens nach so vielen Sekunden schreiben")
+    parser.add_argument("--profile", nargs="?", const=os.path.join(instrumentation.RUN_REPORT_DIR, "price_updater.prof"), metavar="PATH",
+                        help="Lauf unter cProfile ausführen und die Statistik nach PATH schreiben")
+    args = parser.parse_args()
+    if args.daemon:
+        sys.exit(instrumentation.run_instrumented("price_updater_daemon", lambda: run_daemon(interval=args.interval, flush_seconds=args.flush_seconds),
+                                                  profile_path=args.profile))
+    else:
+        sys.exit(instrumentation.run_instrumented("price_updater", lambda: main(use_async=args.use_async), profile_path=args.profile))
\ No newline at end of file
@@ -0,0 +1,262 @@
+import os
+import sys
+import json
+import time
+import atexit
+import sqlite3
+import argparse
+import threading
+import instrumentation
+from abi_codec import SELECTORS
+
+# Persistenter Cache für RPC-Ergebnisse (SQLite), Schlüssel (chain, block, to, calldata):
+# - an einem festen Block (historische Reads, Backfill, Replays) ändert sich nichts mehr -> ohne Ablauf
+# - token0/token1/fee eines Pools und decimals/symbol eines Tokens sind blockunabhängig -> auch bei "latest" ohne Ablauf
+# - alles andere bei "latest" nur kurz (RPC_CACHE_LATEST_TTL_SECONDS); Aufrufer mit eigenem Takt (Preis-Sampling) geben latest_ttl=0
+# Begrenzt auf RPC_CACHE_MAX_ENTRIES, verdrängt wird nach letzter Nutzung (LRU). Fehler und leere Antworten werden nie gecacht
+# (ein noch nicht deployter CREATE2-Pool antwortet auf token0() erfolgreich, aber leer).
+# Auswertung/Pflege: python rpc_cache.py stats|prune|clear [--file rpc_cache.sqlite]
+RPC_CACHE_FILE = os.getenv('RPC_CACHE_FILE', "rpc_cache.sqlite") # Leer: Cache aus
+RPC_CACHE_MAX_ENTRIES = int(os.getenv('RPC_CACHE_MAX_ENTRIES', "200000"))
+RPC_CACHE_LATEST_TTL_SECONDS = float(os.getenv('RPC_CACHE_LATEST_TTL_SECONDS', "5"))
+CHAIN_ID = int(os.getenv('CHAIN_ID', "42161")) # Arbitrum One; aus der Umgebung statt eth_chainId, kostet sonst einen Request pro Lauf
+LATEST_TAGS = ("latest", "safe", "finalized")
+IMMUTABLE_BLOCK = "*"
+IMMUTABLE_SELECTORS = {SELECTORS[signature] for signature in ("token0()", "token1()", "fee()", "decimals()", "symbol()")}
+
+class RpcCache:
+    def __init__(self, path=RPC_CACHE_FILE, chain_id=CHAIN_ID, max_entries=RPC_CACHE_MAX_ENTRIES, latest_ttl=RPC_CACHE_LATEST_TTL_SECONDS):
+        self.path = path
+        self.chain_id = chain_id
+        self.max_entries = max_entries
+        self.latest_ttl = latest_ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock() # Backfill liest aus mehreren Threads
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS rpc_cache (
+            chain_id INTEGER NOT NULL, block TEXT NOT NULL, target TEXT NOT NULL, calldata BLOB NOT NULL,
+            result BLOB NOT NULL, expires_at REAL, last_used REAL NOT NULL,
+            PRIMARY KEY (chain_id, block, target, calldata))""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS rpc_cache_last_used ON rpc_cache (last_used)")
+        self.entries = self.connection.execute("SELECT COUNT(*) FROM rpc_cache").fetchone()[0] # Schätzung, genau nach jedem evict()
+
+    def block_key(self, block, latest_ttl=None):
+        # (block-Spalte, expires_at) oder None, wenn der Block-Tag nicht cachebar ist ("pending", "earliest", latest_ttl=0)
+        if isinstance(block, int):
+            return str(block), None
+        if isinstance(block, str) and block.startswith("0x"):
+            return str(int(block, 16)), None
+        ttl = self.latest_ttl if latest_ttl is None else latest_ttl
+        if block in LATEST_TAGS and ttl > 0:
+            return "latest", time.time() + ttl
+        return None
+
+    def call_key(self, block, target, calldata, latest_ttl=None, sender=None):
+        # Schlüssel eines eth_call bzw. aggregate3-Sub-Calls; der Absender gehört nur dazu, wenn er gesetzt ist (collect)
+        target = target.lower() + (":" + sender.lower() if sender else "")
+        if calldata[:4] in IMMUTABLE_SELECTORS and not sender and len(calldata) == 4:
+            return IMMUTABLE_BLOCK, target, bytes(calldata), None
+        block_key = self.block_key(block, latest_ttl)
+        return (block_key[0], target, bytes(calldata), block_key[1]) if block_key else None
+
+    def request_key(self, method, params, latest_ttl=None):
+        # Schlüssel einer einzelnen JSON-RPC-Anfrage oder None (nicht cachebar)
+        if method == "eth_call":
+            tx = params[0]
+            data = tx.get("data", tx.get("input", "0x"))
+            return self.call_key(params[1] if len(params) > 1 else "latest", tx["to"], bytes.fromhex(data[2:]), latest_ttl, tx.get("from"))
+        if method == "eth_getBlockByNumber" and isinstance(params[0], str) and params[0].startswith("0x"):
+            return str(int(params[0], 16)), method, b"full" if len(params) > 1 and params[1] else b"", None
+        return None
+
+    def get_many(self, keys):
+        # Pro Schlüssel das gespeicherte Ergebnis oder None (Miss bzw. kein Schlüssel); Treffer werden als benutzt markiert
+        results = [None] * len(keys)
+        wanted = [(index, key) for index, key in enumerate(keys) if key]
+        if not wanted:
+            return results
+        now = time.time()
+        with self.lock:
+            used = []
+            for index, (block, target, calldata, _) in wanted:
+                row = self.connection.execute("SELECT result, expires_at FROM rpc_cache WHERE chain_id = ? AND block = ? AND target = ? AND calldata = ?",
+                                              (self.chain_id, block, target, calldata)).fetchone()
+                if row and (row[1] is None or row[1] > now):
+                    results[index] = row[0]
+                    used.append((now, self.chain_id, block, target, calldata))
+            if used:
+                with self.connection:
+                    self.connection.executemany("UPDATE rpc_cache SET last_used = ? WHERE chain_id = ? AND block = ? AND target = ? AND calldata = ?", used)
+            self.hits += len(used)
+            self.misses += len(wanted) - len(used)
+        instrumentation.record_cache("rpc", len(used), len(wanted) - len(used))
+        return results
+
+    def put_many(self, items):
+        # items: (Schlüssel, Ergebnis-Bytes); Einträge ohne Schlüssel oder mit leerem Ergebnis werden übersprungen
+        rows = [(self.chain_id, key[0], key[1], key[2], bytes(result), key[3], time.time()) for key, result in items if key and result]
+        if not rows:
+            return
+        with self.lock:
+            with self.connection:
+                self.connection.executemany("INSERT OR REPLACE INTO rpc_cache (chain_id, block, target, calldata, result, expires_at, last_used) "
+                                            "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self.entries += len(rows)
+            if self.entries > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        # Erst Abgelaufenes, dann die am längsten nicht genutzten Einträge bis auf max_entries
+        with self.connection:
+            self.connection.execute("DELETE FROM rpc_cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+            count = self.connection.execute("SELECT COUNT(*) FROM rpc_cache").fetchone()[0]
+            if count > self.max_entries:
+                self.connection.execute("DELETE FROM rpc_cache WHERE rowid IN (SELECT rowid FROM rpc_cache ORDER BY last_used LIMIT ?)",
+                                        (count - self.max_entries,))
+                count = self.max_entries
+        self.entries = count
+
+    def prune(self):
+        with self.lock:
+            before = self.connection.execute("SELECT COUNT(*) FROM rpc_cache").fetchone()[0]
+            self._evict()
+            self.connection.execute("VACUUM")
+            return before - self.entries
+
+    def clear(self):
+        with self.lock:
+            with self.connection:
+                self.connection.execute("DELETE FROM rpc_cache")
+            self.connection.execute("VACUUM")
+            self.entries = 0
+
+    def stats(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT CASE WHEN block = 'latest' THEN 'latest' WHEN block = ? THEN 'immutable' ELSE 'block' END AS kind, "
+                                           "COUNT(*), SUM(LENGTH(result) + LENGTH(calldata)) FROM rpc_cache GROUP BY kind", (IMMUTABLE_BLOCK,)).fetchall()
+        return {kind: {"entries": count, "bytes": size or 0} for kind, count, size in rows}
+
+    def close(self):
+        with self.lock:
+            if self.connection:
+                self.connection.close() # Checkpoint: danach steckt alles in der .sqlite-Datei (CI cacht nur die)
+                self.connection = None
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    # Prozessweiter Cache, beim ersten Zugriff geöffnet; None, wenn abgeschaltet oder die Datei nicht nutzbar ist
+    global _cache
+    if not RPC_CACHE_FILE:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = RpcCache(RPC_CACHE_FILE)
+            except sqlite3.Error as e:
+                print(f"Warnung: RPC-Cache {RPC_CACHE_FILE} nicht nutzbar, laufe ohne: {e}")
+                _cache = False
+            else:
+                atexit.register(_cache.close)
+        return _cache or None
+
+def open_cache(path, **options):
+    # Ersetzt den prozessweiten Cache (z.B. Benchmarks: eigene Datei, latest_ttl=0 wie zwischen zwei Cron-Läufen)
+    global _cache
+    with _cache_lock:
+        if _cache:
+            _cache.close()
+        _cache = RpcCache(path, **options)
+        atexit.register(_cache.close)
+        return _cache
+
+def _disable(error):
+    global _cache
+    print(f"Warnung: RPC-Cache abgeschaltet: {error}")
+    _cache = False
+
+def lookup_calls(calls, block, latest_ttl=None):
+    # Für aggregate3: (Schlüssel, return_data oder None) pro (target, calldata, output_types)
+    cache = get_cache()
+    if cache is None:
+        return [None] * len(calls), [None] * len(calls)
+    try:
+        keys = [cache.call_key(block, target, calldata, latest_ttl) for target, calldata, _ in calls]
+        return keys, cache.get_many(keys)
+    except sqlite3.Error as e:
+        _disable(e)
+        return [None] * len(calls), [None] * len(calls)
+
+def store_calls(keys, returned):
+    cache = get_cache()
+    if cache is None:
+        return
+    try:
+        cache.put_many(zip(keys, returned))
+    except sqlite3.Error as e:
+        _disable(e)
+
+def lookup_requests(calls, latest_ttl=None):
+    # Für rpc_request/rpc_batch: (Schlüssel, Ergebnis wie vom Node oder None) pro (method, params)
+    cache = get_cache()
+    if cache is None:
+        return [None] * len(calls), [None] * len(calls)
+    try:
+        keys = [cache.request_key(method, params, latest_ttl) for method, params in calls]
+        stored = cache.get_many(keys)
+    except sqlite3.Error as e:
+        _disable(e)
+        return [None] * len(calls), [None] * len(calls)
+    results = []
+    for (method, _), value in zip(calls, stored):
+        if value is None:
+            results.append(None)
+        else:
+            results.append("0x" + value.hex() if method == "eth_call" else json.loads(value))
+    return keys, results
+
+def store_requests(calls, keys, results):
+    # Nur erfolgreiche, nicht leere Ergebnisse ("0x" bzw. null für einen Block jenseits des Kopfes bleiben draußen)
+    cache = get_cache()
+    if cache is None:
+        return
+    items = []
+    for (method, _), key, result in zip(calls, keys, results):
+        if key is None or result is None or isinstance(result, Exception):
+            continue
+        items.append((key, bytes.fromhex(result[2:]) if method == "eth_call" else json.dumps(result, separators=(",", ":")).encode()))
+    try:
+        cache.put_many(items)
+    except sqlite3.Error as e:
+        _disable(e)
+
+def main():
+    parser = argparse.ArgumentParser(description="RPC-Cache auswerten und pflegen")
+    parser.add_argument("command", choices=["stats", "prune", "clear"])
+    parser.add_argument("--file", default=RPC_CACHE_FILE or "rpc_cache.sqlite")
+    args = parser.parse_args()
+    if not os.path.exists(args.file):
+        print(f"{args.file} existiert nicht.")
+        return 1
+    cache = RpcCache(args.file)
+    try:
+        if args.command == "prune":
+            print(f"{cache.prune()} Einträge entfernt, {cache.entries} verbleiben.")
+        elif args.command == "clear":
+            cache.clear()
+            print(f"{args.file} geleert.")
+        stats = cache.stats()
+        for kind in ("immutable", "block", "latest"):
+            entry = stats.get(kind, {"entries": 0, "bytes": 0})
+            print(f"  {kind:<10} {entry['entries']:>8} Einträge  {entry['bytes'] / 1e6:8.2f} MB")
+        print(f"Datei: {os.path.getsize(args.file) / 1e6:.2f} MB, Limit {cache.max_entries} Einträge")
+    finally:
+        cache.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
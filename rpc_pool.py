@@ -0,0 +1,322 @@
+import os
+import sys
+import time
+import queue
+import asyncio
+import argparse
+import threading
+import collections
+from urllib.parse import urlparse
+import instrumentation
+
+# Mehrere RPC-Provider hinter einer URL-Liste: ARBITRUM_RPC="https://a...,https://b..." (kommagetrennt).
+# Pro Endpunkt EWMA von Latenz und Fehlerquote plus Circuit Breaker: nach RPC_CIRCUIT_FAILURES Fehlern in Folge gesperrt
+# (RPC_CIRCUIT_OPEN_SECONDS, verdoppelt sich, wenn der erste Request danach wieder scheitert).
+# Jede Anfrage geht an den schnellsten gesunden Endpunkt. Antwortet er nicht innerhalb des RPC_HEDGE_PERCENTILE-Perzentils
+# seiner letzten Latenzen, geht dieselbe Anfrage zusätzlich an den nächstbesten (hedged request), die erste Antwort gewinnt.
+# Fehler gehen sofort an den nächsten Endpunkt, gesperrte Endpunkte nur als letzter Ausweg.
+# Doppelt gesendet werden nur Reads (eth_call, eth_getLogs, ...), Transaktionen schicken wir keine.
+# Eine einzelne URL läuft ohne Pool wie bisher. Test gegen Stand-in-Nodes mit Latenz/Fehlern: python rpc_pool.py [--requests 300]
+RPC_EWMA_ALPHA = 0.2
+RPC_LATENCY_WINDOW = 64 # Letzte Latenzen pro Endpunkt für das Hedge-Perzentil
+RPC_HEDGING = os.getenv('RPC_HEDGING', "1") != "0"
+RPC_HEDGE_PERCENTILE = float(os.getenv('RPC_HEDGE_PERCENTILE', "0.9"))
+RPC_HEDGE_MIN_SAMPLES = 8
+RPC_HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv('RPC_HEDGE_DELAY_SECONDS', "1.0")) # Solange zu wenig Messwerte da sind
+RPC_HEDGE_MIN_DELAY_SECONDS = 0.02
+RPC_ERROR_PENALTY = 4 # Rangfolge nach EWMA-Latenz * (1 + Strafe * Fehlerquote)
+RPC_CIRCUIT_FAILURES = 3
+RPC_CIRCUIT_OPEN_SECONDS = 30.0
+RPC_CIRCUIT_MAX_OPEN_SECONDS = 600.0
+
+def split_urls(url):
+    return [part.strip() for part in url.split(",") if part.strip()]
+
+class Endpoint:
+    def __init__(self, url, index):
+        self.url = url
+        self.index = index
+        parsed = urlparse(url)
+        host = f"{parsed.hostname}:{parsed.port}" if parsed.port else parsed.hostname
+        self.name = f"{index}:{host or url}" # Ohne Pfad/Query/Zugangsdaten, dort stecken meist API-Keys
+        self.latency = None # EWMA in Sekunden (nur erfolgreiche Requests)
+        self.error_rate = 0.0 # EWMA 0..1
+        self.latencies = collections.deque(maxlen=RPC_LATENCY_WINDOW)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.open_seconds = RPC_CIRCUIT_OPEN_SECONDS
+        self.probing = False # Sperre abgelaufen, der nächste Fehler sperrt sofort wieder
+
+    def hedge_delay(self):
+        if len(self.latencies) < RPC_HEDGE_MIN_SAMPLES:
+            return RPC_HEDGE_DEFAULT_DELAY_SECONDS
+        ordered = sorted(self.latencies)
+        return max(RPC_HEDGE_MIN_DELAY_SECONDS, ordered[min(len(ordered) - 1, int(RPC_HEDGE_PERCENTILE * len(ordered)))])
+
+class EndpointPool:
+    def __init__(self, urls, hedging=RPC_HEDGING):
+        self.endpoints = [Endpoint(url, index) for index, url in enumerate(urls)]
+        self.hedging = hedging and len(self.endpoints) > 1
+        self.lock = threading.Lock()
+
+    def ranked(self):
+        # Gesunde Endpunkte nach Latenz (ohne Messwert in Konfigurationsreihenfolge dahinter), gesperrte zuletzt
+        now = time.monotonic()
+        with self.lock:
+            return sorted(self.endpoints, key=lambda endpoint: (
+                endpoint.open_until > now, endpoint.open_until if endpoint.open_until > now else 0.0, endpoint.latency is None,
+                (endpoint.latency or 0.0) * (1 + RPC_ERROR_PENALTY * endpoint.error_rate), endpoint.index))
+
+    def record_success(self, endpoint, seconds):
+        with self.lock:
+            endpoint.latency = seconds if endpoint.latency is None else RPC_EWMA_ALPHA * seconds + (1 - RPC_EWMA_ALPHA) * endpoint.latency
+            endpoint.error_rate *= 1 - RPC_EWMA_ALPHA
+            endpoint.latencies.append(seconds)
+            endpoint.consecutive_failures = 0
+            endpoint.open_seconds = RPC_CIRCUIT_OPEN_SECONDS
+            endpoint.probing = False
+        instrumentation.record_endpoint(endpoint.name, seconds=seconds)
+
+    def record_censored(self, endpoint, seconds):
+        # Verlierer eines Hedges: Laufzeit bis zur Entscheidung als (untere) Latenzschätzung, kein Fehler
+        with self.lock:
+            endpoint.latency = seconds if endpoint.latency is None else RPC_EWMA_ALPHA * seconds + (1 - RPC_EWMA_ALPHA) * endpoint.latency
+            endpoint.latencies.append(seconds)
+        instrumentation.record_endpoint(endpoint.name, seconds=seconds)
+
+    def record_failure(self, endpoint, seconds, error):
+        now = time.monotonic()
+        with self.lock:
+            endpoint.error_rate = RPC_EWMA_ALPHA + (1 - RPC_EWMA_ALPHA) * endpoint.error_rate
+            endpoint.consecutive_failures += 1
+            opened = endpoint.open_until <= now and (endpoint.probing or endpoint.consecutive_failures >= RPC_CIRCUIT_FAILURES)
+            if opened:
+                if endpoint.probing:
+                    endpoint.open_seconds = min(RPC_CIRCUIT_MAX_OPEN_SECONDS, endpoint.open_seconds * 2)
+                endpoint.open_until = now + endpoint.open_seconds
+                endpoint.consecutive_failures = 0
+                endpoint.probing = True
+        instrumentation.record_endpoint(endpoint.name, seconds=seconds, error=True, circuit_open=opened)
+        if opened:
+            print(f"  RPC-Endpunkt {endpoint.name} für {endpoint.open_seconds:.0f}s gesperrt ({type(error).__name__}: {error})")
+
+    def _attempt(self, endpoint, send, decided=None):
+        # decided: gesetzt, sobald ein anderer Endpunkt gewonnen hat; dann ist dieser Request schon als Verlierer erfasst
+        start = time.perf_counter()
+        try:
+            result = send(endpoint)
+        except Exception as e:
+            if decided is None or not decided.is_set():
+                self.record_failure(endpoint, time.perf_counter() - start, e)
+            raise
+        if decided is None or not decided.is_set():
+            self.record_success(endpoint, time.perf_counter() - start)
+        return result
+
+    async def _attempt_async(self, endpoint, send):
+        start = time.perf_counter()
+        try:
+            result = await send(endpoint)
+        except asyncio.CancelledError: # Verlierer eines Hedges: kein Fehler des Endpunkts
+            self.record_censored(endpoint, time.perf_counter() - start)
+            raise
+        except Exception as e:
+            self.record_failure(endpoint, time.perf_counter() - start, e)
+            raise
+        self.record_success(endpoint, time.perf_counter() - start)
+        return result
+
+    def post(self, send):
+        # send(endpoint) führt den Request aus und wirft bei Fehlern; Ergebnis der ersten erfolgreichen Antwort
+        order = self.ranked()
+        if not self.hedging:
+            return self._sequential(order, send)
+        results = queue.Queue()
+        decided = threading.Event()
+        started = {} # Endpunkt -> Startzeit der noch laufenden Requests
+        def attempt(endpoint):
+            try:
+                results.put((endpoint, self._attempt(endpoint, send, decided), None))
+            except Exception as e:
+                results.put((endpoint, None, e))
+        def launch(endpoint):
+            # Daemon-Threads: ein hängender Verlierer hält weder den Aufrufer noch das Prozessende auf
+            started[endpoint] = time.perf_counter()
+            threading.Thread(target=attempt, args=(endpoint,), daemon=True).start()
+        hedges, launched, last_error = set(), 0, None
+        delay = order[0].hedge_delay()
+        while True:
+            if not started:
+                if launched == len(order):
+                    raise last_error
+                launch(order[launched])
+                launched += 1
+            try:
+                endpoint, result, error = results.get(timeout=delay if not hedges and launched < len(order) else None)
+            except queue.Empty:
+                hedges.add(order[launched])
+                instrumentation.record_endpoint(order[launched].name, hedge=True)
+                launch(order[launched])
+                launched += 1
+                continue
+            started.pop(endpoint)
+            if error is None:
+                decided.set()
+                now = time.perf_counter()
+                for loser, loser_start in started.items():
+                    self.record_censored(loser, now - loser_start)
+                if endpoint in hedges:
+                    instrumentation.record_endpoint(endpoint.name, hedge_won=True)
+                return result
+            last_error = error
+
+    async def post_async(self, send):
+        # Wie post, send(endpoint) ist eine Coroutine-Funktion; Verlierer werden abgebrochen
+        order = self.ranked()
+        if not self.hedging:
+            last_error = None
+            for endpoint in order:
+                try:
+                    return await self._attempt_async(endpoint, send)
+                except Exception as e:
+                    last_error = e
+            raise last_error
+        tasks, hedges, launched, last_error = {}, set(), 0, None
+        delay = order[0].hedge_delay()
+        try:
+            while True:
+                if not tasks:
+                    if launched == len(order):
+                        raise last_error
+                    tasks[asyncio.ensure_future(self._attempt_async(order[launched], send))] = order[launched]
+                    launched += 1
+                done, _ = await asyncio.wait(tasks, timeout=delay if not hedges and launched < len(order) else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedges.add(order[launched])
+                    instrumentation.record_endpoint(order[launched].name, hedge=True)
+                    tasks[asyncio.ensure_future(self._attempt_async(order[launched], send))] = order[launched]
+                    launched += 1
+                    continue
+                for task in done:
+                    endpoint = tasks.pop(task)
+                    if task.exception() is None:
+                        if endpoint in hedges:
+                            instrumentation.record_endpoint(endpoint.name, hedge_won=True)
+                        return task.result()
+                    last_error = task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _sequential(self, order, send):
+        last_error = None
+        for endpoint in order:
+            try:
+                return self._attempt(endpoint, send)
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(url):
+    # Ein Pool pro URL-Liste und Prozess, damit Latenz/Fehlerstatistik über alle Requests eines Laufs (bzw. des Daemons) wächst
+    with _pools_lock:
+        if url not in _pools:
+            _pools[url] = EndpointPool(split_urls(url))
+        return _pools[url]
+
+def registered_pools():
+    with _pools_lock:
+        return dict(_pools)
+
+def is_pool_url(url):
+    return bool(url) and "," in url
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else float("nan")
+
+def run_scenario(label, url, requests_count, use_async=False):
+    # Sequentielle Reads (eth_blockNumber + aggregate3 mit slot0) wie im Daemon, Latenzverteilung und Fehler
+    import multicall
+    import pools
+    from stand_in_node import WETH_WBTC_POOL_ADDRESS
+    calls = pools.slot0_calls([{"address": WETH_WBTC_POOL_ADDRESS}])
+    latencies, errors = [], 0
+    async def run_async():
+        nonlocal errors
+        from async_rpc import AsyncRpcClient
+        async with AsyncRpcClient(url) as client:
+            for _ in range(requests_count):
+                start = time.perf_counter()
+                try:
+                    await client.request("eth_blockNumber", [])
+                    await client.aggregate3(calls, latest_ttl=0)
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+    if use_async:
+        asyncio.run(run_async())
+    else:
+        for _ in range(requests_count):
+            start = time.perf_counter()
+            try:
+                multicall.rpc_request(url, "eth_blockNumber", [])
+                multicall.aggregate3(url, calls, latest_ttl=0)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+    print(f"  {label:<34} p50 {_percentile(latencies, 0.5) * 1000:7.1f} ms  p95 {_percentile(latencies, 0.95) * 1000:7.1f} ms  "
+          f"p99 {_percentile(latencies, 0.99) * 1000:7.1f} ms  max {max(latencies) * 1000:7.1f} ms  Fehler {errors}")
+    return latencies, errors
+
+def main():
+    parser = argparse.ArgumentParser(description="RPC-Pool gegen Stand-in-Nodes mit Latenz, Ausreißern und Ausfällen testen")
+    parser.add_argument("--requests", type=int, default=200, help="Reads pro Szenario")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    os.environ.setdefault('RPC_CACHE_FILE', "") # Ohne RPC-Cache, jeder Read soll die Nodes erreichen
+    import stand_in_node
+    state = stand_in_node.default_state(1)
+    # A: schnell, aber 5% Ausreißer um 400 ms; B: gleichmäßig 40 ms; C: schnell, fällt bei jedem zweiten Request aus
+    nodes = {
+        "A": stand_in_node.start_server(state, latency_ms=10, slow_rate=0.05, slow_ms=400, seed=args.seed),
+        "B": stand_in_node.start_server(state, latency_ms=40, seed=args.seed + 1),
+        "C": stand_in_node.start_server(state, latency_ms=5, failure_rate=0.5, seed=args.seed + 2),
+    }
+    url_of = {name: node[2] for name, node in nodes.items()}
+    dead_url = "http://127.0.0.1:9" # Discard-Port, Verbindung wird abgelehnt
+    print(f"Stand-in-Nodes: {', '.join(f'{name}={url}' for name, url in url_of.items())}, {args.requests} Reads pro Szenario")
+    failures = 0
+    try:
+        single, single_errors = run_scenario("nur A", url_of["A"], args.requests)
+        pooled, pooled_errors = run_scenario("Pool A,B,C", ",".join(url_of[name] for name in "ABC"), args.requests)
+        _, async_errors = run_scenario("Pool A,B,C (async)", ",".join(url_of[name] for name in "CAB"), args.requests, use_async=True)
+        _, dead_errors = run_scenario("Pool tot,C,B (Failover)", ",".join([dead_url, url_of["C"], url_of["B"]]), args.requests)
+        if _percentile(pooled, 0.99) >= _percentile(single, 0.99):
+            print("FEHLER: Pool senkt die p99-Latenz nicht.")
+            failures += 1
+        if pooled_errors or async_errors or dead_errors:
+            print("FEHLER: Reads trotz gesunder Endpunkte fehlgeschlagen.")
+            failures += 1
+        print("Endpunkte:")
+        import rpc_pool # Als Skript ist dies __main__; multicall/async_rpc arbeiten mit dem Modul rpc_pool
+        for pool in rpc_pool.registered_pools().values():
+            for endpoint in pool.endpoints:
+                counters = instrumentation.current().report()["rpc_endpoints"].get(endpoint.name, {})
+                latency = f"{endpoint.latency * 1000:.1f} ms" if endpoint.latency is not None else "-"
+                print(f"  {endpoint.name:<18} EWMA {latency:>9}  Fehlerquote {endpoint.error_rate:.2f}  "
+                      f"Requests {counters.get('requests', 0)}, Fehler {counters.get('errors', 0)}, Hedges {counters.get('hedges', 0)} "
+                      f"({counters.get('hedges_won', 0)} gewonnen), Sperren {counters.get('circuit_opens', 0)}")
+    finally:
+        for server, _, _ in nodes.values():
+            server.shutdown()
+    print("OK" if not failures else f"{failures} Prüfung(en) fehlgeschlagen.")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
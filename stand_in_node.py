@@ -0,0 +1,531 @@
+import argparse
+import bisect
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from eth_abi import decode, encode
+from eth_utils import keccak
+from pools import NFPM_ADDRESS as NFPM_CHECKSUM_ADDRESS, compute_pool_address
+from tickmath import get_tick_at_sqrt_ratio
+
+# Lokaler Ersatz für einen Arbitrum-JSON-RPC-Node: beantwortet genau die Calls, die tracker.py und
+# price_updater.py absetzen (inkl. Multicall3.aggregate3 und JSON-RPC-Batches), aus einem festen State.
+# GET-Requests unter /api/v3 beantworten die beiden CoinGecko-Endpunkte aus coingecko.py (COINGECKO_API_URL).
+# Start: python stand_in_node.py --port 8545 [--state state.json] [--positions 500] [--latency-ms 80]
+#        [--fixture swaps.json | --swaps 5000]  (Swap-Logs für eth_getLogs, aufgezeichnet oder synthetisch)
+#        [--failure-rate 0.2] [--slow-rate 0.05 --slow-ms 2000]  (Fehler/Ausreißer für rpc_pool.py, nur JSON-RPC)
+# Danach ARBITRUM_RPC=http://127.0.0.1:8545 (und optional COINGECKO_API_URL=http://127.0.0.1:8545/api/v3) setzen.
+
+NFPM_ADDRESS = NFPM_CHECKSUM_ADDRESS.lower()
+MULTICALL3_ADDRESS = "0xca11bde05977b3631167028862be2a173976ca11"
+WBTC_ADDRESS = "0x2f2a2543b76a4166549f7aab2e75bef0aefc5b0f"
+WETH_ADDRESS = "0x82af49447d8a07e3bd95bd0d56f35241523fbab1"
+WETH_WBTC_POOL_ADDRESS = "0x2f5e87c9312fa29aed5c179e456625d79015299c"
+UNISWAP_V3_FACTORY_ADDRESS = "0x1f98431c8ad98523631ae4a59f267346ea31f984"
+DEFAULT_WALLET = "0x000000000000000000000000000000000000beef"
+OTHER_WALLET = "0x000000000000000000000000000000000000cafe" # Jede FOREIGN_POSITION_EVERY-te Position gehört nicht DEFAULT_WALLET
+FOREIGN_POSITION_EVERY = 5
+Q128 = 2**128
+FEE_MODEL_STEPS = 240
+DEFAULT_USD_PRICES = {WBTC_ADDRESS: 60000.0, WETH_ADDRESS: 2500.0} # Andere Token: 1 USD
+
+def _selector(signature):
+    return keccak(text=signature)[:4]
+
+SELECTORS = {
+    _selector("aggregate3((address,bool,bytes)[])"): "aggregate3",
+    _selector("positions(uint256)"): "positions",
+    _selector("collect((uint256,address,uint128,uint128))"): "collect",
+    _selector("decimals()"): "decimals",
+    _selector("symbol()"): "symbol",
+    _selector("slot0()"): "slot0",
+    _selector("token0()"): "token0",
+    _selector("token1()"): "token1",
+    _selector("fee()"): "fee",
+    _selector("getPool(address,address,uint24)"): "getPool",
+    _selector("ownerOf(uint256)"): "ownerOf",
+    _selector("balanceOf(address)"): "balanceOf",
+    _selector("tokenOfOwnerByIndex(address,uint256)"): "tokenOfOwnerByIndex",
+    _selector("feeGrowthGlobal0X128()"): "feeGrowthGlobal0X128",
+    _selector("feeGrowthGlobal1X128()"): "feeGrowthGlobal1X128",
+    _selector("ticks(int24)"): "ticks",
+}
+SWAP_EVENT_TOPIC = "0x" + keccak(text="Swap(address,address,int256,int256,uint160,uint128,int24)").hex()
+TRANSFER_EVENT_TOPIC = "0x" + keccak(text="Transfer(address,address,uint256)").hex()
+
+class Revert(Exception):
+    pass
+
+def default_state(position_count=1, wallet=DEFAULT_WALLET, pool_count=1):
+    tokens = {
+        WBTC_ADDRESS: {"symbol": "WBTC", "decimals": 8},
+        WETH_ADDRESS: {"symbol": "WETH", "decimals": 18},
+    }
+    pools = {
+        WETH_WBTC_POOL_ADDRESS: {"token0": WBTC_ADDRESS, "token1": WETH_ADDRESS, "fee": 500,
+                                 "sqrtPriceX96": 43866900424276991153131639619452928, "tick": 264500},
+    }
+    # Weitere Pools: synthetische Token gegen WETH (Preis ~1), Adresse wie bei der echten Factory per CREATE2
+    for i in range(1, pool_count):
+        token = "0x" + keccak(text=f"stand-in-token-{i}")[12:].hex()
+        tokens[token] = {"symbol": f"TKN{i}", "decimals": 18}
+        token0, token1 = sorted([token, WETH_ADDRESS])
+        pools[compute_pool_address(token0, token1, 3000).lower()] = {"token0": token0, "token1": token1, "fee": 3000,
+                                                                   "sqrtPriceX96": 2**96, "tick": 0}
+    pool_list = list(pools.values())
+    positions = {}
+    for i in range(position_count):
+        pool = pool_list[i % len(pool_list)] # Positionen reihum auf die Pools verteilt
+        positions[str(4800000 + i)] = {
+            "owner": wallet if i % FOREIGN_POSITION_EVERY != FOREIGN_POSITION_EVERY - 1 else OTHER_WALLET, "token0": pool["token0"], "token1": pool["token1"], "fee": pool["fee"],
+            "tickLower": pool["tick"] - 1500 + 10 * (i % 50), "tickUpper": pool["tick"] + 1500 + 10 * (i % 50), "liquidity": 10**12 + i,
+            "fees0": 1500 + i, "fees1": 300000000000000 + i,
+            "mint_block": 350000000 - 90 * 86400 * 4, # Gebühren wachsen linear ab dem Mint-Block
+        }
+    state = {
+        "chain_id": 42161,
+        "block_number": 350000000,
+        "block_timestamp": int(time.time()), # Timestamp von block_number; ältere Blöcke liegen block_time Sekunden auseinander
+        "block_time": 0.25,
+        "tokens": tokens,
+        "pools": pools,
+        "positions": positions,
+        "usd_prices": dict(DEFAULT_USD_PRICES),
+        "logs": [], # Roh-Logs wie von eth_getLogs, nach (blockNumber, logIndex) sortiert
+        "block_timestamps": {}, # Überschreibt die berechneten Timestamps einzelner Blöcke (aus Fixtures)
+        "max_logs_per_query": 10000, # Wie bei vielen Providern: größere Antworten werden mit Fehler abgelehnt
+        "max_block_range": None,
+    }
+    build_fee_model(state)
+    return state
+
+def _fee_growth_inside(pool, tick_lower, tick_upper, token):
+    # Wie Tick.getFeeGrowthInside; nur für den Snapshot beim Mint, danach wird direkt entlang des Pfads abgerechnet
+    fee_growth_global = pool[f"feeGrowthGlobal{token}X128"]
+    lower = pool["ticks"][str(tick_lower)][f"feeGrowthOutside{token}X128"]
+    upper = pool["ticks"][str(tick_upper)][f"feeGrowthOutside{token}X128"]
+    below = lower if pool["tick"] >= tick_lower else fee_growth_global - lower
+    above = upper if pool["tick"] < tick_upper else fee_growth_global - upper
+    return (fee_growth_global - below - above) % 2**256
+
+def move_pool_tick(pool, new_tick):
+    # Wie Pool.swap beim Kreuzen: jeder initialisierte Tick zwischen altem und neuem Tick dreht feeGrowthOutside um
+    low, high = sorted((pool["tick"], new_tick))
+    for key, info in pool.get("ticks", {}).items():
+        if low < int(key) <= high:
+            for token in (0, 1):
+                info[f"feeGrowthOutside{token}X128"] = (pool[f"feeGrowthGlobal{token}X128"] - info[f"feeGrowthOutside{token}X128"]) % 2**256
+    pool["tick"] = new_tick
+
+def build_fee_model(state, steps=FEE_MODEL_STEPS, seed=7, fee_targets=(1500, 300000000000000)):
+    # Fee-Growth-State wie on-chain: der Pool-Tick läuft einen Zufallspfad (Ende = aktueller slot0-Tick), jeder Schritt
+    # erhöht feeGrowthGlobal (Start knapp unter 2**256, läuft also unterwegs über). Positionen werden unterwegs gemintet
+    # und teils "gepokt" (tokensOwed gutgeschrieben). Was collect() zurückgibt (fees0/fees1), wird hier direkt aus dem
+    # Gebührenwachstum summiert, solange die Position im Range war - unabhängig von feeGrowthOutside/-Inside.
+    rng = random.Random(seed)
+    for pool in state["pools"].values():
+        members = [pos for pos in state["positions"].values()
+                   if (pos["token0"], pos["token1"], pos["fee"]) == (pool["token0"], pool["token1"], pool["fee"])]
+        final_tick, tick, path = pool["tick"], pool["tick"] + rng.randint(-2500, 2500), []
+        for _ in range(steps):
+            path.append(tick)
+            tick = min(max(tick + int(rng.gauss(0, 350)), final_tick - 3000), final_tick + 3000)
+        path[-1] = final_tick
+        growth = [[int(target * rng.uniform(0.5, 1.5)) * Q128 // (10**12 * (steps // 2)) for target in fee_targets] for _ in range(steps)]
+        for token in (0, 1):
+            pool[f"feeGrowthGlobal{token}X128"] = -(sum(step[token] for step in growth) // 2) % 2**256
+        pool["ticks"], pool["tick"] = {}, path[0]
+        schedule = []
+        for pos in members:
+            mint_step = rng.randrange(0, steps // 2)
+            schedule.append((pos, mint_step, rng.choice([None, rng.randrange(mint_step, steps)])))
+        accrued = {}
+        for step in range(steps):
+            move_pool_tick(pool, path[step])
+            for pos, mint_step, poke_step in schedule:
+                key = id(pos)
+                if step == mint_step:
+                    for tick_key, net in ((pos["tickLower"], pos["liquidity"]), (pos["tickUpper"], -pos["liquidity"])):
+                        info = pool["ticks"].setdefault(str(tick_key), {
+                            "liquidityGross": 0, "liquidityNet": 0,
+                            **{f"feeGrowthOutside{t}X128": pool[f"feeGrowthGlobal{t}X128"] if tick_key <= pool["tick"] else 0 for t in (0, 1)}})
+                        info["liquidityGross"] += pos["liquidity"]
+                        info["liquidityNet"] += net
+                    for token in (0, 1):
+                        pos[f"feeGrowthInside{token}LastX128"] = _fee_growth_inside(pool, pos["tickLower"], pos["tickUpper"], token)
+                        pos[f"tokensOwed{token}"] = 0
+                    accrued[key] = [0, 0]
+                if step == poke_step:
+                    for token in (0, 1):
+                        pos[f"tokensOwed{token}"] = (pos[f"tokensOwed{token}"] + accrued[key][token] * pos["liquidity"] // Q128) % Q128
+                        pos[f"feeGrowthInside{token}LastX128"] = (pos[f"feeGrowthInside{token}LastX128"] + accrued[key][token]) % 2**256
+                    accrued[key] = [0, 0]
+            for pos, _, _ in schedule:
+                if id(pos) in accrued and pos["tickLower"] <= pool["tick"] < pos["tickUpper"]:
+                    accrued[id(pos)] = [accrued[id(pos)][token] + growth[step][token] for token in (0, 1)]
+            for token in (0, 1):
+                pool[f"feeGrowthGlobal{token}X128"] = (pool[f"feeGrowthGlobal{token}X128"] + growth[step][token]) % 2**256
+        for pos, _, _ in schedule:
+            for token in (0, 1):
+                pos[f"fees{token}"] = (pos[f"tokensOwed{token}"] + accrued[id(pos)][token] * pos["liquidity"] // Q128) % Q128
+
+def synthetic_swap_logs(state, count, pool_address=WETH_WBTC_POOL_ADDRESS, blocks_back=4 * 3600 * 24, seed=1):
+    # Random Walk um den aktuellen Pool-Preis, gleichmäßig über die letzten blocks_back Blöcke verteilt.
+    # Der Pool-State (slot0) steht danach auf dem Preis des letzten Swaps.
+    rng = random.Random(seed)
+    pool = state["pools"][pool_address]
+    sqrt_price = pool["sqrtPriceX96"]
+    first_block = state["block_number"] - blocks_back
+    blocks = sorted(rng.randint(first_block, state["block_number"]) for _ in range(count))
+    logs = []
+    for i, block in enumerate(blocks):
+        step = rng.gauss(0, 0.0004)
+        new_sqrt_price = int(sqrt_price * (1 + step))
+        amount0 = int(rng.uniform(1e4, 5e7)) * (1 if step < 0 else -1) # Preis fällt, wenn Token0 in den Pool geht
+        amount1 = -int(amount0 * (sqrt_price / 2**96) ** 2)
+        sqrt_price = new_sqrt_price
+        data = encode(["int256", "int256", "uint160", "uint128", "int24"],
+                      [amount0, amount1, sqrt_price, 10**18, get_tick_at_sqrt_ratio(sqrt_price)])
+        logs.append({
+            "address": pool_address, "topics": [SWAP_EVENT_TOPIC, "0x" + "00" * 32, "0x" + "00" * 32], "data": "0x" + data.hex(),
+            "blockNumber": hex(block), "transactionHash": "0x" + keccak(text=f"swap-{seed}-{i}").hex(),
+            "transactionIndex": "0x1", "blockHash": "0x" + keccak(text=f"block-{block}").hex(),
+            "logIndex": hex(i), "removed": False,
+        })
+    pool["sqrtPriceX96"] = sqrt_price
+    move_pool_tick(pool, get_tick_at_sqrt_ratio(sqrt_price))
+    state["logs"] = sorted(state.get("logs", []) + logs, key=lambda log: (int(log["blockNumber"], 16), int(log["logIndex"], 16)))
+    return len(logs)
+
+def _address_topic(address):
+    return "0x" + "00" * 12 + address[2:].lower()
+
+def transfer_position(state, position_id, new_owner, block=None):
+    # NFPM-Transfer (new_owner None: Burn, unbekannte ID: Mint) samt Transfer-Log für eth_getLogs
+    block = state["block_number"] if block is None else block
+    position = state["positions"].get(str(position_id))
+    old_owner = position["owner"] if position else "0x" + "00" * 20
+    if new_owner is None:
+        state["positions"].pop(str(position_id), None)
+    elif position is None:
+        template = next(iter(state["positions"].values()))
+        state["positions"][str(position_id)] = dict(template, owner=new_owner, mint_block=block)
+    else:
+        position["owner"] = new_owner
+    log_index = sum(1 for log in state.get("logs", []) if int(log["blockNumber"], 16) == block)
+    state["logs"] = sorted(state.get("logs", []) + [{
+        "address": NFPM_ADDRESS, "topics": [TRANSFER_EVENT_TOPIC, _address_topic(old_owner), _address_topic(new_owner or "0x" + "00" * 20), "0x" + int(position_id).to_bytes(32, 'big').hex()],
+        "data": "0x", "blockNumber": hex(block), "transactionHash": "0x" + keccak(text=f"transfer-{position_id}-{block}").hex(),
+        "transactionIndex": "0x1", "blockHash": "0x" + keccak(text=f"block-{block}").hex(), "logIndex": hex(log_index), "removed": False,
+    }], key=lambda log: (int(log["blockNumber"], 16), int(log["logIndex"], 16)))
+
+def load_fixture(state, path):
+    # Fixture aus `swap_ingest.py --record`: Roh-Logs plus Block-Timestamps eines echten Blockbereichs
+    with open(path, 'r', encoding='utf-8') as f:
+        fixture = json.load(f)
+    state["logs"] = sorted(fixture["logs"], key=lambda log: (int(log["blockNumber"], 16), int(log["logIndex"], 16)))
+    state.setdefault("block_timestamps", {}).update(fixture.get("block_timestamps", {}))
+    to_block = fixture.get("to_block")
+    if to_block is not None:
+        state["block_number"] = max(state["block_number"], to_block)
+        if str(to_block) in state["block_timestamps"]:
+            state["block_number"] = to_block
+            state["block_timestamp"] = state["block_timestamps"][str(to_block)]
+    return len(state["logs"])
+
+class StandInChain:
+    def __init__(self, state, latency_ms=0, failure_rate=0.0, slow_rate=0.0, slow_ms=0, seed=None):
+        self.state = state
+        self.latency_ms = latency_ms # Künstliche Latenz pro HTTP-Request (für Benchmarks)
+        self.failure_rate = failure_rate # Anteil der JSON-RPC-Requests, die mit HTTP 503 scheitern
+        self.slow_rate = slow_rate # Anteil der JSON-RPC-Requests mit zusätzlich slow_ms Latenz (Tail-Latenz)
+        self.slow_ms = slow_ms
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.call_count = 0
+        self.method_counts = {}
+
+    def handle(self, request):
+        method, params = request.get("method"), request.get("params", [])
+        with self.lock:
+            self.method_counts[method] = self.method_counts.get(method, 0) + 1
+        try:
+            if method == "eth_chainId":
+                result = hex(self.state["chain_id"])
+            elif method == "net_version":
+                result = str(self.state["chain_id"])
+            elif method == "web3_clientVersion":
+                result = "stand-in-node/1.0"
+            elif method == "eth_blockNumber":
+                result = hex(self.state["block_number"])
+            elif method == "eth_getBlockByNumber":
+                block = self._block_number(params[0])
+                if block > self.state["block_number"]:
+                    result = None
+                else:
+                    result = {"number": hex(block), "timestamp": hex(self._block_timestamp(block))}
+            elif method == "eth_call":
+                tx = params[0]
+                data = bytes.fromhex(tx.get("data", tx.get("input", "0x"))[2:])
+                block = self._block_number(params[1] if len(params) > 1 else "latest")
+                result = "0x" + self.execute(tx["to"].lower(), data, (tx.get("from") or "").lower(), block).hex()
+            elif method == "eth_getLogs":
+                result = self.get_logs(params[0])
+                if isinstance(result, dict):
+                    return {"jsonrpc": "2.0", "id": request.get("id"), "error": result}
+            else:
+                return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32601, "message": f"method {method} not supported"}}
+        except Revert as e:
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": 3, "message": f"execution reverted: {e}"}}
+        return {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+
+    def _block_number(self, tag):
+        if tag in ("latest", "pending", "safe", "finalized", None):
+            return self.state["block_number"]
+        if tag == "earliest":
+            return 0
+        return int(tag, 16)
+
+    def _block_timestamp(self, block):
+        if str(block) in self.state.get("block_timestamps", {}):
+            return self.state["block_timestamps"][str(block)]
+        return int(self.state["block_timestamp"] - (self.state["block_number"] - block) * self.state["block_time"])
+
+    def get_logs(self, log_filter):
+        # Liefert eine Liste oder ein JSON-RPC-Error-Objekt (Limits wie bei öffentlichen Providern)
+        from_block = self._block_number(log_filter.get("fromBlock", "latest"))
+        to_block = self._block_number(log_filter.get("toBlock", "latest"))
+        max_range = self.state.get("max_block_range")
+        if max_range and to_block - from_block + 1 > max_range:
+            return {"code": -32600, "message": f"block range too large, max {max_range} blocks"}
+        logs = self.state.get("logs", [])
+        blocks = [int(log["blockNumber"], 16) for log in logs] # Logs sind nach Block sortiert
+        selected = logs[bisect.bisect_left(blocks, from_block):bisect.bisect_right(blocks, to_block)]
+        addresses = log_filter.get("address")
+        if addresses:
+            addresses = {a.lower() for a in ([addresses] if isinstance(addresses, str) else addresses)}
+            selected = [log for log in selected if log["address"].lower() in addresses]
+        for position, topic in enumerate(log_filter.get("topics") or []):
+            if topic is None:
+                continue
+            options = {t.lower() for t in ([topic] if isinstance(topic, str) else topic)}
+            selected = [log for log in selected if len(log["topics"]) > position and log["topics"][position].lower() in options]
+        max_logs = self.state.get("max_logs_per_query")
+        if max_logs and len(selected) > max_logs:
+            return {"code": -32005, "message": f"query returned more than {max_logs} results"}
+        return selected
+
+    def coingecko(self, path, query):
+        # simple/token_price und market_chart/range mit festen USD-Preisen (Historie: konstant)
+        prices = self.state.get("usd_prices", DEFAULT_USD_PRICES)
+        if "/simple/token_price/" in path:
+            addresses = query.get("contract_addresses", [""])[0].lower().split(",")
+            return {address: {"usd": prices.get(address, 1.0)} for address in addresses if address}
+        if path.endswith("/market_chart/range"):
+            address = path.split("/contract/")[1].split("/")[0].lower()
+            start, end = int(query["from"][0]), int(query["to"][0])
+            return {"prices": [[ts * 1000, prices.get(address, 1.0)] for ts in range(start, end, 3600)]}
+        return None
+
+    def _fees_at(self, pos, block):
+        mint_block = pos.get("mint_block", 0)
+        if block < mint_block:
+            raise Revert("Invalid token ID")
+        share = (block - mint_block) / max(1, self.state["block_number"] - mint_block)
+        return int(pos.get("fees0", 0) * share), int(pos.get("fees1", 0) * share)
+
+    def _owned_positions(self, owner):
+        return sorted(int(token_id) for token_id, pos in self.state["positions"].items() if pos["owner"].lower() == owner.lower())
+
+    def execute(self, to, data, sender, block=None):
+        block = self.state["block_number"] if block is None else block
+        with self.lock:
+            self.call_count += 1
+        name = SELECTORS.get(data[:4])
+        args = data[4:]
+        if to == MULTICALL3_ADDRESS and name == "aggregate3":
+            (calls,) = decode(["(address,bool,bytes)[]"], args)
+            results = []
+            for target, allow_failure, calldata in calls:
+                try:
+                    results.append((True, self.execute(target.lower(), calldata, MULTICALL3_ADDRESS, block)))
+                except Revert as e:
+                    if not allow_failure:
+                        raise Revert(f"Multicall3: call failed ({e})")
+                    results.append((False, b""))
+            return encode(["(bool,bytes)[]"], [results])
+        if to == NFPM_ADDRESS:
+            if name == "positions":
+                (token_id,) = decode(["uint256"], args)
+                pos = self.state["positions"].get(str(token_id))
+                if pos is None:
+                    raise Revert("Invalid token ID")
+                fees0, fees1 = self._fees_at(pos, block) # Ohne Fee-Model (alte State-Dateien): alles als tokensOwed
+                return encode(
+                    ["uint96", "address", "address", "address", "uint24", "int24", "int24", "uint128", "uint256", "uint256", "uint128", "uint128"],
+                    [0, "0x" + "00" * 20, pos["token0"], pos["token1"], pos["fee"], pos["tickLower"], pos["tickUpper"],
+                     pos["liquidity"], pos.get("feeGrowthInside0LastX128", 0), pos.get("feeGrowthInside1LastX128", 0),
+                     pos.get("tokensOwed0", fees0), pos.get("tokensOwed1", fees1)])
+            if name == "ownerOf":
+                (token_id,) = decode(["uint256"], args)
+                pos = self.state["positions"].get(str(token_id))
+                if pos is None:
+                    raise Revert("ERC721: owner query for nonexistent token")
+                return encode(["address"], [pos["owner"]])
+            if name == "balanceOf":
+                (owner,) = decode(["address"], args)
+                return encode(["uint256"], [len(self._owned_positions(owner))])
+            if name == "tokenOfOwnerByIndex":
+                owner, index = decode(["address", "uint256"], args)
+                owned = self._owned_positions(owner)
+                if index >= len(owned):
+                    raise Revert("ERC721Enumerable: owner index out of bounds")
+                return encode(["uint256"], [owned[index]])
+            if name == "collect":
+                ((token_id, recipient, amount0_max, amount1_max),) = decode(["(uint256,address,uint128,uint128)"], args)
+                pos = self.state["positions"].get(str(token_id))
+                if pos is None:
+                    raise Revert("Invalid token ID")
+                if sender != pos["owner"].lower():
+                    raise Revert("Not approved")
+                fees0, fees1 = self._fees_at(pos, block)
+                return encode(["uint256", "uint256"], [min(fees0, amount0_max), min(fees1, amount1_max)])
+        if to == UNISWAP_V3_FACTORY_ADDRESS and name == "getPool":
+            token_a, token_b, fee = decode(["address", "address", "uint24"], args)
+            token0, token1 = sorted([token_a.lower(), token_b.lower()])
+            for address, pool in self.state["pools"].items():
+                if (pool["token0"].lower(), pool["token1"].lower(), pool["fee"]) == (token0, token1, fee):
+                    return encode(["address"], [address])
+            return encode(["address"], ["0x" + "00" * 20])
+        token = self.state["tokens"].get(to)
+        if token is not None:
+            if name == "decimals":
+                return encode(["uint8"], [token["decimals"]])
+            if name == "symbol":
+                return encode(["string"], [token["symbol"]])
+        pool = self.state["pools"].get(to)
+        if pool is not None:
+            if name == "slot0":
+                return encode(["uint160", "int24", "uint16", "uint16", "uint16", "uint8", "bool"],
+                              [pool["sqrtPriceX96"], pool["tick"], 0, 1, 1, 0, True])
+            if name in ("token0", "token1"):
+                return encode(["address"], [pool[name]])
+            if name == "fee":
+                return encode(["uint24"], [pool["fee"]])
+            if name in ("feeGrowthGlobal0X128", "feeGrowthGlobal1X128"):
+                return encode(["uint256"], [pool.get(name, 0)])
+            if name == "ticks":
+                (tick,) = decode(["int24"], args)
+                info = pool.get("ticks", {}).get(str(tick))
+                if info is None:
+                    return encode(["uint128", "int128", "uint256", "uint256", "int56", "uint160", "uint32", "bool"], [0, 0, 0, 0, 0, 0, 0, False])
+                return encode(["uint128", "int128", "uint256", "uint256", "int56", "uint160", "uint32", "bool"],
+                              [info["liquidityGross"], info["liquidityNet"], info["feeGrowthOutside0X128"], info["feeGrowthOutside1X128"], 0, 0, 0, True])
+        raise Revert(f"no handler for {name or data[:4].hex()} on {to}")
+
+def make_handler(chain):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            # Header und Body gehen getrennt raus; ohne TCP_NODELAY kostet jede Keep-Alive-Antwort ~40 ms Delayed ACK
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with chain.lock:
+                chain.request_count += 1
+                fail = chain.random.random() < chain.failure_rate
+                slow = chain.random.random() < chain.slow_rate
+            if chain.latency_ms or slow:
+                time.sleep((chain.latency_ms + (chain.slow_ms if slow else 0)) / 1000.0)
+            if fail:
+                self._send({"error": "injected failure"}, 503)
+                return
+            try:
+                payload = json.loads(body)
+            except json.JSONDecodeError:
+                self._send({"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "parse error"}})
+                return
+            if isinstance(payload, list):
+                self._send([chain.handle(item) for item in payload])
+            else:
+                self._send(chain.handle(payload))
+
+        def do_GET(self):
+            with chain.lock:
+                chain.request_count += 1
+            if chain.latency_ms:
+                time.sleep(chain.latency_ms / 1000.0)
+            url = urlparse(self.path)
+            result = chain.coingecko(url.path, parse_qs(url.query))
+            self._send(result if result is not None else {"error": "not found"}, 200 if result is not None else 404)
+
+        def _send(self, obj, status=200):
+            out = json.dumps(obj).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            try:
+                self.wfile.write(out)
+            except (BrokenPipeError, ConnectionResetError): # Client hat aufgegeben (z.B. Verlierer eines Hedged Requests)
+                pass
+
+        def log_message(self, format, *args):
+            pass
+    return Handler
+
+def start_server(state=None, host="127.0.0.1", port=0, latency_ms=0, failure_rate=0.0, slow_rate=0.0, slow_ms=0, seed=None):
+    # Startet den Node in einem Hintergrund-Thread; port=0 wählt einen freien Port.
+    # Mehrere Nodes mit demselben state-Objekt verhalten sich wie Provider derselben Chain.
+    chain = StandInChain(state or default_state(), latency_ms, failure_rate, slow_rate, slow_ms, seed)
+    server = ThreadingHTTPServer((host, port), make_handler(chain))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, chain, f"http://{host}:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokaler JSON-RPC Stand-in-Node für tracker.py/price_updater.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8545)
+    parser.add_argument("--state", help="JSON-Datei mit Chain-State (Default: eingebauter WBTC/WETH-State)")
+    parser.add_argument("--positions", type=int, default=1, help="Anzahl synthetischer Positionen im Default-State")
+    parser.add_argument("--pools", type=int, default=1, help="Anzahl Pools im Default-State (Positionen reihum verteilt)")
+    parser.add_argument("--wallet", default=DEFAULT_WALLET, help="Owner der synthetischen Positionen")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Künstliche Latenz pro HTTP-Request")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Anteil der JSON-RPC-Requests, die mit HTTP 503 scheitern")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Anteil der JSON-RPC-Requests mit zusätzlicher Latenz --slow-ms")
+    parser.add_argument("--slow-ms", type=float, default=0, help="Zusätzliche Latenz langsamer Requests")
+    parser.add_argument("--fixture", help="Aufgezeichnete Swap-Logs (swap_ingest.py --record) für eth_getLogs")
+    parser.add_argument("--swaps", type=int, default=0, help="Anzahl synthetischer Swap-Logs über die letzten 4 Tage")
+    args = parser.parse_args()
+
+    if args.state:
+        with open(args.state, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    else:
+        state = default_state(args.positions, args.wallet.lower(), args.pools)
+    if args.fixture:
+        print(f"{load_fixture(state, args.fixture)} Logs aus {args.fixture} geladen.")
+    elif args.swaps:
+        print(f"{synthetic_swap_logs(state, args.swaps)} synthetische Swap-Logs erzeugt.")
+    chain = StandInChain(state, args.latency_ms, args.failure_rate, args.slow_rate, args.slow_ms)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(chain))
+    print(f"Stand-in Node läuft auf http://{args.host}:{args.port} ({len(state['positions'])} Positionen, {len(state['pools'])} Pools)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"{chain.request_count} HTTP-Requests, {chain.call_count} eth_calls beantwortet.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import argparse
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+import pools
+import tick_store
+from abi_codec import keccak256
+from multicall import ChunkSizer, RpcError, rpc_batch, rpc_request
+from pools import PRICE_PRESENTATION_IS_TOKEN0_BASE
+from tickmath import sqrt_price_x96_to_price
+
+# Liest die Swap-Events eines Pools per eth_getLogs und schreibt jeden Preiswechsel als Tick in den Tick-Store.
+# Chunk-Größe passt sich an Antwortgröße und Provider-Fehler an, der Fortschritt liegt in einer Cursor-Datei.
+# Nebenbei entstehen Tagesvolumen und geschätzte Pool-Gebühren pro Token.
+load_dotenv()
+
+ARBITRUM_RPC_URL = os.getenv('ARBITRUM_RPC')
+SWAP_EVENT_TOPIC = "0x" + keccak256(b"Swap(address,address,int256,int256,uint160,uint128,int24)").hex()
+SWAP_STATE_FILE = "swap_ingest_state.json"
+SWAP_CONFIRMATIONS = 20 # Die letzten Blöcke auslassen (Reorgs)
+SWAP_INITIAL_CHUNK_BLOCKS = 5000
+SWAP_DEFAULT_LOOKBACK_SECONDS = 24 * 3600 # Startpunkt ohne Cursor
+SWAP_VOLUME_MAX_DAYS = 90
+BLOCK_HEADER_BATCH_SIZE = 100
+
+def _word(data, index, signed=False):
+    return int.from_bytes(data[32 * index:32 * (index + 1)], 'big', signed=signed)
+
+def decode_swap_log(log):
+    # Swap(sender, recipient, int256 amount0, int256 amount1, uint160 sqrtPriceX96, uint128 liquidity, int24 tick)
+    # sender/recipient sind indexed; data enthält genau fünf 32-Byte-Wörter.
+    data = bytes.fromhex(log["data"][2:])
+    if len(data) != 160 or not log.get("topics") or log["topics"][0].lower() != SWAP_EVENT_TOPIC:
+        return None
+    return {
+        "block": int(log["blockNumber"], 16),
+        "log_index": int(log["logIndex"], 16),
+        "timestamp": int(log["blockTimestamp"], 16) if log.get("blockTimestamp") else None,
+        "amount0": _word(data, 0, signed=True),
+        "amount1": _word(data, 1, signed=True),
+        "sqrt_price_x96": _word(data, 2),
+        "liquidity": _word(data, 3),
+        "tick": _word(data, 4, signed=True),
+    }
+
+def get_swap_logs(rpc_url, pool_address, from_block, to_block):
+    return rpc_request(rpc_url, "eth_getLogs", [{
+        "address": pool_address, "topics": [SWAP_EVENT_TOPIC], "fromBlock": hex(from_block), "toBlock": hex(to_block),
+    }])
+
+def block_timestamps(rpc_url, blocks, cache):
+    missing = sorted(block for block in set(blocks) if block not in cache)
+    for start in range(0, len(missing), BLOCK_HEADER_BATCH_SIZE):
+        chunk = missing[start:start + BLOCK_HEADER_BATCH_SIZE]
+        results = rpc_batch(rpc_url, [("eth_getBlockByNumber", [hex(block), False]) for block in chunk])
+        for block, result in zip(chunk, results):
+            if isinstance(result, RpcError) or not result:
+                raise RpcError(f"Block {block} nicht lesbar: {result}")
+            cache[block] = int(result["timestamp"], 16)
+    return cache
+
+def block_at(rpc_url, target_ts, latest):
+    # Letzter Block mit timestamp <= target_ts (Binärsuche)
+    cache = {}
+    def timestamp(number):
+        if number not in cache:
+            cache[number] = int(rpc_request(rpc_url, "eth_getBlockByNumber", [hex(number), False])["timestamp"], 16)
+        return cache[number]
+    lo, hi = 0, latest
+    if timestamp(hi) <= target_ts:
+        return hi
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if timestamp(mid) <= target_ts:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+def load_state(filename=SWAP_STATE_FILE):
+    if not os.path.exists(filename):
+        return {"pools": {}}
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        print(f"Warnung: {filename} ist korrupt. Starte ohne Cursor.")
+        return {"pools": {}}
+
+def save_state(state, filename=SWAP_STATE_FILE):
+    tmp_path = filename + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, filename)
+
+def update_volume(volume_by_day, swaps, timestamps, meta):
+    # Volumen = Summe |amount| pro Token; Gebühren fallen auf die Seite an, die in den Pool fließt (amount > 0).
+    scale0, scale1, fee_rate = 10 ** meta["decimals0"], 10 ** meta["decimals1"], meta["fee"] / 1e6
+    for swap in swaps:
+        day = datetime.fromtimestamp(timestamps[swap["block"]], timezone.utc).strftime('%Y-%m-%d')
+        stats = volume_by_day.setdefault(day, {"swaps": 0, "volume0": 0.0, "volume1": 0.0, "fees0": 0.0, "fees1": 0.0})
+        stats["swaps"] += 1
+        stats["volume0"] += abs(swap["amount0"]) / scale0
+        stats["volume1"] += abs(swap["amount1"]) / scale1
+        if swap["amount0"] > 0:
+            stats["fees0"] += swap["amount0"] / scale0 * fee_rate
+        if swap["amount1"] > 0:
+            stats["fees1"] += swap["amount1"] / scale1 * fee_rate
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=SWAP_VOLUME_MAX_DAYS)).strftime('%Y-%m-%d')
+    for day in [day for day in volume_by_day if day < cutoff]:
+        del volume_by_day[day]
+
+def iter_log_chunks(rpc_url, pool_address, from_block, to_block, sizer):
+    # Liefert (chunk_start, chunk_end, logs); bei Fehlern wird derselbe Bereich kleiner erneut angefragt.
+    start = from_block
+    while start <= to_block:
+        end = min(to_block, start + sizer.size - 1)
+        try:
+            logs = get_swap_logs(rpc_url, pool_address, start, end)
+        except Exception as e:
+            if not sizer.failed():
+                raise
+            print(f"  eth_getLogs {start}-{end} fehlgeschlagen ({e}). Neue Chunk-Größe: {sizer.size} Blöcke.")
+            continue
+        sizer.succeeded(len(logs))
+        yield start, end, logs
+        start = end + 1
+
+def ingest(rpc_url, pool_address, state_file=SWAP_STATE_FILE, store_dir=tick_store.DEFAULT_STORE_DIR, from_block=None, to_block=None):
+    state = load_state(state_file)
+    pool_state = state["pools"].setdefault(pool_address.lower(), {})
+    meta = pool_state.get("meta") or pools.pool_for_address(rpc_url, pool_address)
+    pool_state["meta"] = meta
+    base_sym, quote_sym = pools.price_symbols(meta, PRICE_PRESENTATION_IS_TOKEN0_BASE)
+    pair_id = tick_store.get_pair_id(base_sym, quote_sym, store_dir, pool=pool_address)
+
+    latest = int(rpc_request(rpc_url, "eth_blockNumber", []), 16)
+    to_block = latest - SWAP_CONFIRMATIONS if to_block is None else min(to_block, latest)
+    if from_block is None:
+        if pool_state.get("cursor") is not None:
+            from_block = pool_state["cursor"] + 1
+        else:
+            from_block = block_at(rpc_url, datetime.now(timezone.utc).timestamp() - SWAP_DEFAULT_LOOKBACK_SECONDS, latest)
+            print(f"Kein Cursor für {pool_address}, starte {SWAP_DEFAULT_LOOKBACK_SECONDS // 3600}h zurück bei Block {from_block}.")
+    if from_block > to_block:
+        print(f"Keine neuen Blöcke (Cursor {pool_state.get('cursor')}, Kopf {latest}).")
+        return 0
+
+    print(f"Lese Swaps von {pool_address} in Blöcken {from_block}-{to_block} ({quote_sym}/{base_sym}).")
+    sizer = ChunkSizer(pool_state.get("chunk_size", SWAP_INITIAL_CHUNK_BLOCKS))
+    timestamps = {}
+    volume_by_day = pool_state.setdefault("volume", {})
+    total = 0
+    for start, end, logs in iter_log_chunks(rpc_url, pool_address, from_block, to_block, sizer):
+        swaps = sorted((swap for swap in map(decode_swap_log, logs) if swap is not None), key=lambda swap: (swap["block"], swap["log_index"]))
+        for swap in swaps:
+            if swap["timestamp"] is not None:
+                timestamps[swap["block"]] = swap["timestamp"]
+        block_timestamps(rpc_url, [swap["block"] for swap in swaps], timestamps)
+        tick_store.append_ticks([(float(timestamps[swap["block"]]),
+                                  sqrt_price_x96_to_price(swap["sqrt_price_x96"], meta["decimals0"], meta["decimals1"], PRICE_PRESENTATION_IS_TOKEN0_BASE),
+                                  pair_id) for swap in swaps], store_dir)
+        update_volume(volume_by_day, swaps, timestamps, meta)
+        # Cursor erst nach den Ticks speichern: ein Abbruch dazwischen liest den Chunk erneut statt ihn zu verlieren
+        pool_state["cursor"], pool_state["chunk_size"] = end, sizer.size
+        save_state(state, state_file)
+        total += len(swaps)
+        print(f"  Blöcke {start}-{end}: {len(swaps)} Swaps (nächste Chunk-Größe {sizer.size}).")
+        timestamps = {block: ts for block, ts in timestamps.items() if block >= end - 1000} # Cache klein halten
+    print(f"{total} Swaps eingelesen, Cursor bei Block {pool_state.get('cursor')}.")
+    return total
+
+def record_fixture(rpc_url, pool_address, from_block, to_block, path):
+    # Rohdaten eines Blockbereichs für stand_in_node.py --fixture aufzeichnen (ohne Store/Cursor zu verändern)
+    sizer = ChunkSizer(SWAP_INITIAL_CHUNK_BLOCKS)
+    logs = []
+    for _, _, chunk_logs in iter_log_chunks(rpc_url, pool_address, from_block, to_block, sizer):
+        logs.extend(chunk_logs)
+    blocks = {int(log["blockNumber"], 16) for log in logs} | {from_block, to_block}
+    timestamps = block_timestamps(rpc_url, blocks, {})
+    fixture = {"pool": pool_address, "from_block": from_block, "to_block": to_block, "logs": logs,
+               "block_timestamps": {str(block): ts for block, ts in sorted(timestamps.items())}}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(fixture, f, separators=(",", ":"))
+    print(f"{len(logs)} Logs aus Blöcken {from_block}-{to_block} nach {path} geschrieben.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Swap-Events eines Uniswap-V3-Pools in den Tick-Store einlesen")
+    parser.add_argument("--pool", action="append", help="Pool-Adresse (mehrfach möglich; Default: alle Pools aus pool_cache.json bzw. pools.FALLBACK_POOLS)")
+    parser.add_argument("--from-block", type=int, help="Startblock (Default: Cursor + 1 bzw. 24h zurück)")
+    parser.add_argument("--to-block", type=int, help=f"Endblock (Default: Kopf - {SWAP_CONFIRMATIONS})")
+    parser.add_argument("--state-file", default=SWAP_STATE_FILE)
+    parser.add_argument("--record", metavar="FIXTURE", help="Nur Roh-Logs + Block-Timestamps als Fixture speichern")
+    args = parser.parse_args()
+
+    print(f"--- Starting Swap Ingest ({datetime.now(timezone.utc).isoformat()}) ---")
+    if not ARBITRUM_RPC_URL:
+        print("CRITICAL Error: Missing ARBITRUM_RPC. Exiting.")
+        return 1
+    if args.record:
+        if args.from_block is None or args.to_block is None:
+            print("--record braucht --from-block und --to-block.")
+            return 1
+        record_fixture(ARBITRUM_RPC_URL, (args.pool or [pools.FALLBACK_POOLS[0]["address"]])[0], args.from_block, args.to_block, args.record)
+        return 0
+    pool_addresses = args.pool or sorted({entry["address"] for entry in pools.load_pool_cache()["pools"].values()}) or [entry["address"] for entry in pools.FALLBACK_POOLS]
+    failed = 0
+    for pool_address in pool_addresses:
+        try:
+            ingest(ARBITRUM_RPC_URL, pool_address, args.state_file, from_block=args.from_block, to_block=args.to_block)
+        except Exception as e:
+            print(f"FEHLER beim Einlesen der Swaps von {pool_address}: {e}")
+            failed += 1
+    if failed:
+        print(f"--- Swap Ingest Finished: {failed} von {len(pool_addresses)} Pool(s) fehlgeschlagen ---")
+        return 1
+    print(f"--- Swap Ingest Finished ---")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
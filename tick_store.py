@@ -0,0 +1,286 @@
+import os
+import sys
+import json
+import fcntl
+import struct
+import contextlib
+from datetime import datetime, timedelta, timezone
+import numpy as np
+
+# Append-only Speicher für Preis-Ticks: ein Segment pro UTC-Tag, feste 20-Byte-Records (epoch, price, pair_id).
+# Retention löscht ganze Segmente statt die Datei neu zu schreiben, gelesen wird per mmap.
+# Schreiber (Daemon, swap_ingest.py, Cron) serialisieren sich über ein flock auf LOCK_FILE; Leser brauchen keins.
+DEFAULT_STORE_DIR = "price_ticks_store"
+PAIRS_FILE = "pairs.json"
+LOCK_FILE = ".lock"
+SEGMENT_SUFFIX = ".ticks"
+RECORD_FORMAT = "<ddI"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+TICK_DTYPE = np.dtype([("ts", "<f8"), ("price", "<f8"), ("pair", "<u4")])
+assert TICK_DTYPE.itemsize == RECORD_SIZE
+
+def _segment_name(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%d') + SEGMENT_SUFFIX
+
+def _segment_day(name):
+    return datetime.strptime(name[:-len(SEGMENT_SUFFIX)], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+
+def list_segments(store_dir=DEFAULT_STORE_DIR):
+    if not os.path.isdir(store_dir):
+        return []
+    return sorted(name for name in os.listdir(store_dir) if name.endswith(SEGMENT_SUFFIX))
+
+def store_exists(store_dir=DEFAULT_STORE_DIR):
+    return bool(list_segments(store_dir))
+
+def load_pairs(store_dir=DEFAULT_STORE_DIR):
+    path = os.path.join(store_dir, PAIRS_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get("pairs", [])
+
+def _save_pairs(store_dir, pairs):
+    os.makedirs(store_dir, exist_ok=True)
+    path = os.path.join(store_dir, PAIRS_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"pairs": pairs}, f, indent=2)
+    os.replace(tmp_path, path)
+
+@contextlib.contextmanager
+def _store_lock(store_dir):
+    # Store-weit statt pro Segment: _merge_into_segment ersetzt die Segmentdatei, ein Lock auf ihr würde mit ersetzt
+    os.makedirs(store_dir, exist_ok=True)
+    fd = os.open(os.path.join(store_dir, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd) # gibt das flock frei
+
+def get_pair_id(base_token, quote_token, store_dir=DEFAULT_STORE_DIR, create=True, pool=None):
+    # Mit pool wird pro Pool-Adresse unterschieden (gleiches Paar, andere Fee-Stufe = eigene Serie).
+    # Ein älteres Paar ohne Pool-Adresse mit denselben Symbolen wird beim ersten Aufruf mit pool übernommen.
+    # Lesen, Vergeben und Speichern unter _store_lock (Daemon und swap_ingest.py legen Paare parallel an).
+    pool = pool.lower() if pool else None
+    if not create and not os.path.isdir(store_dir):
+        return None
+    with _store_lock(store_dir):
+        pairs = load_pairs(store_dir)
+        legacy = None
+        for pair in pairs:
+            if pair["base_token"] != base_token or pair["quote_token"] != quote_token:
+                continue
+            if pair.get("pool") == pool:
+                return pair["id"]
+            if pool and not pair.get("pool") and legacy is None:
+                legacy = pair
+        if legacy is not None:
+            legacy["pool"] = pool
+            _save_pairs(store_dir, pairs)
+            return legacy["id"]
+        if not create:
+            return None
+        pair_id = max((pair["id"] for pair in pairs), default=-1) + 1
+        pair = {"id": pair_id, "base_token": base_token, "quote_token": quote_token}
+        if pool:
+            pair["pool"] = pool
+        pairs.append(pair)
+        _save_pairs(store_dir, pairs)
+        return pair_id
+
+def append_ticks(records, store_dir=DEFAULT_STORE_DIR):
+    # records: Iterable von (epoch, price, pair_id). Ein write() pro Segment, solange die neuen Ticks nach dem
+    # letzten vorhandenen liegen; ältere Ticks (z. B. aus Swap-Logs nachgeladen) werden einsortiert.
+    by_segment = {}
+    for epoch, price, pair_id in records:
+        by_segment.setdefault(_segment_name(epoch), []).append((epoch, price, pair_id))
+    if not by_segment:
+        return 0
+    written = 0
+    with _store_lock(store_dir):
+        for name, segment_records in by_segment.items():
+            segment_records.sort(key=lambda record: record[0])
+            path = os.path.join(store_dir, name)
+            _truncate_torn_record(path)
+            if segment_records[0][0] < _last_timestamp(path):
+                written += _merge_into_segment(path, segment_records)
+            else:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+                try:
+                    os.write(fd, b"".join(struct.pack(RECORD_FORMAT, *record) for record in segment_records))
+                finally:
+                    os.close(fd)
+                written += len(segment_records)
+    return written
+
+def _truncate_torn_record(path):
+    # Ein abgebrochener Schreibvorgang kann einen halben Record hinterlassen; ohne Kürzen wäre alles danach verschoben
+    if not os.path.exists(path):
+        return
+    size = os.path.getsize(path)
+    if size % RECORD_SIZE:
+        os.truncate(path, size - size % RECORD_SIZE)
+
+def _last_timestamp(path):
+    count = os.path.getsize(path) // RECORD_SIZE if os.path.exists(path) else 0
+    if count == 0:
+        return float("-inf")
+    with open(path, 'rb') as f:
+        f.seek((count - 1) * RECORD_SIZE)
+        return struct.unpack(RECORD_FORMAT, f.read(RECORD_SIZE))[0]
+
+def _merge_into_segment(path, records):
+    # Segment sortiert neu schreiben (tmp + os.replace, nur unter _store_lock); offene mmap-Leser behalten die alte Datei.
+    # Gleiche (ts, pair, price) wie schon vorhandene Records (z.B. erneut geladene Swap-Logs) werden verworfen.
+    count = os.path.getsize(path) // RECORD_SIZE
+    existing = np.fromfile(path, dtype=TICK_DTYPE, count=count)
+    merged = np.concatenate([existing, np.array(records, dtype=TICK_DTYPE)])
+    _, first_index = np.unique(merged, return_index=True)
+    merged = merged[np.sort(first_index)]
+    merged = merged[np.argsort(merged["ts"], kind='stable')]
+    tmp_path = path + ".tmp"
+    merged.tofile(tmp_path)
+    os.replace(tmp_path, path)
+    return len(merged) - count
+
+def append_tick(epoch, price, base_token, quote_token, store_dir=DEFAULT_STORE_DIR, pool=None):
+    pair_id = get_pair_id(base_token, quote_token, store_dir, pool=pool)
+    return append_ticks([(epoch, price, pair_id)], store_dir)
+
+def compact(max_age_days, store_dir=DEFAULT_STORE_DIR, now=None):
+    # Entfernt alle Segmente, deren Tag komplett vor dem Cutoff liegt. Feinere Filterung passiert beim Lesen.
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=max_age_days)
+    removed = 0
+    if not os.path.isdir(store_dir):
+        return removed
+    with _store_lock(store_dir):
+        for name in list_segments(store_dir):
+            if _segment_day(name) + timedelta(days=1) <= cutoff:
+                os.remove(os.path.join(store_dir, name))
+                removed += 1
+    return removed
+
+def iter_segments(store_dir=DEFAULT_STORE_DIR, start=None, end=None):
+    # Liefert pro Segment eine zero-copy View (np.memmap) auf die Records im Zeitfenster [start, end).
+    for name in list_segments(store_dir):
+        day = _segment_day(name).timestamp()
+        if start is not None and day + 86400 <= start:
+            continue
+        if end is not None and day >= end:
+            continue
+        path = os.path.join(store_dir, name)
+        count = os.path.getsize(path) // RECORD_SIZE # Ein abgebrochener letzter Record wird ignoriert
+        if count == 0:
+            continue
+        records = np.memmap(path, dtype=TICK_DTYPE, mode='r', shape=(count,))
+        lo = 0 if start is None else int(np.searchsorted(records["ts"], start, side='left'))
+        hi = count if end is None else int(np.searchsorted(records["ts"], end, side='left'))
+        if hi > lo:
+            yield records[lo:hi]
+
+def read_ticks(store_dir=DEFAULT_STORE_DIR, start=None, end=None, pair_id=None):
+    views = list(iter_segments(store_dir, start, end))
+    if not views:
+        return np.empty(0, dtype=TICK_DTYPE)
+    ticks = views[0] if len(views) == 1 else np.concatenate(views)
+    if pair_id is not None:
+        ticks = ticks[ticks["pair"] == pair_id]
+    return ticks
+
+def parse_timestamp(timestamp_str):
+    # ISO-Zeitstempel aus price_ticks.json: "Z" und Offsets werden beachtet, ohne Zeitzone gilt UTC
+    if timestamp_str.endswith("Z"):
+        return datetime.fromisoformat(timestamp_str[:-1] + "+00:00")
+    dt = datetime.fromisoformat(timestamp_str)
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+def migrate_from_json(json_path, store_dir=DEFAULT_STORE_DIR):
+    # Einmalige Übernahme der bisherigen price_ticks.json. Bricht ab, wenn der Store schon Segmente hat.
+    if store_exists(store_dir):
+        print(f"Tick-Store '{store_dir}' enthält bereits Daten, Migration übersprungen.")
+        return 0
+    if not os.path.exists(json_path):
+        print(f"Info: '{json_path}' nicht gefunden, nichts zu migrieren.")
+        return 0
+    with open(json_path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        print(f"Warnung: {json_path} enthält keine Liste. Nichts migriert.")
+        return 0
+
+    pair_ids = {}
+    records = []
+    for entry in entries:
+        try:
+            key = (entry["base_token"], entry["quote_token"], entry.get("pool"))
+            if key not in pair_ids:
+                pair_ids[key] = get_pair_id(key[0], key[1], store_dir, pool=key[2])
+            records.append((parse_timestamp(entry["timestamp"]).timestamp(), float(entry["price"]), pair_ids[key]))
+        except Exception as e:
+            print(f"Warnung: Eintrag {entry!r} nicht migrierbar: {e}. Eintrag wird ignoriert.")
+    records.sort(key=lambda record: record[0])
+    written = append_ticks(records, store_dir)
+    print(f"{written} Ticks aus {json_path} nach '{store_dir}' migriert.")
+    return written
+
+def export_json(json_path, store_dir=DEFAULT_STORE_DIR, max_age_days=None, now=None, min_interval_seconds=None):
+    # Schreibt den Store im bisherigen price_ticks.json-Format, atomar via os.replace.
+    # min_interval_seconds: pro Paar nur den letzten Tick je Zeitfenster (Swap-Ticks/Daemon-Samples sind sehr dicht).
+    start = None
+    if max_age_days is not None:
+        start = ((now or datetime.now(timezone.utc)) - timedelta(days=max_age_days)).timestamp()
+    pairs = {pair["id"]: pair for pair in load_pairs(store_dir)}
+    ticks = read_ticks(store_dir, start=start)
+    if min_interval_seconds and len(ticks):
+        buckets = np.floor(ticks["ts"] / min_interval_seconds).astype(np.int64)
+        last_in_bucket = np.ones(len(ticks), dtype=bool)
+        for pair_id in np.unique(ticks["pair"]).tolist():
+            indices = np.flatnonzero(ticks["pair"] == pair_id)
+            last_in_bucket[indices[:-1]] = buckets[indices[1:]] != buckets[indices[:-1]]
+        ticks = ticks[last_in_bucket]
+    entries = []
+    for ts, price, pair_id in zip(ticks["ts"].tolist(), ticks["price"].tolist(), ticks["pair"].tolist()):
+        pair = pairs.get(pair_id)
+        if pair is None:
+            continue
+        entry = {
+            "timestamp": datetime.fromtimestamp(ts, timezone.utc).isoformat().replace("+00:00", "Z"),
+            "price": price, "base_token": pair["base_token"], "quote_token": pair["quote_token"],
+        }
+        if pair.get("pool"):
+            entry["pool"] = pair["pool"]
+        entries.append(entry)
+    tmp_path = json_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, separators=(",", ":"))
+    os.replace(tmp_path, json_path)
+    return len(entries)
+
+def main():
+    usage = "Usage: python tick_store.py migrate [price_ticks.json] | export [price_ticks.json] [max_age_days] | compact [max_age_days] | stats"
+    if len(sys.argv) < 2:
+        print(usage); return
+    command = sys.argv[1]
+    json_path = sys.argv[2] if len(sys.argv) > 2 else "price_ticks.json"
+    if command == "migrate":
+        migrate_from_json(json_path)
+    elif command == "export":
+        max_age_days = float(sys.argv[3]) if len(sys.argv) > 3 else None
+        print(f"{export_json(json_path, max_age_days=max_age_days)} Ticks nach {json_path} exportiert.")
+    elif command == "compact":
+        max_age_days = float(sys.argv[2]) if len(sys.argv) > 2 else 15
+        print(f"{compact(max_age_days)} Segment(e) entfernt.")
+    elif command == "stats":
+        pairs = {pair["id"]: f"{pair['quote_token']}/{pair['base_token']}" + (f"@{pair['pool'][:10]}" if pair.get("pool") else "") for pair in load_pairs()}
+        for name in list_segments():
+            ticks = read_ticks(start=_segment_day(name).timestamp(), end=_segment_day(name).timestamp() + 86400)
+            counts = {pairs.get(pair_id, pair_id): int((ticks["pair"] == pair_id).sum()) for pair_id in np.unique(ticks["pair"]).tolist()}
+            print(f"  {name}: {len(ticks)} Ticks {counts}")
+    else:
+        print(usage)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import sys
+import math
+import random
+from decimal import Decimal, getcontext
+from fractions import Fraction
+import numpy as np
+
+# Uniswap-V3-TickMath in exakter Ganzzahl-Arithmetik (1:1 wie TickMath.sol), dazu Preis-Umrechnungen
+# und ein NumPy-Batchpfad für ganze Arrays von Ticks bzw. sqrtPriceX96-Werten.
+MIN_TICK = -887272
+MAX_TICK = 887272
+MIN_SQRT_RATIO = 4295128739
+MAX_SQRT_RATIO = 1461446703485210103287273052203988822378723970342
+Q96 = 1 << 96
+Q192 = 1 << 192
+MAX_UINT256 = (1 << 256) - 1
+
+# 2**128 / sqrt(1.0001) ** (2**i) als Q128.128, Index i = Bit i von |tick| (aus TickMath.sol)
+TICK_RATIO_TABLE = (
+    0xfffcb933bd6fad37aa2d162d1a594001,
+    0xfff97272373d413259a46990580e213a,
+    0xfff2e50f5f656932ef12357cf3c7fdcc,
+    0xffe5caca7e10e4e61c3624eaa0941cd0,
+    0xffcb9843d60f6159c9db58835c926644,
+    0xff973b41fa98c081472e6896dfb254c0,
+    0xff2ea16466c96a3843ec78b326b52861,
+    0xfe5dee046a99a2a811c461f1969c3053,
+    0xfcbe86c7900a88aedcffc83b479aa3a4,
+    0xf987a7253ac413176f2b074cf7815e54,
+    0xf3392b0822b70005940c7a398e4b70f3,
+    0xe7159475a2c29b7443b29c7fa6e889d9,
+    0xd097f3bdfd2022b8845ad8f792aa5825,
+    0xa9f746462d870fdf8a65dc1f90e061e5,
+    0x70d869a156d2a1b890bb3df62baf32f7,
+    0x31be135f97d08fd981231505542fcfa6,
+    0x9aa508b5b7a84e1c677de54f3e99bc9,
+    0x5d6af8dedb81196699c329225ee604,
+    0x2216e584f5fa1ea926041bedfe98,
+    0x48a170391f7dc42444e8fa2,
+)
+# Dieselben Faktoren als float64 für den Batchpfad
+_TICK_RATIO_TABLE_FLOAT = np.array([factor / 2.0 ** 128 for factor in TICK_RATIO_TABLE])
+
+def get_sqrt_ratio_at_tick(tick):
+    tick = int(tick)
+    if tick < MIN_TICK or tick > MAX_TICK:
+        raise ValueError(f"Tick {tick} außerhalb [{MIN_TICK}, {MAX_TICK}]")
+    abs_tick = abs(tick)
+    ratio = TICK_RATIO_TABLE[0] if abs_tick & 1 else 1 << 128
+    for bit in range(1, len(TICK_RATIO_TABLE)):
+        if abs_tick & (1 << bit):
+            ratio = (ratio * TICK_RATIO_TABLE[bit]) >> 128
+    if tick > 0:
+        ratio = MAX_UINT256 // ratio
+    # Q128.128 -> Q64.96, aufgerundet wie on-chain
+    return (ratio >> 32) + (1 if ratio & 0xffffffff else 0)
+
+def get_tick_at_sqrt_ratio(sqrt_price_x96):
+    # Größter Tick mit get_sqrt_ratio_at_tick(tick) <= sqrt_price_x96
+    sqrt_price_x96 = int(sqrt_price_x96)
+    if sqrt_price_x96 < MIN_SQRT_RATIO or sqrt_price_x96 >= MAX_SQRT_RATIO:
+        raise ValueError(f"sqrtPriceX96 {sqrt_price_x96} außerhalb [MIN_SQRT_RATIO, MAX_SQRT_RATIO)")
+    ratio = sqrt_price_x96 << 32
+    msb = ratio.bit_length() - 1
+    r = ratio >> (msb - 127) if msb >= 128 else ratio << (127 - msb)
+    log_2 = (msb - 128) << 64
+    for shift in range(63, 49, -1):
+        r = (r * r) >> 127
+        f = r >> 128
+        log_2 |= f << shift
+        r >>= f
+    log_sqrt10001 = log_2 * 255738958999603826347141 # 128.128
+    tick_low = (log_sqrt10001 - 3402992956809132418596140100660247210) >> 128
+    tick_high = (log_sqrt10001 + 291339464771989622907027621153398088495) >> 128
+    if tick_low == tick_high:
+        return tick_low
+    return tick_high if get_sqrt_ratio_at_tick(tick_high) <= sqrt_price_x96 else tick_low
+
+def sqrt_price_x96_to_price(sqrt_price_x96, token0_decimals, token1_decimals, is_token0_base=True):
+    # Exakt als Bruch gerechnet, erst am Ende nach float gerundet.
+    # is_token0_base=True: Token1 pro Token0, sonst Token0 pro Token1 (jeweils in ganzen Token)
+    price_ratio = Fraction(int(sqrt_price_x96) ** 2, Q192) * Fraction(10) ** (token0_decimals - token1_decimals)
+    return float(price_ratio if is_token0_base else 1 / price_ratio)
+
+def tick_to_price(tick, token0_decimals, token1_decimals, is_token0_base=True):
+    # Preis an der Tick-Grenze, wie ihn der Pool selbst verwendet (über get_sqrt_ratio_at_tick)
+    return sqrt_price_x96_to_price(get_sqrt_ratio_at_tick(tick), token0_decimals, token1_decimals, is_token0_base)
+
+def price_to_tick(price, token0_decimals, token1_decimals, is_token0_base=True):
+    # Größter Tick, dessen Preis (Token1 pro Token0) <= price ist
+    price_ratio = Fraction(price) if is_token0_base else 1 / Fraction(price)
+    raw_ratio = price_ratio / Fraction(10) ** (token0_decimals - token1_decimals)
+    sqrt_price_x96 = math.isqrt(math.floor(raw_ratio * Q192))
+    sqrt_price_x96 = min(max(sqrt_price_x96, MIN_SQRT_RATIO), MAX_SQRT_RATIO - 1)
+    return get_tick_at_sqrt_ratio(sqrt_price_x96)
+
+def _adjust_prices(price_ratios, token0_decimals, token1_decimals, is_token0_base):
+    prices = price_ratios * 10.0 ** (token0_decimals - token1_decimals)
+    return prices if is_token0_base else 1.0 / prices
+
+def ticks_to_prices(ticks, token0_decimals, token1_decimals, is_token0_base=True):
+    # Batchpfad: gleicher Bit-Zerlegungs-Algorithmus wie get_sqrt_ratio_at_tick, aber in float64 über das ganze Array.
+    # Relativer Fehler gegenüber dem exakten Pfad < 1e-13.
+    ticks = np.asarray(ticks, dtype=np.int64)
+    if ticks.size and (ticks.min() < MIN_TICK or ticks.max() > MAX_TICK):
+        raise ValueError(f"Ticks außerhalb [{MIN_TICK}, {MAX_TICK}]")
+    abs_ticks = np.abs(ticks)
+    inverse_sqrt = np.ones(ticks.shape) # 1/sqrt(1.0001**|tick|)
+    for bit, factor in enumerate(_TICK_RATIO_TABLE_FLOAT):
+        inverse_sqrt = np.where(abs_ticks & (1 << bit), inverse_sqrt * factor, inverse_sqrt)
+    inverse_ratio = inverse_sqrt * inverse_sqrt
+    price_ratios = np.where(ticks > 0, 1.0 / inverse_ratio, inverse_ratio)
+    return _adjust_prices(price_ratios, token0_decimals, token1_decimals, is_token0_base)
+
+def sqrt_prices_to_prices(sqrt_prices_x96, token0_decimals, token1_decimals, is_token0_base=True):
+    # sqrtPriceX96 passt nicht in int64, daher als Python-Ints/Strings übergeben; die Umrechnung selbst ist vektorisiert.
+    sqrt_prices = np.array([float(int(value)) for value in sqrt_prices_x96], dtype=np.float64) / float(Q96)
+    return _adjust_prices(sqrt_prices * sqrt_prices, token0_decimals, token1_decimals, is_token0_base)
+
+def amounts_per_liquidity(sqrt_lowers, sqrt_uppers, prices):
+    # Token0/Token1 je Einheit Liquidität beim Preis prices (Token1 pro Token0), wie LiquidityAmounts im Periphery-Code.
+    # Mit dezimalbereinigten Preisen und L / 10**((decimals0 + decimals1) / 2) als Liquidität ergeben sich ganze Token.
+    sqrt_prices = np.clip(np.sqrt(prices), sqrt_lowers, sqrt_uppers)
+    return 1.0 / sqrt_prices - 1.0 / sqrt_uppers, sqrt_prices - sqrt_lowers
+
+# Referenzwerte von TickMath.getSqrtRatioAtTick (Uniswap-v3-core)
+REFERENCE_SQRT_RATIOS = {
+    MIN_TICK: MIN_SQRT_RATIO,
+    MIN_TICK + 1: 4295343490,
+    0: Q96,
+    MAX_TICK - 1: 1461373636630004318706518188784493106690254656249,
+    MAX_TICK: MAX_SQRT_RATIO,
+}
+
+def selfcheck(samples=2000, seed=1):
+    getcontext().prec = 80
+    failures = []
+
+    def check(condition, message):
+        if not condition:
+            failures.append(message)
+
+    for bit, factor in enumerate(TICK_RATIO_TABLE):
+        expected = Decimal(2) ** 128 / Decimal("1.0001") ** (Decimal(2 ** bit) / 2)
+        check(abs(Decimal(factor) - expected) <= 2, f"Tabellenwert Bit {bit} weicht ab ({factor} vs {expected:.0f})")
+    for tick, expected in REFERENCE_SQRT_RATIOS.items():
+        check(get_sqrt_ratio_at_tick(tick) == expected, f"get_sqrt_ratio_at_tick({tick}) != {expected}")
+    check(get_tick_at_sqrt_ratio(MIN_SQRT_RATIO) == MIN_TICK, "get_tick_at_sqrt_ratio(MIN_SQRT_RATIO) != MIN_TICK")
+    check(get_tick_at_sqrt_ratio(MAX_SQRT_RATIO - 1) == MAX_TICK - 1, "get_tick_at_sqrt_ratio(MAX_SQRT_RATIO - 1) != MAX_TICK - 1")
+
+    rng = random.Random(seed)
+    ticks = [rng.randint(MIN_TICK, MAX_TICK - 1) for _ in range(samples)] + [-1, 1, 264500, -264500]
+    for tick in ticks:
+        sqrt_ratio = get_sqrt_ratio_at_tick(tick)
+        exact = Decimal("1.0001") ** (Decimal(tick) / 2) * Decimal(Q96)
+        # Q128-Trunkierung plus Aufrunden auf Q96: höchstens 1 Einheit plus ~1e-19 relativ bei sehr kleinen Ratios
+        check(abs(Decimal(sqrt_ratio) - exact) <= 1 + exact * Decimal("1e-18"), f"get_sqrt_ratio_at_tick({tick}) ungenau")
+        check(get_tick_at_sqrt_ratio(sqrt_ratio) == tick, f"get_tick_at_sqrt_ratio(ratio({tick})) != {tick}")
+        check(get_tick_at_sqrt_ratio(get_sqrt_ratio_at_tick(tick + 1) - 1) == tick, f"get_tick_at_sqrt_ratio knapp unter Tick {tick + 1}")
+
+    # Der exakte Pfad rundet sqrtPriceX96 auf ganze Q96-Einheiten; bei sehr kleinen Ratios ist das die größere Abweichung.
+    batch_ticks = np.array(ticks)
+    sqrt_ratios = [get_sqrt_ratio_at_tick(tick) for tick in ticks]
+    quantization = np.array([2.0 / sqrt_ratio for sqrt_ratio in sqrt_ratios])
+    for decimals, is_token0_base in (((8, 18), True), ((8, 18), False), ((18, 6), True), ((6, 6), False)):
+        exact = np.array([tick_to_price(tick, *decimals, is_token0_base) for tick in ticks])
+        batch_error = np.abs(ticks_to_prices(batch_ticks, *decimals, is_token0_base) / exact - 1)
+        check(np.all(batch_error <= 1e-13 + quantization), f"ticks_to_prices weicht ab ({decimals}, {is_token0_base}, max. {batch_error.max():.2e})")
+        check(np.allclose(sqrt_prices_to_prices(sqrt_ratios, *decimals, is_token0_base), exact, rtol=1e-14, atol=0), f"sqrt_prices_to_prices weicht ab ({decimals}, {is_token0_base})")
+        mid_tick_price = tick_to_price(264500, *decimals, True) * 1.00005 # zwischen Tick 264500 und 264501
+        check(price_to_tick(mid_tick_price, *decimals, True) == 264500, f"price_to_tick zwischen 264500 und 264501 ({decimals})")
+
+    for message in failures[:20]:
+        print(f"  FEHLER: {message}")
+    print(f"TickMath-Selbsttest: {'OK' if not failures else f'{len(failures)} Fehler'} ({len(ticks)} Zufalls-Ticks).")
+    return not failures
+
+def main():
+    usage = "Usage: python tickmath.py selfcheck | tick <sqrtPriceX96> | sqrt <tick>"
+    if len(sys.argv) < 2:
+        print(usage); return
+    command = sys.argv[1]
+    if command == "selfcheck":
+        sys.exit(0 if selfcheck() else 1)
+    elif command == "tick" and len(sys.argv) > 2:
+        print(get_tick_at_sqrt_ratio(int(sys.argv[2])))
+    elif command == "sqrt" and len(sys.argv) > 2:
+        print(get_sqrt_ratio_at_tick(int(sys.argv[2])))
+    else:
+        print(usage)
+
+if __name__ == "__main__":
+    main()
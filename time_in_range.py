@@ -0,0 +1,128 @@
+import os
+import json
+from datetime import datetime, timezone
+import numpy as np
+import tick_store
+
+# Zeitgewichtete Time-in-Range: jeder Tick gilt bis zum nächsten Tick (der letzte bis "now").
+# Lücken im Cron werden so nach Dauer gewichtet statt nach Anzahl Samples.
+TIME_IN_RANGE_WINDOWS = {"1h": 3600, "24h": 24 * 3600, "7d": 7 * 24 * 3600, "15d": 15 * 24 * 3600}
+MAX_TICK_HOLD_SECONDS = 6 * 3600 # Länger hält ein Tick nicht; Zeit ohne Daten zählt weder als in- noch out-of-range
+
+class TickHistory:
+    def __init__(self, timestamps, prices):
+        order = np.argsort(timestamps, kind='stable')
+        self.ts = np.asarray(timestamps, dtype=np.float64)[order]
+        self.prices = np.asarray(prices, dtype=np.float64)[order]
+
+    def __len__(self):
+        return len(self.ts)
+
+def load_tick_histories(store_dir=tick_store.DEFAULT_STORE_DIR, json_path=None, start=None):
+    # Liest die Tick-Historie einmal ein: {(base_token, quote_token): TickHistory}, zusätzlich {pool_address: TickHistory}
+    # für Serien mit bekannter Pool-Adresse (siehe history_for_range).
+    # Quelle ist der Tick-Store; price_ticks.json nur als Fallback, solange noch kein Store existiert.
+    histories = {}
+    if tick_store.store_exists(store_dir):
+        ticks = tick_store.read_ticks(store_dir, start=start)
+        for pair in tick_store.load_pairs(store_dir):
+            mask = ticks["pair"] == pair["id"]
+            if mask.any():
+                history = TickHistory(ticks["ts"][mask], ticks["price"][mask])
+                if pair.get("pool"):
+                    histories[pair["pool"]] = history
+                # Bei mehreren Pools mit denselben Symbolen gewinnt der erste, die Pool-Adresse ist dann maßgeblich
+                histories.setdefault((pair["base_token"], pair["quote_token"]), history)
+        return histories
+
+    if not json_path or not os.path.exists(json_path):
+        return histories
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+    except json.JSONDecodeError:
+        return histories
+    if not isinstance(entries, list):
+        return histories
+    columns = {}
+    for entry in entries:
+        try:
+            if not all([entry.get("timestamp"), entry.get("price"), entry.get("base_token"), entry.get("quote_token")]):
+                continue
+            ts = tick_store.parse_timestamp(entry["timestamp"]).timestamp()
+            if start is not None and ts < start:
+                continue
+            keys = [(entry["base_token"], entry["quote_token"])] + ([entry["pool"].lower()] if entry.get("pool") else [])
+            for key in keys:
+                ts_list, price_list = columns.setdefault(key, ([], []))
+                ts_list.append(ts)
+                price_list.append(float(entry["price"]))
+        except Exception:
+            continue
+    for key, (ts_list, price_list) in columns.items():
+        histories[key] = TickHistory(ts_list, price_list)
+    return histories
+
+def history_key(position_range):
+    # Pool-Adresse, falls bekannt; ältere position_range-Einträge ohne pool_address fallen auf das Symbolpaar zurück.
+    if position_range.get("pool_address"):
+        return position_range["pool_address"].lower()
+    return (position_range.get("base_token_for_price"), position_range.get("quote_token_for_price"))
+
+def history_for_range(histories, position_range):
+    history = histories.get(history_key(position_range))
+    if history is None and position_range.get("pool_address"):
+        history = histories.get((position_range.get("base_token_for_price"), position_range.get("quote_token_for_price")))
+    return history
+
+def time_in_range_matrix(history, price_lowers, price_uppers, window_seconds, now=None, max_hold_seconds=MAX_TICK_HOLD_SECONDS):
+    # Liefert ein (len(ranges) x len(windows))-Array mit In-Range-Prozent, NaN wo im Fenster keine Daten liegen.
+    # Pro Fenster: Fenstergrenzen per Binärsuche, Preise einmal sortiert, dann für alle Ranges gleichzeitig
+    # die Zeit innerhalb [lower, upper] über kumulierte Gewichte + searchsorted.
+    now = datetime.now(timezone.utc).timestamp() if now is None else now
+    lowers = np.minimum(price_lowers, price_uppers).astype(np.float64)
+    uppers = np.maximum(price_lowers, price_uppers).astype(np.float64)
+    result = np.full((len(lowers), len(window_seconds)), np.nan)
+    if history is None or len(history) == 0 or len(lowers) == 0:
+        return result
+
+    ts, prices = history.ts, history.prices
+    end_idx = int(np.searchsorted(ts, now, side='right'))
+    for k, window in enumerate(window_seconds):
+        start = now - window
+        start_idx = max(int(np.searchsorted(ts, start, side='right')) - 1, 0) # Tick, der zu Fensterbeginn galt
+        if end_idx <= start_idx:
+            continue
+        seg_prices = prices[start_idx:end_idx]
+        seg_starts = np.maximum(ts[start_idx:end_idx], start)
+        seg_ends = np.append(ts[start_idx + 1:end_idx], now)
+        seg_ends = np.minimum(seg_ends, ts[start_idx:end_idx] + max_hold_seconds)
+        weights = np.clip(seg_ends - seg_starts, 0, None)
+        total = weights.sum()
+        if total <= 0:
+            continue
+        order = np.argsort(seg_prices, kind='stable')
+        sorted_prices = seg_prices[order]
+        cum_weights = np.concatenate(([0.0], np.cumsum(weights[order])))
+        in_range = cum_weights[np.searchsorted(sorted_prices, uppers, side='right')] - cum_weights[np.searchsorted(sorted_prices, lowers, side='left')]
+        result[:, k] = in_range / total * 100
+    return result
+
+def compute_time_in_range_for_positions(histories, position_ranges, windows=TIME_IN_RANGE_WINDOWS, now=None):
+    # position_ranges: {position_key: position_range-Dict aus fees_data.json}
+    # Ergebnis: {position_key: {"1h": pct, "24h": pct, ...}} (None für Fenster ohne Daten)
+    window_names = list(windows.keys())
+    window_seconds = [windows[name] for name in window_names]
+    by_pool = {}
+    for position_key, position_range in position_ranges.items():
+        if not position_range or position_range.get("price_lower") is None or position_range.get("price_upper") is None:
+            continue
+        group = by_pool.setdefault(history_key(position_range), (history_for_range(histories, position_range), []))
+        group[1].append((position_key, position_range["price_lower"], position_range["price_upper"]))
+
+    results = {}
+    for history, entries in by_pool.values():
+        matrix = time_in_range_matrix(history, [entry[1] for entry in entries], [entry[2] for entry in entries], window_seconds, now)
+        for (position_key, _, _), row in zip(entries, matrix):
+            results[position_key] = {name: (None if np.isnan(value) else float(value)) for name, value in zip(window_names, row)}
+    return results
@@ -1,11 +1,26 @@
 import os
+import sys
 import json
+import argparse
+import asyncio
 from datetime import datetime, timedelta, timezone
-from web3 import Web3
 from dotenv import load_dotenv
-import requests
 import math
-import time # Import für time.sleep in get_single_token_price_coingecko
+import instrumentation
+import pools
+import fee_analytics
+import fee_engine
+import discovery
+import fees_db
+import valuation
+from abi_codec import decode, to_checksum_address
+from coingecko import PriceClient
+from dashboard_payloads import DASHBOARD_DIR, generate_dashboard
+from multicall import aggregate3, encode_call, rpc_batch, rpc_request
+from pools import NFPM_ADDRESS, NFPM_POSITIONS_OUTPUT_TYPES, PRICE_PRESENTATION_IS_TOKEN0_BASE, SLOT0_OUTPUT_TYPES
+from tick_store import DEFAULT_STORE_DIR as PRICE_TICKS_STORE_DIR
+from tickmath import sqrt_price_x96_to_price, tick_to_price
+from time_in_range import MAX_TICK_HOLD_SECONDS, TIME_IN_RANGE_WINDOWS, compute_time_in_range_for_positions, history_for_range, load_tick_histories
 
 load_dotenv()
 
@@ -14,249 +29,384 @@ WALLET_ADDRESS = os.getenv('WALLET_ADDRESS')
 CONFIG_FILE_POSITIONS = "positions_to_track.txt"
 JSON_DATA_FILE = "fees_data.json"
 PRICE_TICKS_FILE = "price_ticks.json"
-
-WETH_WBTC_005_POOL_ADDRESS_ARBITRUM = "0x2f5e87C9312fa29aed5c179E456625D79015299c"
-
-NFPM_ADDRESS = "0xC36442b4a4522E871399CD717aBDD847Ab11FE88"
-NFPM_ABI = json.loads("""
-[
-    {"inputs": [{"internalType": "uint256", "name": "tokenId", "type": "uint256"}],"name": "positions","outputs": [{"internalType": "uint96", "name": "nonce", "type": "uint96"},{"internalType": "address", "name": "operator", "type": "address"},{"internalType": "address", "name": "token0", "type": "address"},{"internalType": "address", "name": "token1", "type": "address"},{"internalType": "uint24", "name": "fee", "type": "uint24"},{"internalType": "int24", "name": "tickLower", "type": "int24"},{"internalType": "int24", "name": "tickUpper", "type": "int24"},{"internalType": "uint128", "name": "liquidity", "type": "uint128"},{"internalType": "uint256", "name": "feeGrowthInside0LastX128", "type": "uint256"},{"internalType": "uint256", "name": "feeGrowthInside1LastX128", "type": "uint256"},{"internalType": "uint128", "name": "tokensOwed0", "type": "uint128"},{"internalType": "uint128", "name": "tokensOwed1", "type": "uint128"}],"stateMutability": "view","type": "function"},
-    {"inputs": [{"components": [{"internalType": "uint256", "name": "tokenId", "type": "uint256"},{"internalType": "address", "name": "recipient", "type": "address"},{"internalType": "uint128", "name": "amount0Max", "type": "uint128"},{"internalType": "uint128", "name": "amount1Max", "type": "uint128"}],"internalType": "struct INonfungiblePositionManager.CollectParams","name": "params","type": "tuple"}],"name": "collect","outputs": [{"internalType": "uint256", "name": "amount0", "type": "uint256"},{"internalType": "uint256", "name": "amount1", "type": "uint256"}],"stateMutability": "payable","type": "function"}
-]
-""")
-ERC20_ABI_MINIMAL = json.loads("""
-[
-    {"constant":true,"inputs":[],"name":"decimals","outputs":[{"name":"","type":"uint8"}],"payable":false,"stateMutability":"view","type":"function"},
-    {"constant":true,"inputs":[],"name":"symbol","outputs":[{"name":"","type":"string"}],"payable":false,"stateMutability":"view","type":"function"}
-]
-""")
-UNISWAP_V3_POOL_ABI_MINIMAL = json.loads("""
-[
-    {"inputs": [],"name": "slot0","outputs": [{"internalType": "uint160", "name": "sqrtPriceX96", "type": "uint160"},{"internalType": "int24", "name": "tick", "type": "int24"},{"internalType": "uint16", "name": "observationIndex", "type": "uint16"},{"internalType": "uint16", "name": "observationCardinality", "type": "uint16"},{"internalType": "uint16", "name": "observationCardinalityNext", "type": "uint16"},{"internalType": "uint8", "name": "feeProtocol", "type": "uint8"},{"internalType": "bool", "name": "unlocked", "type": "bool"}],"stateMutability": "view","type": "function"}
-]
-""")
-
-def tick_to_price(tick, token0_decimals, token1_decimals, is_token0_base=True):
-    price_ratio = (1.0001 ** tick)
-    if is_token0_base:
-        return price_ratio / (10 ** (token1_decimals - token0_decimals))
+# Nicht abgeholte Gebühren: "engine" rechnet aus dem Fee-Growth-State (fee_engine.py, ein aggregate3, jede Wallet),
+# "collect" simuliert NFPM.collect() mit from=WALLET_ADDRESS (nur eigene Positionen, eigener JSON-RPC-Batch)
+FEE_SOURCE = os.getenv('FEE_SOURCE', "engine")
+
+
+def fee_amounts_entry(token0_actual, token1_actual, price_token0_usd, price_token1_usd):
+    token0_usd = token0_actual * price_token0_usd if price_token0_usd is not None else None
+    token1_usd = token1_actual * price_token1_usd if price_token1_usd is not None else None
+    total_usd = None
+    if token0_usd is not None and token1_usd is not None:
+        total_usd = token0_usd + token1_usd
+    elif token0_usd is not None:
+        total_usd = token0_usd
+    elif token1_usd is not None:
+        total_usd = token1_usd
+    return {"token0_actual": token0_actual, "token1_actual": token1_actual, "token0_usd": token0_usd, "token1_usd": token1_usd, "total_usd": total_usd}
+
+def compute_daily_earned(total_unclaimed_fees, previous_day_data, price_token0_usd, price_token1_usd):
+    daily_earned_token0_actual = total_unclaimed_fees["token0_actual"]
+    daily_earned_token1_actual = total_unclaimed_fees["token1_actual"]
+    if previous_day_data and "total_unclaimed_fees" in previous_day_data:
+        y_total_fees = previous_day_data["total_unclaimed_fees"]
+        daily_earned_token0_actual -= y_total_fees.get("token0_actual", 0.0)
+        daily_earned_token1_actual -= y_total_fees.get("token1_actual", 0.0)
+    daily_earned_token0_actual = max(0, daily_earned_token0_actual)
+    daily_earned_token1_actual = max(0, daily_earned_token1_actual)
+    return fee_amounts_entry(daily_earned_token0_actual, daily_earned_token1_actual, price_token0_usd, price_token1_usd)
+
+def compute_position_range(tick_lower, tick_upper, sqrt_price_x96, token0_decimals, token1_decimals, token0_symbol, token1_symbol):
+    if PRICE_PRESENTATION_IS_TOKEN0_BASE:
+        price_base_token_symbol_for_json, price_quote_token_symbol_for_json = token0_symbol, token1_symbol
     else:
-        return (1 / price_ratio) / (10 ** (token0_decimals - token1_decimals))
+        price_base_token_symbol_for_json, price_quote_token_symbol_for_json = token1_symbol, token0_symbol
 
-def sqrt_price_x96_to_price(sqrt_price_x96, token0_decimals, token1_decimals, is_token0_base=True):
-    price_ratio = (sqrt_price_x96 / (2**96)) ** 2
-    if is_token0_base:
-        return price_ratio / (10 ** (token1_decimals - token0_decimals))
-    else:
-        return (1 / price_ratio) / (10 ** (token0_decimals - token1_decimals))
+    price_lower_calculated, price_upper_calculated, current_market_price_calculated = None, None, None
+    if sqrt_price_x96:
+        price_lower_t1_per_t0 = tick_to_price(tick_lower, token0_decimals, token1_decimals, True)
+        price_upper_t1_per_t0 = tick_to_price(tick_upper, token0_decimals, token1_decimals, True) 
+        current_market_price_t1_per_t0 = sqrt_price_x96_to_price(sqrt_price_x96, token0_decimals, token1_decimals, True)
+
+        if PRICE_PRESENTATION_IS_TOKEN0_BASE:
+            price_lower_calculated = price_lower_t1_per_t0
+            price_upper_calculated = price_upper_t1_per_t0
+            current_market_price_calculated = current_market_price_t1_per_t0
+        else: 
+            price_lower_calculated = 1 / price_upper_t1_per_t0 if price_upper_t1_per_t0 != 0 else None
+            price_upper_calculated = 1 / price_lower_t1_per_t0 if price_lower_t1_per_t0 != 0 else None
+            if price_lower_calculated is not None and price_upper_calculated is not None and price_lower_calculated > price_upper_calculated:
+                price_lower_calculated, price_upper_calculated = price_upper_calculated, price_lower_calculated
+            current_market_price_calculated = 1 / current_market_price_t1_per_t0 if current_market_price_t1_per_t0 != 0 else None
+    return {
+        "price_lower": price_lower_calculated, "price_upper": price_upper_calculated, "current_market_price": current_market_price_calculated,
+        "base_token_for_price": price_base_token_symbol_for_json, "quote_token_for_price": price_quote_token_symbol_for_json
+    }
 
 def load_json_data(filename=JSON_DATA_FILE):
+    if fees_db.FEES_DB_FILE:
+        # SQLite-Backend; beim ersten Lauf wird die bestehende JSON-Datei übernommen
+        with instrumentation.phase("fees_db_load") as phase:
+            if not fees_db.exists(fees_db.FEES_DB_FILE) and os.path.exists(filename):
+                print(f"Migriere {filename} nach {fees_db.FEES_DB_FILE}...")
+                fees_db.migrate(filename, fees_db.FEES_DB_FILE)
+            data = fees_db.load(fees_db.FEES_DB_FILE)
+            phase["bytes"] = os.path.getsize(fees_db.FEES_DB_FILE)
+            return data
     if os.path.exists(filename):
-        try:
-            with open(filename, 'r', encoding='utf-8') as f: # encoding hinzugefügt
-                return json.load(f)
-        except json.JSONDecodeError:
-            print(f"Warning: Could not decode JSON from {filename}. Starting with empty data.")
-            return {}
+        with instrumentation.phase("json_load") as phase:
+            phase["bytes"] = os.path.getsize(filename)
+            try:
+                with open(filename, 'r', encoding='utf-8') as f: # encoding hinzugefügt
+                    return json.load(f)
+            except json.JSONDecodeError:
+                print(f"Warning: Could not decode JSON from {filename}. Starting with empty data.")
+                return {}
     return {}
 
 def save_json_data(data, filename=JSON_DATA_FILE): # Deine ursprüngliche Speicherfunktion
-    try:
-        with open(filename, 'w', encoding='utf-8') as f: # encoding hinzugefügt
-            json.dump(data, f, indent=2)
-        print(f"Data saved to {filename}")
-    except Exception as e:
-        print(f"Error saving data to {filename}: {e}")
-
-def get_single_token_price_coingecko(contract_address, platform_id="arbitrum-one", retries=3, delay=5): # retries und delay hinzugefügt
-    checksum_address = Web3.to_checksum_address(contract_address)
-    url = f"https://api.coingecko.com/api/v3/coins/{platform_id}/contract/{checksum_address}"
-    for attempt in range(retries):
+    if fees_db.FEES_DB_FILE:
         try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            price_usd = data.get("market_data", {}).get("current_price", {}).get("usd")
-            if price_usd is not None:
-                return price_usd
-            else:
-                print(f"    Warning: USD price not found in CoinGecko response for {checksum_address}. Attempt {attempt + 1}/{retries}.")
-        except requests.exceptions.HTTPError as http_err:
-            print(f"    CoinGecko HTTP error for {contract_address}: {http_err}. Attempt {attempt + 1}/{retries}.")
-        except requests.exceptions.ConnectionError as conn_err:
-            print(f"    CoinGecko Connection error for {contract_address}: {conn_err}. Attempt {attempt + 1}/{retries}.")
-        except requests.exceptions.Timeout as timeout_err:
-            print(f"    CoinGecko Timeout error for {contract_address}: {timeout_err}. Attempt {attempt + 1}/{retries}.")
-        except requests.exceptions.RequestException as req_err:
-            print(f"    CoinGecko API request error for {contract_address}: {req_err}. Attempt {attempt + 1}/{retries}.")
-        except json.JSONDecodeError as json_err:
-            print(f"    Error decoding CoinGecko JSON response for {contract_address}: {json_err}. Attempt {attempt + 1}/{retries}.")
-        except Exception as e_gen:
-            print(f"    Unexpected error fetching price for {contract_address}: {e_gen}. Attempt {attempt + 1}/{retries}.")
-        
-        if attempt < retries - 1:
-            print(f"    Retrying CoinGecko in {delay} seconds...")
-            time.sleep(delay)
-        else:
-            print(f"    All CoinGecko retries failed for {contract_address}.")
-    return None
-
-def get_active_position_config(filename=CONFIG_FILE_POSITIONS):
+            with instrumentation.phase("fees_db_save") as phase:
+                phase["rows"] = fees_db.save(data, fees_db.FEES_DB_FILE)
+            print(f"Data saved to {fees_db.FEES_DB_FILE} ({phase['rows']} Zeile(n) geschrieben)")
+            if fees_db.FEES_DB_EXPORT_JSON:
+                # Kompakt: die eingerückte Variante kostet so viel wie das bisherige json.dump (python fees_db.py export)
+                with instrumentation.phase("json_save") as phase:
+                    fees_db.export_json(filename, fees_db.FEES_DB_FILE, indent=None)
+                    phase["bytes"] = os.path.getsize(filename)
+        except Exception as e:
+            print(f"Error saving data to {fees_db.FEES_DB_FILE}: {e}")
+        return
+    with instrumentation.phase("json_save") as phase:
+        try:
+            tmp_path = filename + ".tmp" # Atomar ersetzen: ein gleichzeitig lesender price_updater sieht nie eine halbe Datei
+            with open(tmp_path, 'w', encoding='utf-8') as f: # encoding hinzugefügt
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, filename)
+            phase["bytes"] = os.path.getsize(filename)
+            print(f"Data saved to {filename}")
+        except Exception as e:
+            print(f"Error saving data to {filename}: {e}")
+
+def get_position_configs(filename=CONFIG_FILE_POSITIONS):
+    configs = []
     try:
-        if os.path.exists(filename):
-            with open(filename, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                if not lines:
-                    return None
-                for line_number, line in enumerate(lines, 1):
-                    line = line.strip()
-                    if not line or line.startswith('#'):
-                        continue
-                    parts = line.split(',')
-                    if len(parts) == 2:
-                        try:
-                            position_id = int(parts[0].strip())
-                            investment_usd = float(parts[1].strip())
-                            print(f"Aktive Position aus '{filename}': ID {position_id}, Investment {investment_usd} USD")
-                            return {'id': position_id, 'initial_investment_usd': investment_usd}
-                        except ValueError:
-                            print(f"Error: Ungültiges Zahlenformat in '{filename}' Zeile {line_number}: '{line}'.")
-                            return None
-                    else:
-                        print(f"Error: Ungültiges Format in '{filename}' Zeile {line_number}: '{line}'.")
-                        return None
-                return None
-        else:
+        if not os.path.exists(filename):
             print(f"Info: Konfigurationsdatei '{filename}' nicht gefunden.")
-            return None
+            return configs
+        with open(filename, 'r', encoding='utf-8') as f:
+            seen_ids = set()
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                parts = line.split(',')
+                if len(parts) != 2:
+                    print(f"Error: Ungültiges Format in '{filename}' Zeile {line_number}: '{line}'. Zeile wird übersprungen.")
+                    continue
+                try:
+                    position_id = int(parts[0].strip())
+                    investment_usd = float(parts[1].strip())
+                except ValueError:
+                    print(f"Error: Ungültiges Zahlenformat in '{filename}' Zeile {line_number}: '{line}'. Zeile wird übersprungen.")
+                    continue
+                if position_id in seen_ids:
+                    print(f"Warnung: Position {position_id} ist in '{filename}' mehrfach eingetragen (Zeile {line_number}). Zeile wird übersprungen.")
+                    continue
+                seen_ids.add(position_id)
+                configs.append({'id': position_id, 'initial_investment_usd': investment_usd})
     except Exception as e:
         print(f"Fehler beim Lesen der Konfigurationsdatei '{filename}': {e}")
-        return None
+    return configs
+
+def get_tracked_position_configs(rpc_url, wallet_address, filename=CONFIG_FILE_POSITIONS):
+    # positions_to_track.txt bleibt Override (Initialinvestment, auch Positionen anderer Wallets),
+    # dazu alle Positionen der Wallet aus discovery.py (ohne Investment, ein vorhandener Wert in fees_data.json bleibt)
+    configs = get_position_configs(filename)
+    if not discovery.POSITION_DISCOVERY or not wallet_address:
+        return configs
+    try:
+        with instrumentation.phase("discovery"):
+            discovered = discovery.discover(rpc_url, wallet_address)
+    except Exception as e:
+        print(f"Warnung: Positionssuche fehlgeschlagen ({e}). Verwende den letzten bekannten Stand.")
+        discovered = discovery.known_position_ids(include_closed=True)
+    configured_ids = {pos_config['id'] for pos_config in configs}
+    return configs + [{'id': position_id, 'initial_investment_usd': None} for position_id in discovered if position_id not in configured_ids]
+
+def _with_liquidity(positions_by_id):
+    # Positionen mit Liquidität 0 brauchen keinen Fee-State; tracker.py setzt sie inaktiv
+    return {pid: details for pid, details in positions_by_id.items() if details and details[7] > 0}
+
+def _block_tag(rpc_url, block=None):
+    # Alle Reads eines Laufs an einem festen Block: positions(), slot0 und Fee-Growth-State passen sonst nicht zusammen
+    # (Tick-Kreuzung zwischen zwei Reads), und Block-gepinnte Reads kommen nie aus dem kurzlebigen "latest"-Cache
+    if block is None:
+        block = int(rpc_request(rpc_url, "eth_blockNumber", [], cache=False), 16)
+    return hex(block)
+
+def _positions_calls(position_ids):
+    return [(NFPM_ADDRESS, encode_call("positions(uint256)", ["uint256"], [position_id]), NFPM_POSITIONS_OUTPUT_TYPES)
+            for position_id in position_ids]
+
+def _token_calls(token_addresses):
+    calls = []
+    for token_address in token_addresses:
+        calls.append((token_address, encode_call("decimals()"), ["uint8"]))
+        calls.append((token_address, encode_call("symbol()"), ["string"]))
+    return calls
+
+def _parse_token_results(token_addresses, results):
+    token_meta = {}
+    for i, token_address in enumerate(token_addresses):
+        decimals_result, symbol_result = results[2 * i], results[2 * i + 1]
+        token_meta[token_address] = {
+            "decimals": decimals_result[0] if decimals_result else None,
+            "symbol": symbol_result[0] if symbol_result else None,
+        }
+    return token_meta
+
+def _pool_calls(pool_addresses):
+    return [(pool_address, encode_call("slot0()"), SLOT0_OUTPUT_TYPES) for pool_address in pool_addresses]
+
+def _collect_calls(position_ids, wallet_address, block="latest"):
+    # collect() kann nicht über Multicall laufen: der NFPM prüft msg.sender, das wäre dort der Multicall-Contract.
+    # Deshalb ein JSON-RPC-Batch aus einzelnen eth_calls mit from=Wallet (eine HTTP-Anfrage für alle Positionen).
+    calls = []
+    for position_id in position_ids:
+        data = encode_call("collect((uint256,address,uint128,uint128))", ["(uint256,address,uint128,uint128)"],
+                           [(position_id, wallet_address, 2**128 - 1, 2**128 - 1)])
+        calls.append(("eth_call", [{"from": wallet_address, "to": NFPM_ADDRESS, "data": "0x" + data.hex()}, block]))
+    return calls
+
+def _parse_collect_results(position_ids, results):
+    collected = {}
+    for position_id, result in zip(position_ids, results):
+        if isinstance(result, Exception):
+            print(f"  Warnung: collect-Simulation für Position {position_id} fehlgeschlagen: {result}")
+            collected[position_id] = None
+            continue
+        try:
+            collected[position_id] = decode(["uint256", "uint256"], bytes.fromhex(result[2:]))
+        except Exception as e:
+            print(f"  Warnung: collect-Ergebnis für Position {position_id} nicht dekodierbar: {e}")
+            collected[position_id] = None
+    return collected
+
+def _token_addresses_of(positions_by_id):
+    return sorted({to_checksum_address(details[i]) for details in positions_by_id.values() if details for i in (2, 3)})
+
+def fetch_positions_batched(rpc_url, position_ids, block="latest"):
+    return dict(zip(position_ids, aggregate3(rpc_url, _positions_calls(position_ids), block)))
+
+def fetch_tokens_and_pools_batched(rpc_url, token_addresses, pool_addresses, extra_calls=(), block="latest"):
+    # extra_calls hängen im selben aggregate3 hinten an, ihre Ergebnisse kommen als dritter Wert zurück
+    results = aggregate3(rpc_url, _token_calls(token_addresses) + _pool_calls(pool_addresses) + list(extra_calls), block)
+    token_meta = _parse_token_results(token_addresses, results)
+    pool_results = results[2 * len(token_addresses):]
+    return token_meta, dict(zip(pool_addresses, pool_results)), pool_results[len(pool_addresses):]
+
+def simulate_collect_batched(rpc_url, position_ids, wallet_address, block="latest"):
+    return _parse_collect_results(position_ids, rpc_batch(rpc_url, _collect_calls(position_ids, wallet_address, block)))
+
+def _pool_addresses_by_id(pool_by_position):
+    return {pid: entry["address"] if entry else None for pid, entry in pool_by_position.items()}
+
+def fetch_run_inputs(rpc_url, position_ids, wallet_address, fee_source=None, block=None):
+    fee_source = fee_source or FEE_SOURCE
+    block_tag = _block_tag(rpc_url, block)
+    # Runde 1: positions() aller NFTs in einem aggregate3
+    with instrumentation.phase("rpc_positions"):
+        positions_by_id = fetch_positions_batched(rpc_url, position_ids, block_tag)
+    # Pool je Position aus (token0, token1, fee); nur neue Pools kosten einen zusätzlichen Read (pool_cache.json)
+    with instrumentation.phase("resolve_pools"):
+        pool_address_by_id = _pool_addresses_by_id(pools.resolve_position_pools(rpc_url, position_ids, positions_by_id))
+    # Runde 2: decimals/symbol aller Token + slot0 und Fee-Growth-State aller Pools/Range-Ticks in einem aggregate3
+    # (bzw. collect-Simulationen als eigener JSON-RPC-Batch)
+    token_addresses = _token_addresses_of(positions_by_id)
+    pool_addresses = sorted({address for address in pool_address_by_id.values() if address})
+    fee_calls, fee_layout = fee_engine.state_calls(_with_liquidity(positions_by_id), pool_address_by_id) if fee_source == "engine" else ([], [])
+    with instrumentation.phase("rpc_tokens_pools"):
+        token_meta, pool_slot0, fee_results = fetch_tokens_and_pools_batched(rpc_url, token_addresses, pool_addresses, fee_calls, block_tag)
+    if fee_source == "engine":
+        collected_by_id = fee_engine.compute_uncollected(_with_liquidity(positions_by_id), pool_address_by_id, pool_slot0, fee_engine.parse_state(fee_layout, fee_results))
+    else:
+        with instrumentation.phase("rpc_collect"):
+            collected_by_id = simulate_collect_batched(rpc_url, [pid for pid in position_ids if positions_by_id.get(pid)], wallet_address, block_tag)
+    # Ein simple/token_price-Request für alle Token (mit Cache und Fallback auf den letzten bekannten Preis)
+    with instrumentation.phase("coingecko_prices"):
+        price_quotes = PriceClient().get_prices(token_addresses)
+    return positions_by_id, token_meta, pool_address_by_id, pool_slot0, collected_by_id, price_quotes
+
+async def fetch_run_inputs_async(rpc_url, position_ids, wallet_address, fee_source=None):
+    # Gleiche Reads wie fetch_run_inputs, aber nur die echten Abhängigkeiten werden abgewartet: nach eth_blockNumber
+    # (zugleich Verbindungsprüfung, alle Reads an diesem Block) laufen collect und slot0 der bereits gecachten Pools parallel zu positions();
+    # Token-Metadaten, Fee-Growth-State, CoinGecko-Preise und slot0 neuer Pools warten nur auf positions() und laufen dann parallel.
+    from async_rpc import AsyncRpcClient
+    fee_source = fee_source or FEE_SOURCE
+    cache = pools.load_pool_cache()
+    cached_pool_addresses = sorted({cache["pools"][key]["address"] for key in (cache["positions"].get(str(pid)) for pid in position_ids) if key in cache["pools"]})
+    async with AsyncRpcClient(rpc_url) as client:
+        block_tag = hex(int(await instrumentation.timed("rpc_connect", client.request("eth_blockNumber", [], cache=False)), 16))
+        collect_task = asyncio.ensure_future(instrumentation.timed("rpc_collect", client.batch(_collect_calls(position_ids, wallet_address, block_tag)))
+                                             if fee_source == "collect" else asyncio.sleep(0, []))
+        slot0_task = asyncio.ensure_future(instrumentation.timed("rpc_pools", client.aggregate3(_pool_calls(cached_pool_addresses), block_tag)))
+        positions_results = await instrumentation.timed("rpc_positions", client.aggregate3(_positions_calls(position_ids), block_tag))
+        positions_by_id = dict(zip(position_ids, positions_results))
+        pool_address_by_id = _pool_addresses_by_id(await instrumentation.timed("resolve_pools",
+            asyncio.to_thread(pools.resolve_position_pools, rpc_url, position_ids, positions_by_id)))
+        new_pool_addresses = sorted({address for address in pool_address_by_id.values() if address} - set(cached_pool_addresses))
+        token_addresses = _token_addresses_of(positions_by_id)
+        fee_calls, fee_layout = fee_engine.state_calls(_with_liquidity(positions_by_id), pool_address_by_id) if fee_source == "engine" else ([], [])
+        token_results, price_quotes, collect_results, slot0_results = await asyncio.gather(
+            instrumentation.timed("rpc_tokens_pools", client.aggregate3(_token_calls(token_addresses) + _pool_calls(new_pool_addresses) + fee_calls, block_tag)),
+            instrumentation.timed("coingecko_prices", asyncio.to_thread(PriceClient().get_prices, token_addresses)),
+            collect_task, slot0_task)
+    token_meta = _parse_token_results(token_addresses, token_results)
+    pool_slot0 = dict(zip(cached_pool_addresses, slot0_results))
+    pool_slot0.update(zip(new_pool_addresses, token_results[2 * len(token_addresses):]))
+    if fee_source == "engine":
+        fee_state = fee_engine.parse_state(fee_layout, token_results[2 * len(token_addresses) + len(new_pool_addresses):])
+        collected_by_id = fee_engine.compute_uncollected(_with_liquidity(positions_by_id), pool_address_by_id, pool_slot0, fee_state)
+    else:
+        collected_by_id = _parse_collect_results(position_ids, collect_results)
+    return positions_by_id, token_meta, pool_address_by_id, pool_slot0, collected_by_id, price_quotes
 
 def calculate_time_in_range_percentage(price_ticks_filepath, position_range_data, hours_to_check=24):
-    if not os.path.exists(price_ticks_filepath) or not position_range_data:
+    if not position_range_data:
         return None
     if position_range_data.get("price_lower") is None or position_range_data.get("price_upper") is None:
         return None
-
-    price_lower = min(position_range_data["price_lower"], position_range_data["price_upper"])
-    price_upper = max(position_range_data["price_lower"], position_range_data["price_upper"])
-    range_base_token = position_range_data.get("base_token_for_price")
-    range_quote_token = position_range_data.get("quote_token_for_price")
-
-    all_price_ticks = []
-    if os.path.exists(price_ticks_filepath):
-        with open(price_ticks_filepath, 'r', encoding='utf-8') as f:
-            try:
-                all_price_ticks = json.load(f)
-                if not isinstance(all_price_ticks, list):
-                    return None
-            except json.JSONDecodeError:
-                return None
-    else:
+    histories = load_tick_histories(PRICE_TICKS_STORE_DIR, price_ticks_filepath)
+    if not histories:
         return None
-
-    now_utc = datetime.now(timezone.utc)
-    cutoff_time_utc = now_utc - timedelta(hours=hours_to_check)
-    relevant_ticks = 0
-    ticks_in_range = 0
-
-    for tick_entry in all_price_ticks:
-        try:
-            tick_timestamp_str = tick_entry.get("timestamp")
-            tick_price = tick_entry.get("price")
-            tick_base = tick_entry.get("base_token")
-            tick_quote = tick_entry.get("quote_token")
-
-            if not all([tick_timestamp_str, tick_price, tick_base, tick_quote]):
-                continue
-            if tick_base != range_base_token or tick_quote != range_quote_token:
-                continue
-
-            if tick_timestamp_str.endswith("Z"):
-                tick_dt = datetime.fromisoformat(tick_timestamp_str[:-1] + "+00:00")
-            else:
-                tick_dt = datetime.fromisoformat(tick_timestamp_str).replace(tzinfo=timezone.utc)
-
-            if tick_dt >= cutoff_time_utc:
-                relevant_ticks += 1
-                if price_lower <= tick_price <= price_upper:
-                    ticks_in_range += 1
-        except Exception:
+    percentages = compute_time_in_range_for_positions(histories, {"position": position_range_data}, {"window": hours_to_check * 3600})
+    value = percentages.get("position", {}).get("window")
+    return 0.0 if value is None else value
+
+def update_time_in_range(all_data, position_keys, histories, now_utc):
+    # Ein Durchlauf für alle Positionen und alle Fenster (TIME_IN_RANGE_WINDOWS) über die einmal geladene Tick-Historie.
+    today_date_str = now_utc.strftime('%Y-%m-%d')
+    position_ranges = {}
+    for position_key in position_keys:
+        today_entry = all_data[position_key].get("history", {}).get(today_date_str, {})
+        position_ranges[position_key] = today_entry.get("position_range")
+    percentages = compute_time_in_range_for_positions(histories, position_ranges, TIME_IN_RANGE_WINDOWS, now=now_utc.timestamp())
+
+    print("\n--- Time in Range ---")
+    for position_key in position_keys:
+        position_percentages = percentages.get(position_key)
+        if position_percentages and any(value is not None for value in position_percentages.values()):
+            all_data[position_key]["time_in_range_percentages"] = position_percentages
+            print(f"  {position_key}: " + ", ".join(f"{name}: {value:.2f}%" if value is not None else f"{name}: n/a" for name, value in position_percentages.items()))
+        else:
+            all_data[position_key].pop("time_in_range_percentages", None)
+            print(f"  {position_key}: Konnte nicht berechnet werden.")
+        # Bisheriges Feld für index.html beibehalten
+        time_in_range_24h = (position_percentages or {}).get("24h")
+        if time_in_range_24h is not None:
+            all_data[position_key]["time_in_range_24h_percentage"] = time_in_range_24h
+        else:
+            all_data[position_key].pop("time_in_range_24h_percentage", None)
+
+def update_valuation(all_data, position_keys, positions_by_id, token_meta, token_prices, histories, now_utc):
+    # Wert der Position über die Tick-Historie vs. HODL und Gebühren (valuation.py), mit liquidity/Ticks aus positions()
+    today_date_str = now_utc.strftime('%Y-%m-%d')
+    print("\n--- Bewertung vs. HODL ---")
+    for position_key in position_keys:
+        position_data = all_data[position_key]
+        position_details = positions_by_id.get(int(position_key.replace("position_", "")))
+        if not position_details or position_details[7] == 0:
+            position_data.pop("valuation", None)
+            print(f"  {position_key}: Keine Liquidität, keine Bewertung.")
             continue
+        token0_address_checksum = to_checksum_address(position_details[2])
+        token1_address_checksum = to_checksum_address(position_details[3])
+        position_range = position_data.get("history", {}).get(today_date_str, {}).get("position_range")
+        result = valuation.compute_valuation(
+            position_data, position_details[7], position_details[5], position_details[6],
+            token_meta[token0_address_checksum]["decimals"], token_meta[token1_address_checksum]["decimals"],
+            token_prices.get(token0_address_checksum), token_prices.get(token1_address_checksum),
+            history_for_range(histories, position_range) if position_range else None, now=now_utc.timestamp())
+        if result is None:
+            position_data.pop("valuation", None)
+            print(f"  {position_key}: Konnte nicht berechnet werden.")
+            continue
+        position_data["valuation"] = result
+        print(f"  {position_key}: {valuation.summary_line(result)}")
 
-    if relevant_ticks == 0:
-        return 0.0
-    return (ticks_in_range / relevant_ticks) * 100
-
-def main():
-    print(f"--- Starting Uniswap V3 Fee Tracker ({datetime.now(timezone.utc).isoformat()}) ---")
-    all_data = load_json_data(JSON_DATA_FILE)
-
-    if not ARBITRUM_RPC_URL or not WALLET_ADDRESS:
-        print("CRITICAL Error: Missing environment variables. Exiting.")
-        return
-    w3 = Web3(Web3.HTTPProvider(ARBITRUM_RPC_URL))
-    if not w3.is_connected():
-        print(f"CRITICAL Error: Could not connect to Arbitrum RPC. Exiting.")
-        return
-    print(f"Successfully connected to Arbitrum RPC.")
-
-    nfpm_contract = w3.eth.contract(address=NFPM_ADDRESS, abi=NFPM_ABI)
-    active_pos_config = get_active_position_config()
-    active_position_id_from_config = active_pos_config['id'] if active_pos_config else None
-
-    print("Aktualisiere 'is_active' Flags in fees_data.json...")
-    for pos_key_in_json in list(all_data.keys()):
-        if pos_key_in_json.startswith("position_"):
-            try:
-                position_id_in_json = int(pos_key_in_json.replace("position_", ""))
-                is_currently_active_in_json = all_data[pos_key_in_json].get("is_active", False)
-                should_be_active = active_position_id_from_config is not None and position_id_in_json == active_position_id_from_config
-                
-                if is_currently_active_in_json != should_be_active:
-                    print(f"  Position {pos_key_in_json} wird auf 'is_active: {should_be_active}' gesetzt.")
-                all_data[pos_key_in_json]["is_active"] = should_be_active
-
-                if should_be_active and active_pos_config: # Sicherstellen, dass active_pos_config existiert
-                    current_investment_in_json = all_data[pos_key_in_json].get("initial_investment_usd")
-                    config_investment = active_pos_config['initial_investment_usd']
-                    if current_investment_in_json != config_investment:
-                        all_data[pos_key_in_json]["initial_investment_usd"] = config_investment
-                        print(f"  Initialinvestment für aktive Position {pos_key_in_json} auf {config_investment} USD gesetzt/aktualisiert.")
-            except ValueError:
-                print(f"  Konnte ID für Key '{pos_key_in_json}' nicht parsen.")
-
-    if not active_pos_config:
-        print("Keine aktive Position in Config. Es werden keine Gebühren aktualisiert.")
-        save_json_data(all_data, JSON_DATA_FILE) # Alte Speicherfunktion
-        print(f"\n--- Fee Tracker Finished (No active fees updated) ---")
-        return
-
-    position_nft_id = active_pos_config['id']
+def process_position(all_data, pos_config, position_details, token_meta, unclaimed_raw, pool_address_for_position, pool_slot0, token_prices, today_utc, stale_price_tokens=()):
+    position_nft_id = pos_config['id']
     position_key = f"position_{position_nft_id}"
-    today_utc = datetime.now(timezone.utc)
     today_date_str = today_utc.strftime('%Y-%m-%d')
     yesterday_date_str = (today_utc - timedelta(days=1)).strftime('%Y-%m-%d')
 
     if position_key not in all_data:
-        all_data[position_key] = {"history": {}, "is_active": True, "initial_investment_usd": active_pos_config['initial_investment_usd'], "token_pair_symbols": ""}
+        all_data[position_key] = {"history": {}, "is_active": True, "initial_investment_usd": pos_config['initial_investment_usd'], "token_pair_symbols": ""}
     elif "history" not in all_data[position_key]:
         all_data[position_key]["history"] = {}
     all_data[position_key]["is_active"] = True
 
     print(f"\n--- Processing ACTIVE Position ID: {position_nft_id} for {today_date_str} ---")
+    if position_details is None:
+        print(f"  positions({position_nft_id}) fehlgeschlagen, Position wird übersprungen.")
+        return False
+    if unclaimed_raw is None:
+        print(f"  Nicht abgeholte Gebühren für Position {position_nft_id} nicht ermittelt, Position wird übersprungen.")
+        return False
     try:
-        position_details = nfpm_contract.functions.positions(position_nft_id).call()
-        token0_address_checksum = Web3.to_checksum_address(position_details[2])
-        token1_address_checksum = Web3.to_checksum_address(position_details[3])
+        token0_address_checksum = to_checksum_address(position_details[2])
+        token1_address_checksum = to_checksum_address(position_details[3])
         tick_lower = position_details[5]
         tick_upper = position_details[6]
 
-        token0_contract = w3.eth.contract(address=token0_address_checksum, abi=ERC20_ABI_MINIMAL)
-        token1_contract = w3.eth.contract(address=token1_address_checksum, abi=ERC20_ABI_MINIMAL)
-        token0_decimals = token0_contract.functions.decimals().call()
-        token1_decimals = token1_contract.functions.decimals().call()
+        token0_decimals = token_meta[token0_address_checksum]["decimals"]
+        token1_decimals = token_meta[token1_address_checksum]["decimals"]
+        if token0_decimals is None or token1_decimals is None:
+            print(f"  decimals() für Token der Position {position_nft_id} fehlgeschlagen, Position wird übersprungen.")
+            return False
 
         current_token0_symbol, current_token1_symbol = "", ""
         if "token_pair_symbols" in all_data[position_key] and all_data[position_key]["token_pair_symbols"]:
@@ -264,124 +414,55 @@ def main():
             if len(symbols) == 2:
                 current_token0_symbol, current_token1_symbol = symbols[0], symbols[1]
         if not current_token0_symbol or not current_token1_symbol:
-            current_token0_symbol = token0_contract.functions.symbol().call()
-            current_token1_symbol = token1_contract.functions.symbol().call()
+            current_token0_symbol = token_meta[token0_address_checksum]["symbol"]
+            current_token1_symbol = token_meta[token1_address_checksum]["symbol"]
+            if not current_token0_symbol or not current_token1_symbol:
+                print(f"  symbol() für Token der Position {position_nft_id} fehlgeschlagen, Position wird übersprungen.")
+                return False
             all_data[position_key]["token_pair_symbols"] = f"{current_token0_symbol}/{current_token1_symbol}"
         print(f"  Tokens: {current_token0_symbol}({token0_decimals})/{current_token1_symbol}({token1_decimals})")
 
-        collect_params = (position_nft_id, Web3.to_checksum_address(WALLET_ADDRESS), 2**128 - 1, 2**128 - 1)
-        simulated_collect = nfpm_contract.functions.collect(collect_params).call({'from': Web3.to_checksum_address(WALLET_ADDRESS)})
-        
-        unclaimed_fees_token0_actual = simulated_collect[0] / (10**token0_decimals) 
-        unclaimed_fees_token1_actual = simulated_collect[1] / (10**token1_decimals)
+        unclaimed_fees_token0_actual = unclaimed_raw[0] / (10**token0_decimals) 
+        unclaimed_fees_token1_actual = unclaimed_raw[1] / (10**token1_decimals)
         
-        price_token0_usd = get_single_token_price_coingecko(token0_address_checksum)
-        price_token1_usd = get_single_token_price_coingecko(token1_address_checksum)
+        price_token0_usd = token_prices.get(token0_address_checksum)
+        price_token1_usd = token_prices.get(token1_address_checksum)
         
-        current_unclaimed_token0_usd_val = None
-        current_unclaimed_token1_usd_val = None
-        current_total_unclaimed_usd_val = None
-        
-        if price_token0_usd is not None: 
-            current_unclaimed_token0_usd_val = unclaimed_fees_token0_actual * price_token0_usd 
-        if price_token1_usd is not None: 
-            current_unclaimed_token1_usd_val = unclaimed_fees_token1_actual * price_token1_usd
-        
-        if current_unclaimed_token0_usd_val is not None and current_unclaimed_token1_usd_val is not None:
-            current_total_unclaimed_usd_val = current_unclaimed_token0_usd_val + current_unclaimed_token1_usd_val
-        elif current_unclaimed_token0_usd_val is not None: 
-            current_total_unclaimed_usd_val = current_unclaimed_token0_usd_val
-        elif current_unclaimed_token1_usd_val is not None: 
-            current_total_unclaimed_usd_val = current_unclaimed_token1_usd_val
-
-        PRICE_PRESENTATION_IS_TOKEN0_BASE = False 
-        
-        pool_address_for_position = WETH_WBTC_005_POOL_ADDRESS_ARBITRUM
-        price_base_token_symbol_for_json = ""
-        price_quote_token_symbol_for_json = ""
-        
-        if PRICE_PRESENTATION_IS_TOKEN0_BASE:
-             price_base_token_symbol_for_json = current_token0_symbol
-             price_quote_token_symbol_for_json = current_token1_symbol
-        else:
-             price_base_token_symbol_for_json = current_token1_symbol
-             price_quote_token_symbol_for_json = current_token0_symbol
-        
-        price_lower_calculated, price_upper_calculated, current_market_price_calculated = None, None, None
-
+        slot0 = pool_slot0.get(pool_address_for_position) if pool_address_for_position else None
+        position_range = compute_position_range(tick_lower, tick_upper, slot0[0] if slot0 else None,
+                                                token0_decimals, token1_decimals, current_token0_symbol, current_token1_symbol)
         if pool_address_for_position:
-            pool_contract = w3.eth.contract(address=pool_address_for_position, abi=UNISWAP_V3_POOL_ABI_MINIMAL)
-            
-            price_lower_t1_per_t0 = tick_to_price(tick_lower, token0_decimals, token1_decimals, True)
-            price_upper_t1_per_t0 = tick_to_price(tick_upper, token0_decimals, token1_decimals, True) 
-
-            slot0 = pool_contract.functions.slot0().call()
-            sqrt_price_x96_current = slot0[0]
-            current_market_price_t1_per_t0 = sqrt_price_x96_to_price(sqrt_price_x96_current, token0_decimals, token1_decimals, True)
-
-            if PRICE_PRESENTATION_IS_TOKEN0_BASE:
-                price_lower_calculated = price_lower_t1_per_t0
-                price_upper_calculated = price_upper_t1_per_t0
-                current_market_price_calculated = current_market_price_t1_per_t0
-            else: 
-                price_lower_calculated = 1 / price_upper_t1_per_t0 if price_upper_t1_per_t0 != 0 else None
-                price_upper_calculated = 1 / price_lower_t1_per_t0 if price_lower_t1_per_t0 != 0 else None
-                if price_lower_calculated is not None and price_upper_calculated is not None and price_lower_calculated > price_upper_calculated:
-                    price_lower_calculated, price_upper_calculated = price_upper_calculated, price_lower_calculated
-                current_market_price_calculated = 1 / current_market_price_t1_per_t0 if current_market_price_t1_per_t0 != 0 else None
-            
-            print(f"  Range: [{price_lower_calculated:.6f} - {price_upper_calculated:.6f}] {price_quote_token_symbol_for_json} per {price_base_token_symbol_for_json}")
-            if current_market_price_calculated is not None:
-                print(f"  Current Market Price: {current_market_price_calculated:.6f} {price_quote_token_symbol_for_json} per {price_base_token_symbol_for_json}")
+            position_range["pool_address"] = pool_address_for_position
+        if slot0:
+            print(f"  Range: [{position_range['price_lower']:.6f} - {position_range['price_upper']:.6f}] {position_range['quote_token_for_price']} per {position_range['base_token_for_price']}")
+            if position_range["current_market_price"] is not None:
+                print(f"  Current Market Price: {position_range['current_market_price']:.6f} {position_range['quote_token_for_price']} per {position_range['base_token_for_price']}")
+        elif pool_address_for_position:
+            print(f"  slot0() für Pool {pool_address_for_position} fehlgeschlagen, skipping range price calculation.")
         else:
             print(f"  Pool address for position {position_nft_id} not defined, skipping range price calculation.")
 
         today_data_entry = {
-            "total_unclaimed_fees": {"token0_actual": unclaimed_fees_token0_actual, "token1_actual": unclaimed_fees_token1_actual, "token0_usd": current_unclaimed_token0_usd_val, "token1_usd": current_unclaimed_token1_usd_val, "total_usd": current_total_unclaimed_usd_val},
+            "total_unclaimed_fees": fee_amounts_entry(unclaimed_fees_token0_actual, unclaimed_fees_token1_actual, price_token0_usd, price_token1_usd),
             "daily_earned_fees": {},
-            "position_range": {
-                "price_lower": price_lower_calculated, "price_upper": price_upper_calculated, "current_market_price": current_market_price_calculated,
-                "base_token_for_price": price_base_token_symbol_for_json, "quote_token_for_price": price_quote_token_symbol_for_json
-            }
+            "position_range": position_range
         }
         
         yesterday_full_data = all_data[position_key]["history"].get(yesterday_date_str)
-        daily_earned_token0_actual = unclaimed_fees_token0_actual
-        daily_earned_token1_actual = unclaimed_fees_token1_actual
-        if yesterday_full_data and "total_unclaimed_fees" in yesterday_full_data:
-            y_total_fees = yesterday_full_data["total_unclaimed_fees"]
-            daily_earned_token0_actual -= y_total_fees.get("token0_actual", 0.0)
-            daily_earned_token1_actual -= y_total_fees.get("token1_actual", 0.0)
-        daily_earned_token0_actual = max(0, daily_earned_token0_actual)
-        daily_earned_token1_actual = max(0, daily_earned_token1_actual)
-
-        daily_earned_token0_usd_val, daily_earned_token1_usd_val, daily_total_earned_usd_val = None, None, None
-        if price_token0_usd is not None: daily_earned_token0_usd_val = daily_earned_token0_actual * price_token0_usd
-        if price_token1_usd is not None: daily_earned_token1_usd_val = daily_earned_token1_actual * price_token1_usd
-        if daily_earned_token0_usd_val is not None and daily_earned_token1_usd_val is not None: 
-            daily_total_earned_usd_val = daily_earned_token0_usd_val + daily_earned_token1_usd_val
-        elif daily_earned_token0_usd_val is not None: 
-            daily_total_earned_usd_val = daily_earned_token0_usd_val
-        elif daily_earned_token1_usd_val is not None: 
-            daily_total_earned_usd_val = daily_earned_token1_usd_val
-
-        today_data_entry["daily_earned_fees"] = {"token0_actual": daily_earned_token0_actual, "token1_actual": daily_earned_token1_actual, "token0_usd": daily_earned_token0_usd_val, "token1_usd": daily_earned_token1_usd_val, "total_usd": daily_total_earned_usd_val}
+        today_data_entry["daily_earned_fees"] = compute_daily_earned(today_data_entry["total_unclaimed_fees"], yesterday_full_data, price_token0_usd, price_token1_usd)
+        daily_earned_token0_actual = today_data_entry["daily_earned_fees"]["token0_actual"]
+        daily_earned_token1_actual = today_data_entry["daily_earned_fees"]["token1_actual"]
+        daily_earned_token0_usd_val = today_data_entry["daily_earned_fees"]["token0_usd"]
+        daily_earned_token1_usd_val = today_data_entry["daily_earned_fees"]["token1_usd"]
+        daily_total_earned_usd_val = today_data_entry["daily_earned_fees"]["total_usd"]
         
+        if token0_address_checksum in stale_price_tokens or token1_address_checksum in stale_price_tokens:
+            today_data_entry["usd_prices_stale"] = True
+            print(f"  Warnung: USD-Werte basieren auf dem letzten bekannten (veralteten) CoinGecko-Preis.")
+
         all_data[position_key]["history"][today_date_str] = today_data_entry
+        fee_analytics.update(all_data[position_key], today_date_str)
         
-        time_in_range_24h = calculate_time_in_range_percentage(
-            PRICE_TICKS_FILE, 
-            today_data_entry["position_range"],
-            hours_to_check=24
-        )
-        if time_in_range_24h is not None:
-            all_data[position_key]["time_in_range_24h_percentage"] = time_in_range_24h
-            print(f"  Time in Range (last 24h): {time_in_range_24h:.2f}%")
-        else:
-            if "time_in_range_24h_percentage" in all_data[position_key]:
-                del all_data[position_key]["time_in_range_24h_percentage"]
-            print(f"  Time in Range (last 24h): Konnte nicht berechnet werden.")
-            
         all_data[position_key]["last_updated_utc"] = today_utc.strftime('%Y-%m-%dT%H:%M:%SZ')
 
         print(f"\n  --- Fees Earned on {today_date_str} for Position {position_nft_id} ---")
@@ -389,13 +470,131 @@ def main():
         print(f"    {current_token1_symbol}: {daily_earned_token1_actual:.8f} ($" + f"{(daily_earned_token1_usd_val or 0.0):.2f})")
         if daily_total_earned_usd_val is not None: 
             print(f"    Total USD Value (Earned Today): ${daily_total_earned_usd_val:.2f}")
+        return True
 
     except Exception as e_inner:
         print(f"An error occurred processing position ID {position_nft_id}: {e_inner}")
         import traceback; traceback.print_exc()
+        return False
+
+def update_dashboard(all_data):
+    try:
+        with instrumentation.phase("dashboard"):
+            index = generate_dashboard(all_data, DASHBOARD_DIR, PRICE_TICKS_STORE_DIR, PRICE_TICKS_FILE)
+        print(f"Dashboard-Dateien in '{DASHBOARD_DIR}' aktualisiert ({len(index['positions'])} Positionen).")
+    except Exception as e:
+        print(f"FEHLER beim Erzeugen der Dashboard-Dateien: {e}")
+
+def main(use_async=False, fee_source=None):
+    fee_source = fee_source or FEE_SOURCE
+    print(f"--- Starting Uniswap V3 Fee Tracker ({datetime.now(timezone.utc).isoformat()}) ---")
+    all_data = load_json_data(JSON_DATA_FILE)
+
+    if not ARBITRUM_RPC_URL or (fee_source == "collect" and not WALLET_ADDRESS):
+        print("CRITICAL Error: Missing environment variables. Exiting.")
+        return 1
+    head_block = None
+    if use_async:
+        print("Async RPC mode: Verbindungsprüfung ist der erste Read (eth_blockNumber).")
+    else:
+        try:
+            with instrumentation.phase("rpc_connect"):
+                head_block = int(rpc_request(ARBITRUM_RPC_URL, "eth_blockNumber", [], cache=False), 16) # Block für alle Reads des Laufs
+        except Exception as e:
+            print(f"CRITICAL Error: Could not connect to Arbitrum RPC ({e}). Exiting.")
+            return 1
+        print(f"Successfully connected to Arbitrum RPC.")
+
+    pos_configs = get_tracked_position_configs(ARBITRUM_RPC_URL, WALLET_ADDRESS)
+    closed_position_ids = discovery.closed_position_ids() # Liquidität 0 beim letzten Lauf; wird unten neu geprüft
+    active_position_ids = {pos_config['id'] for pos_config in pos_configs} - closed_position_ids
+    investment_by_id = {pos_config['id']: pos_config['initial_investment_usd'] for pos_config in pos_configs if pos_config['initial_investment_usd'] is not None}
+    print(f"{len(pos_configs)} Position(en) aus Config und Wallet, davon {len(active_position_ids)} aktiv.")
+
+    print("Aktualisiere 'is_active' Flags in fees_data.json...")
+    for pos_key_in_json in list(all_data.keys()):
+        if pos_key_in_json.startswith("position_"):
+            try:
+                position_id_in_json = int(pos_key_in_json.replace("position_", ""))
+                is_currently_active_in_json = all_data[pos_key_in_json].get("is_active", False)
+                should_be_active = position_id_in_json in active_position_ids
+                
+                if is_currently_active_in_json != should_be_active:
+                    print(f"  Position {pos_key_in_json} wird auf 'is_active: {should_be_active}' gesetzt.")
+                all_data[pos_key_in_json]["is_active"] = should_be_active
+
+                if should_be_active:
+                    current_investment_in_json = all_data[pos_key_in_json].get("initial_investment_usd")
+                    config_investment = investment_by_id.get(position_id_in_json)
+                    if config_investment is not None and current_investment_in_json != config_investment:
+                        all_data[pos_key_in_json]["initial_investment_usd"] = config_investment
+                        fee_analytics.refresh_investment(all_data[pos_key_in_json])
+                        print(f"  Initialinvestment für aktive Position {pos_key_in_json} auf {config_investment} USD gesetzt/aktualisiert.")
+            except ValueError:
+                print(f"  Konnte ID für Key '{pos_key_in_json}' nicht parsen.")
+
+    if not pos_configs:
+        print("Keine aktive Position in Config. Es werden keine Gebühren aktualisiert.")
+        save_json_data(all_data, JSON_DATA_FILE) # Alte Speicherfunktion
+        update_dashboard(all_data)
+        print(f"\n--- Fee Tracker Finished (No active fees updated) ---")
+        return 0
+
+    position_ids = [pos_config['id'] for pos_config in pos_configs]
+    wallet_checksum = to_checksum_address(WALLET_ADDRESS) if WALLET_ADDRESS else None
+    try:
+        if use_async:
+            run_inputs = asyncio.run(fetch_run_inputs_async(ARBITRUM_RPC_URL, position_ids, wallet_checksum, fee_source))
+        else:
+            run_inputs = fetch_run_inputs(ARBITRUM_RPC_URL, position_ids, wallet_checksum, fee_source, head_block)
+    except Exception as e:
+        print(f"CRITICAL Error: Batched RPC reads failed: {e}")
+        import traceback; traceback.print_exc()
+        save_json_data(all_data, JSON_DATA_FILE)
+        return 1
+    positions_by_id, token_meta, pool_address_by_id, pool_slot0, collected_by_id, price_quotes = run_inputs
+    # Liquidität 0 (geschlossen, aber das NFT liegt noch in der Wallet): inaktiv, kein neuer History-Eintrag; jeder Lauf prüft erneut
+    closed_position_ids = {pid for pid in position_ids if positions_by_id.get(pid) and positions_by_id[pid][7] == 0}
+    for position_id in sorted(closed_position_ids):
+        position_key = f"position_{position_id}"
+        if all_data.get(position_key, {}).get("is_active"):
+            print(f"  Position {position_key} hat keine Liquidität mehr und wird auf 'is_active: False' gesetzt.")
+            all_data[position_key]["is_active"] = False
+    discovery.set_closed(closed_position_ids)
+    pos_configs = [pos_config for pos_config in pos_configs if pos_config['id'] not in closed_position_ids]
+    token_prices = {addr: quote.usd for addr, quote in price_quotes.items() if quote is not None}
+    stale_price_tokens = {addr for addr, quote in price_quotes.items() if quote is not None and quote.stale}
+
+    today_utc = datetime.now(timezone.utc)
+    processed_keys = []
+    with instrumentation.phase("process_positions"):
+        for pos_config in pos_configs:
+            if process_position(all_data, pos_config, positions_by_id.get(pos_config['id']), token_meta,
+                                collected_by_id.get(pos_config['id']), pool_address_by_id.get(pos_config['id']), pool_slot0,
+                                token_prices, today_utc, stale_price_tokens):
+                processed_keys.append(f"position_{pos_config['id']}")
+    processed_count = len(processed_keys)
+
+    if processed_keys:
+        with instrumentation.phase("time_in_range"):
+            history_start = today_utc.timestamp() - max(TIME_IN_RANGE_WINDOWS.values()) - MAX_TICK_HOLD_SECONDS
+            tick_histories = load_tick_histories(PRICE_TICKS_STORE_DIR, PRICE_TICKS_FILE, start=history_start)
+            update_time_in_range(all_data, processed_keys, tick_histories, today_utc)
+        with instrumentation.phase("valuation"):
+            update_valuation(all_data, processed_keys, positions_by_id, token_meta, token_prices, tick_histories, today_utc)
             
     save_json_data(all_data, JSON_DATA_FILE) 
-    print(f"\n--- Fee Tracker Finished ---")
+    update_dashboard(all_data)
+    print(f"\n--- Fee Tracker Finished ({processed_count}/{len(pos_configs)} positions updated) ---")
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Uniswap V3 Fee Tracker")
+    parser.add_argument("--async", dest="use_async", action="store_true", default=os.getenv('RPC_ASYNC') == "1",
+                        help="Unabhängige RPC-Reads parallel über asyncio ausführen (auch via RPC_ASYNC=1)")
+    parser.add_argument("--fee-source", choices=["engine", "collect"], default=FEE_SOURCE,
+                        help="Nicht abgeholte Gebühren aus dem Fee-Growth-State (engine) oder per collect()-Simulation (auch via FEE_SOURCE)")
+    parser.add_argument("--profile", nargs="?", const=os.path.join(instrumentation.RUN_REPORT_DIR, "tracker.prof"), metavar="PATH",
+                        help="Lauf unter cProfile ausführen und die Statistik nach PATH schreiben")
+    args = parser.parse_args()
+    sys.exit(instrumentation.run_instrumented("tracker", lambda: main(use_async=args.use_async, fee_source=args.fee_source), profile_path=args.profile))
\ No newline at end of file
@@ -0,0 +1,178 @@
+import sys
+import math
+import time
+import argparse
+from datetime import datetime, timezone
+import numpy as np
+import tick_store
+from dashboard_payloads import lttb
+from pools import PRICE_PRESENTATION_IS_TOKEN0_BASE
+from tickmath import amounts_per_liquidity, ticks_to_prices
+from time_in_range import history_for_range, load_tick_histories
+
+# Bewertung einer Position über die Zeit: Token-Mengen und Wert aus liquidity/tickLower/tickUpper (NFPM.positions())
+# an jedem Preispunkt in einem NumPy-Durchlauf, verglichen mit HODL (die Mengen zum ersten Punkt einfach gehalten)
+# und den bis dahin verdienten Gebühren (kumulierte daily_earned_fees, zum jeweiligen Preis bewertet).
+# Zeitachse: ein Punkt pro History-Tag (current_market_price des Snapshots), ab Beginn der Tick-Historie jeder Tick.
+# Gerechnet wird in Token1 (Numeraire des Pools), USD nur zum aktuellen Kurs; angenommen wird die aktuelle Liquidität
+# über den ganzen Zeitraum. Gespeichert als position_data["valuation"] mit einer per LTTB verkleinerten Serie.
+# Anzeigen/Neuberechnen ohne RPC (mit den gespeicherten Parametern): python valuation.py [--positions 4806838,...] [--refresh]
+VALUATION_VERSION = 1
+VALUATION_SERIES_POINTS = 400
+VALUATION_SNAPSHOT_HOUR_UTC = 17 # Wie der tägliche Cron in fees.yml
+VALUATION_SIGNIFICANT_DIGITS = 8
+
+def _round(value):
+    return float(f"{value:.{VALUATION_SIGNIFICANT_DIGITS}g}")
+
+def _native(prices, is_token0_base):
+    # Darstellungspreis <-> Token1 pro Token0 (die Umkehrung ist ihre eigene Inverse)
+    return prices if is_token0_base else 1.0 / prices
+
+def _snapshot_timestamps(dates):
+    # 'YYYY-MM-DD' -> Unix-Zeit des täglichen Snapshots, ohne strptime pro Tag
+    days = np.array(dates, dtype='datetime64[D]').astype(np.int64)
+    return (days * 86400 + VALUATION_SNAPSHOT_HOUR_UTC * 3600).astype(np.float64)
+
+def position_amounts(liquidity, tick_lower, tick_upper, decimals0, decimals1, native_prices):
+    # Token0/Token1 in ganzen Token bei jedem Preis (Token1 pro Token0)
+    price_lower, price_upper = ticks_to_prices([tick_lower, tick_upper], decimals0, decimals1, True)
+    scale = float(liquidity) / 10.0 ** ((decimals0 + decimals1) / 2)
+    amount0, amount1 = amounts_per_liquidity(math.sqrt(price_lower), math.sqrt(price_upper), np.asarray(native_prices, dtype=np.float64))
+    return amount0 * scale, amount1 * scale
+
+def daily_points(position_data, is_token0_base=PRICE_PRESENTATION_IS_TOKEN0_BASE):
+    # Pro History-Tag: Zeitpunkt, Preis (Token1 pro Token0, NaN ohne Range-Daten) und kumulierte Gebühren in Token0/Token1
+    history = position_data.get("history") or {}
+    dates = sorted(history)
+    ts = _snapshot_timestamps(dates)
+    prices = np.array([(history[date_str].get("position_range") or {}).get("current_market_price") or np.nan for date_str in dates], dtype=np.float64)
+    earned = [history[date_str].get("daily_earned_fees") or {} for date_str in dates]
+    fees0 = np.cumsum([float(entry.get("token0_actual") or 0.0) for entry in earned])
+    fees1 = np.cumsum([float(entry.get("token1_actual") or 0.0) for entry in earned])
+    return ts, _native(prices, is_token0_base), fees0, fees1
+
+def value_series(position_data, liquidity, tick_lower, tick_upper, decimals0, decimals1, tick_history=None, now=None,
+                 is_token0_base=PRICE_PRESENTATION_IS_TOKEN0_BASE):
+    # Spalten über die gemeinsame Zeitachse, Werte in Token1; None ohne einen einzigen Preispunkt
+    day_ts, day_prices, fees0, fees1 = daily_points(position_data, is_token0_base)
+    known = ~np.isnan(day_prices)
+    ts, prices = day_ts[known], day_prices[known]
+    if tick_history is not None and len(tick_history):
+        in_window = tick_history.ts <= (now if now is not None else tick_history.ts[-1])
+        if len(day_ts):
+            in_window &= tick_history.ts >= day_ts[0] # nichts vor dem ersten Snapshot der Position
+        tick_ts = tick_history.ts[in_window]
+        if len(tick_ts):
+            before_ticks = ts < tick_ts[0]
+            ts = np.concatenate([ts[before_ticks], tick_ts])
+            prices = np.concatenate([prices[before_ticks], _native(tick_history.prices[in_window], is_token0_base)])
+    if len(ts) == 0:
+        return None
+
+    amount0, amount1 = position_amounts(liquidity, tick_lower, tick_upper, decimals0, decimals1, prices)
+    day_idx = np.searchsorted(day_ts, ts, side='right') - 1 # letzter Snapshot bis zum Zeitpunkt, -1 = davor
+    earned0 = np.where(day_idx >= 0, fees0[np.maximum(day_idx, 0)], 0.0) if len(day_ts) else np.zeros(len(ts))
+    earned1 = np.where(day_idx >= 0, fees1[np.maximum(day_idx, 0)], 0.0) if len(day_ts) else np.zeros(len(ts))
+    return {
+        "t": ts, "price": prices, "amount0": amount0, "amount1": amount1,
+        "value": amount0 * prices + amount1,
+        "hodl": amount0[0] * prices + amount1[0],
+        "fees": earned0 * prices + earned1,
+    }
+
+def compute_valuation(position_data, liquidity, tick_lower, tick_upper, decimals0, decimals1, token0_usd=None, token1_usd=None,
+                      tick_history=None, now=None, is_token0_base=PRICE_PRESENTATION_IS_TOKEN0_BASE):
+    # Ergebnis für position_data["valuation"] oder None
+    now = time.time() if now is None else now
+    series = value_series(position_data, liquidity, tick_lower, tick_upper, decimals0, decimals1, tick_history, now, is_token0_base)
+    if series is None:
+        return None
+    price_now = float(series["price"][-1])
+    if token1_usd is None and token0_usd is not None:
+        token1_usd = token0_usd / price_now
+    value, hodl, fees = (float(series[key][-1]) for key in ("value", "hodl", "fees"))
+    investment = position_data.get("initial_investment_usd")
+    def usd(amount):
+        return amount * token1_usd if token1_usd is not None else None
+    current = {
+        "t": int(series["t"][-1]), "price": float(_native(price_now, is_token0_base)),
+        "amount0": float(series["amount0"][-1]), "amount1": float(series["amount1"][-1]),
+        "value": value, "hodl": hodl, "fees": fees,
+        "il_pct": (value / hodl - 1) * 100 if hodl > 0 else None,
+        "net_vs_hodl": value + fees - hodl,
+        "value_usd": usd(value), "hodl_usd": usd(hodl), "fees_usd": usd(fees), "net_vs_hodl_usd": usd(value + fees - hodl),
+        "pnl_vs_investment_usd": usd(value + fees) - float(investment) if investment and token1_usd is not None else None,
+    }
+    keep = lttb(series["t"] - series["t"][0], series["value"] + series["fees"] - series["hodl"], VALUATION_SERIES_POINTS)
+    return {
+        "version": VALUATION_VERSION,
+        "computed_utc": datetime.fromtimestamp(now, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        "liquidity": str(int(liquidity)), "tick_lower": int(tick_lower), "tick_upper": int(tick_upper),
+        "decimals0": int(decimals0), "decimals1": int(decimals1), "token1_usd": token1_usd, "points": len(series["t"]),
+        "entry": {"t": int(series["t"][0]), "price": float(_native(series["price"][0], is_token0_base)),
+                  "amount0": float(series["amount0"][0]), "amount1": float(series["amount1"][0]), "value": float(series["value"][0])},
+        "current": current,
+        "series": {
+            "t": [int(t) for t in series["t"][keep].tolist()],
+            "price": [_round(price) for price in _native(series["price"][keep], is_token0_base).tolist()],
+            **{key: [_round(value) for value in series[key][keep].tolist()] for key in ("value", "hodl", "fees")},
+        },
+    }
+
+def recompute(position_data, histories, now=None):
+    # Neuberechnung mit den gespeicherten Parametern (Liquidität, Ticks, Decimals, Token1-Kurs), z.B. nach einem Backfill
+    stored = position_data.get("valuation")
+    if not stored:
+        return None
+    history = position_data.get("history") or {}
+    position_range = next((history[date_str].get("position_range") for date_str in sorted(history, reverse=True)
+                           if history[date_str].get("position_range")), None)
+    tick_history = history_for_range(histories, position_range) if position_range else None
+    return compute_valuation(position_data, int(stored["liquidity"]), stored["tick_lower"], stored["tick_upper"],
+                             stored["decimals0"], stored["decimals1"], token1_usd=stored.get("token1_usd"), tick_history=tick_history, now=now)
+
+def summary_line(valuation_data):
+    current = valuation_data["current"]
+    def usd(value):
+        return f"{value:.2f} USD" if value is not None else "n/a"
+    il_text = f"{current['il_pct']:.2f}%" if current["il_pct"] is not None else "n/a"
+    return (f"Wert {usd(current['value_usd'])}, HODL {usd(current['hodl_usd'])}, Gebühren {usd(current['fees_usd'])}, "
+            f"IL {il_text}, netto vs. HODL {usd(current['net_vs_hodl_usd'])}, vs. Initial {usd(current['pnl_vs_investment_usd'])}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Gespeicherte Positionsbewertungen anzeigen oder neu berechnen")
+    parser.add_argument("--file", default="fees_data.json")
+    parser.add_argument("--positions", help="Kommagetrennte Positions-IDs (Default: alle mit Bewertung)")
+    parser.add_argument("--refresh", action="store_true", help="Mit aktueller History/Tick-Historie neu berechnen und speichern")
+    parser.add_argument("--store-dir", default=tick_store.DEFAULT_STORE_DIR)
+    parser.add_argument("--ticks-json", default="price_ticks.json")
+    args = parser.parse_args()
+
+    import tracker # Laden/Speichern wie im Cron-Lauf
+    all_data = tracker.load_json_data(args.file)
+    position_keys = [key for key in all_data if key.startswith("position_") and all_data[key].get("valuation")]
+    if args.positions:
+        position_keys = [f"position_{pid.strip()}" for pid in args.positions.split(",") if f"position_{pid.strip()}" in all_data]
+    if args.refresh:
+        histories = load_tick_histories(args.store_dir, json_path=args.ticks_json)
+        started = time.perf_counter()
+        refreshed = 0
+        for position_key in position_keys:
+            result = recompute(all_data[position_key], histories)
+            if result is not None:
+                all_data[position_key]["valuation"] = result
+                refreshed += 1
+        print(f"{refreshed} Bewertung(en) neu berechnet ({time.perf_counter() - started:.3f}s).")
+        if refreshed:
+            tracker.save_json_data(all_data, args.file)
+    for position_key in position_keys:
+        valuation_data = all_data[position_key].get("valuation")
+        if valuation_data:
+            print(f"  {position_key} ({valuation_data['points']} Punkte, Stand {valuation_data['computed_utc']}): {summary_line(valuation_data)}")
+        else:
+            print(f"  {position_key}: keine Bewertung (wird beim nächsten tracker.py-Lauf berechnet).")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())